@@ -0,0 +1,343 @@
+from collections import deque
+from email.utils import formatdate
+from typing import Optional
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from dotenv import load_dotenv
+
+from .cache import LocalCache, request_key
+from .database import engine
+from .limiter import PUBLIC, classify
+from .snapshot import snapshot_source
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "true").lower() == "true"
+# This many connection failures within the window open the breaker
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "10"))
+# How long the breaker stays open before a background probe checks the database again
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "15"))
+# Local file holding the last good body of every public GET; empty disables stale serving
+LAST_KNOWN_GOOD_PATH = os.getenv("LAST_KNOWN_GOOD_PATH", "last_known_good.db")
+LAST_KNOWN_GOOD_MAX_ENTRIES = int(os.getenv("LAST_KNOWN_GOOD_MAX_ENTRIES", "20000"))
+
+# Public routes that never touch Postgres keep working while the breaker is open
+BREAKER_EXEMPT = ("/health",)
+# Response headers replayed with a stale body; validators are left out on purpose
+STORED_HEADERS = ("content-type", "x-total-count", "x-total-count-exact")
+STREAMING_TYPES = ("text/event-stream", "application/x-ndjson")
+# SQLSTATE classes for a lost or refused connection (08) and a server shutting down (57)
+OUTAGE_SQLSTATE_CLASSES = ("08", "57")
+QUERY_CANCELED = "57014"
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def is_outage(exc: BaseException) -> bool:
+    """True for errors meaning the database is unreachable, not that one query failed"""
+    if not isinstance(exc, DBAPIError):
+        return False
+    if exc.connection_invalidated:
+        return True
+    if not isinstance(exc, (OperationalError, InterfaceError)):
+        return False
+    # psycopg2 連不上伺服器時沒有 SQLSTATE
+    pgcode = getattr(exc.orig, "pgcode", None)
+    return pgcode is None or (pgcode[:2] in OUTAGE_SQLSTATE_CLASSES and pgcode != QUERY_CANCELED)
+
+
+def ping_database():
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+class CircuitBreaker:
+    """Stops sending requests to Postgres after repeated connection failures.
+
+    Closed: requests pass and outage errors are counted; enough of them
+    inside the window open the breaker. Open: no request reaches the
+    database. Once the open period has passed the breaker goes half-open
+    and a single background probe runs; success closes it, failure opens
+    it for another period. Requests never wait on the probe.
+    """
+
+    def __init__(
+        self,
+        probe=ping_database,
+        threshold: int = BREAKER_FAILURE_THRESHOLD,
+        window: float = BREAKER_WINDOW_SECONDS,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        self.probe = probe
+        self.threshold = threshold
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.failures = deque()
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow(self, now: float = None) -> bool:
+        """Whether a request may use the database; starts the probe when one is due"""
+        if self.state == CLOSED:
+            return True
+        now = now or time.monotonic()
+        with self._lock:
+            if self.state != OPEN or now - self.opened_at < self.open_seconds:
+                return self.state == CLOSED
+            self.state = HALF_OPEN
+        threading.Thread(target=self._probe, name="breaker-probe", daemon=True).start()
+        return False
+
+    def record_failure(self, now: float = None):
+        now = now or time.monotonic()
+        with self._lock:
+            if self.state != CLOSED:
+                return
+            self.failures.append(now)
+            while self.failures and now - self.failures[0] > self.window:
+                self.failures.popleft()
+            if len(self.failures) >= self.threshold:
+                self._open(now)
+                logger.error("database unreachable, circuit breaker open for %.0fs", self.open_seconds)
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.failures.clear()
+        self.trips += 1
+
+    def _probe(self):
+        try:
+            self.probe()
+        except Exception as exc:
+            logger.warning("database still unavailable: %s", exc)
+            with self._lock:
+                self._open(time.monotonic())
+            return
+        with self._lock:
+            self.state = CLOSED
+        logger.info("database reachable again, circuit breaker closed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "trips": self.trips,
+                "recent_failures": len(self.failures),
+                "open_for": round(time.monotonic() - self.opened_at, 1) if self.state != CLOSED else 0,
+            }
+
+
+class LastKnownGoodStore:
+    """Last successful body per public URL in a local SQLite file.
+
+    Every worker on the host shares the file (WAL mode), and it survives
+    restarts, so a worker started during an outage can still answer.
+    Writes go through a background thread and are skipped when the body
+    has not changed since this worker last stored it.
+    """
+
+    def __init__(self, path: str = LAST_KNOWN_GOOD_PATH, max_entries: int = LAST_KNOWN_GOOD_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.seen = LocalCache(max_entries=max_entries, ttl=3600)
+        self.queue = queue.Queue(maxsize=1000)
+        self._conn = None
+        self._thread = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, body BLOB NOT NULL, headers TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def save(self, key: str, body: bytes, headers: dict):
+        digest = hashlib.sha1(body).hexdigest()
+        if self.seen.get(key) == digest:
+            return
+        self.seen.set(key, digest)
+        try:
+            self.queue.put_nowait((key, body, json.dumps(headers), time.time()))
+        except queue.Full:
+            self.seen.delete(key)
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="last-known-good", daemon=True)
+                self._thread.start()
+
+    def write(self, key: str, body: bytes, headers: str, stored_at: float):
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, body, headers, stored_at))
+                self._writes += 1
+                if self._writes % 1000 == 0:
+                    conn.execute(
+                        "DELETE FROM responses WHERE key NOT IN "
+                        "(SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)",
+                        (self.max_entries,),
+                    )
+
+    def load(self, key: str) -> Optional[tuple]:
+        """(body, headers, stored_at) for the key, or None"""
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT body, headers, stored_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning("last known good lookup failed: %s", exc)
+            return None
+        return None if row is None else (row[0], json.loads(row[1]), row[2])
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self.write(*item)
+            except sqlite3.Error as exc:
+                logger.warning("last known good write failed: %s", exc)
+            finally:
+                self.queue.task_done()
+
+
+db_breaker = CircuitBreaker()
+last_known_good = LastKnownGoodStore()
+
+
+def storable(request: Request) -> bool:
+    return (
+        last_known_good.enabled
+        and request.method == "GET"
+        and request.url.path.startswith("/api/")
+        and classify(request) is PUBLIC
+        and not request.headers.get("authorization")
+    )
+
+
+def unavailable_response(retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The database is temporarily unavailable"},
+        headers={"Retry-After": str(max(1, int(retry_after)))},
+    )
+
+
+def degraded_response(request: Request, breaker: CircuitBreaker = None, store: LastKnownGoodStore = None) -> Response:
+    """The last good copy of a public GET marked as stale, otherwise 503"""
+    breaker = breaker or db_breaker
+    store = store or last_known_good
+    retry_after = max(0.0, breaker.open_seconds - (time.monotonic() - breaker.opened_at))
+    stored = store.load(request_key(request)) if storable(request) else None
+    if stored is None:
+        return unavailable_response(retry_after)
+    body, headers, stored_at = stored
+    age = int(max(0, time.time() - stored_at))
+    return Response(
+        content=body,
+        headers={
+            **headers,
+            # 過期副本不讓瀏覽器與 nginx 另外快取
+            "Cache-Control": "no-store",
+            "Age": str(age),
+            "Warning": '111 - "Revalidation Failed"',
+            "X-Stale-Since": formatdate(stored_at, usegmt=True),
+        },
+    )
+
+
+class CircuitBreakerMiddleware:
+    """Degrade to read-only while Postgres is unreachable.
+
+    While the breaker is closed, successful public GETs are recorded in
+    the last-known-good store, but only responses the route marked as
+    shareable with a public Cache-Control (see http_cache.cached_json);
+    anything else may hold private data and never reaches the disk. While it is open, those GETs are answered
+    from the store with Age and Warning headers, and everything else
+    (writes included) gets 503 with Retry-After. Outage errors raised by
+    a route count towards opening the breaker and get the same treatment.
+    """
+
+    def __init__(self, app, breaker: CircuitBreaker = None, store: LastKnownGoodStore = None):
+        self.app = app
+        self.breaker = breaker or db_breaker
+        self.store = store or last_known_good
+
+    async def __call__(self, scope, receive, send):
+        # 快照節點不連 Postgres
+        if (
+            scope["type"] != "http"
+            or not BREAKER_ENABLED
+            or snapshot_source is not None
+            or scope["path"].startswith(BREAKER_EXEMPT)
+            or scope["method"] == "OPTIONS"
+        ):
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        if not self.breaker.allow():
+            response = await run_in_threadpool(degraded_response, request, self.breaker, self.store)
+            return await response(scope, receive, send)
+
+        capture = storable(request)
+        started = False
+        status, headers, chunks = 200, {}, []
+
+        async def capture_send(message):
+            nonlocal started, status, capture
+            if message["type"] == "http.response.start":
+                started = True
+                status = message["status"]
+                raw = Headers(raw=message["headers"])
+                capture = (
+                    capture
+                    and status == 200
+                    and raw.get("cache-control", "").startswith("public")
+                    and "content-encoding" not in raw
+                    and not raw.get("content-type", "").startswith(STREAMING_TYPES)
+                )
+                headers.update({name: raw[name] for name in STORED_HEADERS if name in raw})
+            elif message["type"] == "http.response.body" and capture:
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        except Exception as exc:
+            if not is_outage(exc) or started:
+                raise
+            logger.warning("%s %s failed, database unreachable: %s", scope["method"], scope["path"], exc)
+            self.breaker.record_failure()
+            response = await run_in_threadpool(degraded_response, request, self.breaker, self.store)
+            return await response(scope, receive, send)
+        if capture and chunks:
+            self.store.save(request_key(request), b"".join(chunks), headers)
@@ -0,0 +1,291 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type
+import csv
+import itertools
+import json
+import time
+import typing
+from pydantic import BaseModel, ValidationError
+
+from .database import engine
+from .events import emit_change
+from .models import Case, Contact, Job, News, Product, Technique
+from .rendering import RENDERED_COLUMNS, render_news_values
+from .schemas import CaseCreate, ContactCreate, JobCreate, NewsCreate, ProductCreate, TechniqueCreate
+
+# Rows per COPY batch; each batch is merged and committed on its own
+IMPORT_CHUNK_ROWS = 50000
+# Invalid rows are counted in full but only this many are reported back
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass(frozen=True)
+class ImportSpec:
+    model: object
+    schema: Type[BaseModel]
+    natural_key: Tuple[str, ...] = ()  # empty: insert only
+    live_column: Optional[str] = "is_active"
+    # Columns computed from each validated record, e.g. rendered news content
+    derived_columns: Tuple[str, ...] = ()
+    derive: Optional[Callable[[dict], dict]] = None
+
+
+IMPORT_SPECS = {
+    "jobs": ImportSpec(Job, JobCreate, ("title", "location")),
+    "news": ImportSpec(
+        News, NewsCreate, ("title",), live_column="is_published", derived_columns=RENDERED_COLUMNS, derive=render_news_values
+    ),
+    "cases": ImportSpec(Case, CaseCreate, ("title",)),
+    "products": ImportSpec(Product, ProductCreate, ("name",)),
+    "techniques": ImportSpec(Technique, TechniqueCreate, ("name",)),
+    "contacts": ImportSpec(Contact, ContactCreate, live_column=None),
+}
+
+
+@dataclass
+class ImportStats:
+    table: str
+    read: int = 0
+    invalid: int = 0
+    copied: int = 0
+    inserted: int = 0
+    updated: int = 0
+    elapsed: float = 0.0
+    errors: List[dict] = field(default_factory=list)
+
+    def progress(self) -> dict:
+        return {key: value for key, value in self.__dict__.items() if key != "errors"}
+
+
+def list_fields(schema: Type[BaseModel]) -> set:
+    """Schema fields holding lists, which CSV carries as JSON arrays or |-separated values"""
+    names = set()
+    for name, info in schema.model_fields.items():
+        annotation = info.annotation
+        candidates = typing.get_args(annotation) if typing.get_origin(annotation) is typing.Union else (annotation,)
+        if any(typing.get_origin(candidate) in (list, List) for candidate in candidates):
+            names.add(name)
+    return names
+
+
+def read_csv(stream: Iterable[str], schema: Type[BaseModel]) -> Iterator[dict]:
+    lists = list_fields(schema)
+    for row in csv.DictReader(stream):
+        record = {key: value for key, value in row.items() if key and value != ""}
+        for name in lists & record.keys():
+            value = record[name].strip()
+            record[name] = json.loads(value) if value.startswith("[") else [item.strip() for item in value.split("|") if item.strip()]
+        yield record
+
+
+def read_jsonl(stream: Iterable[str]) -> Iterator[dict]:
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_records(stream: Iterable[str], format: str, schema: Type[BaseModel]) -> Iterator[dict]:
+    if format == "csv":
+        return read_csv(stream, schema)
+    if format == "jsonl":
+        return read_jsonl(stream)
+    raise ValueError(f"Unsupported import format '{format}', expected csv or jsonl")
+
+
+def validated_rows(records: Iterable[dict], spec: ImportSpec, columns: Sequence[str], stats: ImportStats) -> Iterator[tuple]:
+    """Validate each record against the create schema; invalid rows are counted and skipped"""
+    for line, record in enumerate(records, start=1):
+        stats.read += 1
+        try:
+            values = spec.schema.model_validate(record).model_dump()
+            if spec.live_column and spec.live_column in record:
+                values[spec.live_column] = str(record[spec.live_column]).lower() in ("true", "1", "t", "yes")
+            if spec.derive:
+                values = spec.derive(values)
+        except (ValidationError, ValueError) as exc:
+            stats.invalid += 1
+            if len(stats.errors) < MAX_REPORTED_ERRORS:
+                stats.errors.append({"row": line, "error": str(exc)})
+            continue
+        yield tuple(values.get(column) for column in columns)
+
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_value(value) -> str:
+    """Encode one value for COPY ... (FORMAT text)"""
+    if isinstance(value, str):
+        return value.translate(COPY_ESCAPES)
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        # 欄位為不含時區的 UTC
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        value = "{" + ",".join('"' + str(item).replace("\\", "\\\\").replace('"', '\\"') + '"' for item in value) + "}"
+    return str(value).translate(COPY_ESCAPES)
+
+
+class CopyStream:
+    """File-like view over generated COPY lines, so rows are never all in memory"""
+
+    def __init__(self, rows: Iterable[tuple]):
+        self.rows = iter(rows)
+        self.count = 0
+        self._buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or len(self._buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.count += 1
+            self._buffer += "\t".join(copy_value(value) for value in row) + "\n"
+        if size < 0:
+            chunk, self._buffer = self._buffer, ""
+        else:
+            chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+    readline = read
+
+
+def column_defaults(spec: ImportSpec, now: datetime) -> Dict[str, object]:
+    """Values for columns a record may leave empty, taken from the model's column defaults"""
+    defaults = {}
+    for column in spec.model.__table__.columns:
+        if column.default is None:
+            continue
+        default = column.default.arg
+        defaults[column.name] = now if column.default.is_callable else default
+    return defaults
+
+
+def merge_sql(table: str, columns: Sequence[str], key: Sequence[str], defaults: Dict[str, object]) -> Tuple[str, str]:
+    """UPDATE ... FROM staging for existing keys, then INSERT ... WHERE NOT EXISTS for new ones.
+
+    Values missing from the file keep the current value on update and fall
+    back to the column default on insert. Rows whose values are unchanged
+    are not touched, so updated_at only moves for real changes.
+    """
+    updatable = [column for column in columns if column not in key]
+    incoming = ", ".join(f"COALESCE(s.{column}, t.{column})" for column in updatable)
+    current = ", ".join(f"t.{column}" for column in updatable)
+    matches = " AND ".join(f"t.{column} = s.{column}" for column in key)
+    touch = ", updated_at = %(now)s" if "updated_at" in defaults else ""
+    update = (
+        f"UPDATE {table} t SET ({', '.join(updatable)}) = ROW({incoming}){touch} "
+        f"FROM {table}_import s WHERE {matches} AND ROW({current}) IS DISTINCT FROM ROW({incoming})"
+    )
+    values = [
+        f"COALESCE(s.{column}, %(default_{column})s)" if column in defaults else f"s.{column}" for column in columns
+    ]
+    # created_at 等不在檔案裡的欄位直接用預設值
+    generated = [column for column in defaults if column not in columns]
+    values += [f"%(default_{column})s" for column in generated]
+    insert = (
+        f"INSERT INTO {table} ({', '.join(list(columns) + generated)}) SELECT {', '.join(values)} FROM {table}_import s "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {matches})"
+    )
+    return update, insert
+
+
+def import_columns(spec: ImportSpec) -> List[str]:
+    """Columns an import writes: the create schema's fields, the soft-delete flag and derived columns"""
+    columns = [name for name in spec.schema.model_fields if name in spec.model.__table__.columns]
+    if spec.live_column and spec.live_column not in columns:
+        columns.append(spec.live_column)
+    return columns + [name for name in spec.derived_columns if name not in columns]
+
+
+def resolve_key(spec: ImportSpec, key: Optional[Sequence[str]] = None) -> Tuple[str, ...]:
+    key = tuple(spec.natural_key if key is None else key)
+    unknown = set(key) - (set(import_columns(spec)) - set(spec.derived_columns))
+    if unknown:
+        raise ValueError(f"Natural key columns must come from the import schema: {', '.join(sorted(unknown))}")
+    return key
+
+
+def import_records(
+    table: str,
+    records: Iterable[dict],
+    key: Optional[Sequence[str]] = None,
+    progress: Optional[Callable[[ImportStats], None]] = None,
+    chunk_rows: int = IMPORT_CHUNK_ROWS,
+) -> ImportStats:
+    """Stream records into table through COPY, upserting by natural key when there is one.
+
+    Without a key rows are copied straight into the table. With a key each
+    batch is copied into a temporary staging table, de-duplicated (last
+    row wins) and merged. Every batch commits on its own; re-running an
+    upsert import after a failure is safe.
+    """
+    spec = IMPORT_SPECS[table]
+    key = resolve_key(spec, key)
+    schema_columns = import_columns(spec)
+
+    now = datetime.utcnow()
+    defaults = column_defaults(spec, now)
+    stats = ImportStats(table)
+    started = time.monotonic()
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if key:
+            columns = schema_columns
+            rows = validated_rows(records, spec, columns, stats)
+            update, insert = merge_sql(table, columns, key, defaults)
+            params = {"now": now, **{f"default_{name}": value for name, value in defaults.items()}}
+            # 連線來自連線池，先清掉上次失敗留下的暫存表
+            cursor.execute(f"DROP TABLE IF EXISTS {table}_import")
+            cursor.execute(
+                f"CREATE TEMP TABLE {table}_import AS SELECT {', '.join(columns)} FROM {table} WITH NO DATA"
+            )
+            cursor.execute(f"ALTER TABLE {table}_import ADD COLUMN import_seq bigserial")
+        else:
+            # 沒有自然鍵時直接 COPY 進目標表，預設值在 Python 端補上
+            columns = schema_columns + [name for name in defaults if name not in schema_columns]
+            rows = (
+                tuple(defaults.get(column) if value is None else value for column, value in zip(columns, row))
+                for row in validated_rows(records, spec, columns, stats)
+            )
+        while True:
+            stream = CopyStream(itertools.islice(rows, chunk_rows))
+            target = f"{table}_import" if key else table
+            cursor.copy_expert(f"COPY {target} ({', '.join(columns)}) FROM STDIN", stream)
+            if stream.count == 0:
+                break
+            stats.copied += stream.count
+            if key:
+                # 同一批內重複的鍵只保留最後一筆
+                cursor.execute(
+                    f"DELETE FROM {table}_import a USING {table}_import b WHERE "
+                    + " AND ".join(f"a.{column} = b.{column}" for column in key)
+                    + " AND a.import_seq < b.import_seq"
+                )
+                cursor.execute(update, params)
+                stats.updated += cursor.rowcount
+                cursor.execute(insert, params)
+                stats.inserted += cursor.rowcount
+                cursor.execute(f"TRUNCATE {table}_import")
+            else:
+                stats.inserted += stream.count
+            connection.commit()
+            stats.elapsed = round(time.monotonic() - started, 3)
+            if progress:
+                progress(stats)
+        if key:
+            cursor.execute(f"DROP TABLE {table}_import")
+        connection.commit()
+    finally:
+        connection.close()
+    stats.elapsed = round(time.monotonic() - started, 3)
+    if stats.inserted or stats.updated:
+        emit_change(table)
+    return stats
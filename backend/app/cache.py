@@ -0,0 +1,245 @@
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Callable, Iterable
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+from .events import RELATED, Change, on_change
+from .singleflight import SingleFlight
+
+try:
+    import redis
+except ImportError:  # 沒有 redis 套件時只使用本地快取
+    redis = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Shared (L2) entries live this long; 0 disables response caching
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "60"))
+LOCAL_CACHE_TTL_SECONDS = int(os.getenv("LOCAL_CACHE_TTL_SECONDS", "30"))
+LOCAL_CACHE_MAX_ENTRIES = int(os.getenv("LOCAL_CACHE_MAX_ENTRIES", "2048"))
+# Optional Redis-protocol server shared by all workers
+REDIS_URL = os.getenv("REDIS_URL", "")
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.1"))
+
+KEY_PREFIX = "avocado:"
+VERSION_PREFIX = KEY_PREFIX + "version:"
+ENTRY_PREFIX = KEY_PREFIX + "cache:"
+INVALIDATION_CHANNEL = KEY_PREFIX + "invalidate"
+
+
+class LocalCache:
+    """Thread-safe LRU with per-entry expiry (the L1 tier)"""
+
+    def __init__(self, max_entries: int = LOCAL_CACHE_MAX_ENTRIES, ttl: int = LOCAL_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class ResponseCache:
+    """Two-tier cache keyed by per-table version stamps.
+
+    Every entry key embeds the current version of the tables it was built
+    from, so bumping a table version makes its old entries unreachable in
+    both tiers at once. Versions are kept in Redis and broadcast over
+    pub/sub; each worker mirrors them locally, which lets an L1 hit skip
+    the network entirely. While the subscription is down L1 is bypassed
+    and versions are read from Redis instead. Concurrent misses for the
+    same entry are coalesced so only one of them runs the producer.
+    """
+
+    def __init__(self, ttl: int = CACHE_TTL_SECONDS, redis_url: str = REDIS_URL):
+        self.ttl = ttl
+        self.local = LocalCache()
+        self.flights = SingleFlight()
+        self.versions = {}
+        self.invalidated_at = float("-inf")
+        self.redis = None
+        self._pubsub_redis = None
+        if redis_url and redis is not None:
+            self.redis = redis.Redis.from_url(
+                redis_url, socket_timeout=REDIS_SOCKET_TIMEOUT, socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+            )
+            self._pubsub_redis = redis.Redis.from_url(redis_url, health_check_interval=30)
+        self._subscribed = threading.Event()
+        self._listener = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def stamp(self, tables: Iterable[str]) -> str:
+        tables = sorted(tables)
+        if self.redis is not None and not self._subscribed.is_set():
+            try:
+                values = self.redis.mget([VERSION_PREFIX + table for table in tables])
+                self.versions.update({table: int(value or 0) for table, value in zip(tables, values)})
+            except redis.RedisError as exc:
+                logger.warning("cache version lookup failed: %s", exc)
+        return ",".join(f"{table}:{self.versions.get(table, 0)}" for table in tables)
+
+    def get_or_set(self, key: str, tables: Iterable[str], producer: Callable[[], bytes]) -> bytes:
+        if not self.enabled:
+            # 快取停用時仍合併同時進行的相同請求
+            return self.flights.do(key, producer)
+        self._ensure_listener()
+        entry_key = f"{key}|{self.stamp(tables)}"
+        use_local = self.redis is None or self._subscribed.is_set()
+
+        if use_local:
+            value = self.local.get(entry_key)
+            if value is not None:
+                return value
+
+        return self.flights.do(entry_key, lambda: self._load(entry_key, use_local, producer))
+
+    def _load(self, entry_key: str, use_local: bool, producer: Callable[[], bytes]) -> bytes:
+        if self.redis is not None:
+            try:
+                value = self.redis.get(ENTRY_PREFIX + entry_key)
+            except redis.RedisError as exc:
+                logger.warning("cache read failed: %s", exc)
+                value = None
+            if value is not None:
+                if use_local:
+                    self.local.set(entry_key, value)
+                return value
+
+        value = producer()
+        if use_local:
+            self.local.set(entry_key, value)
+        if self.redis is not None:
+            try:
+                self.redis.set(ENTRY_PREFIX + entry_key, value, ex=self.ttl)
+            except redis.RedisError as exc:
+                logger.warning("cache write failed: %s", exc)
+        return value
+
+    def invalidated_within(self, seconds: float) -> bool:
+        """Whether any table was invalidated, by this worker or another, in the last seconds"""
+        return time.monotonic() - self.invalidated_at < seconds
+
+    def invalidate(self, table: str):
+        self.invalidated_at = time.monotonic()
+        if self.redis is not None:
+            try:
+                version = self.redis.incr(VERSION_PREFIX + table)
+                self.redis.publish(INVALIDATION_CHANNEL, f"{table}:{version}")
+                self.versions[table] = version
+                return
+            except redis.RedisError as exc:
+                logger.warning("cache invalidation broadcast failed: %s", exc)
+        self.versions[table] = self.versions.get(table, 0) + 1
+
+    def _ensure_listener(self):
+        if self._pubsub_redis is None or self._listener is not None:
+            return
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+                self._listener.start()
+
+    def _sync_versions(self):
+        keys = list(self._pubsub_redis.scan_iter(VERSION_PREFIX + "*"))
+        values = self._pubsub_redis.mget(keys) if keys else []
+        self.versions = {key.decode()[len(VERSION_PREFIX):]: int(value or 0) for key, value in zip(keys, values)}
+        # Redis 可能被清空過，本地舊條目不能再信任
+        self.local.clear()
+
+    def _listen(self):
+        while True:
+            pubsub = self._pubsub_redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                self._sync_versions()
+                self._subscribed.set()
+                for message in pubsub.listen():
+                    table, _, version = message["data"].decode().rpartition(":")
+                    self.versions[table] = max(int(version), self.versions.get(table, 0))
+                    self.invalidated_at = time.monotonic()
+            except Exception as exc:
+                logger.warning("cache invalidation subscription lost: %s", exc)
+            finally:
+                self._subscribed.clear()
+                pubsub.close()
+            time.sleep(1)
+
+
+response_cache = ResponseCache()
+
+
+@on_change
+def invalidate_cached_responses(change: Change):
+    if change.operation == RELATED:
+        # 只有該項目的相關清單變了：詳情頁另有 "<table>:<id>" 版本號
+        response_cache.invalidate(f"{change.table}:{change.id}")
+        return
+    response_cache.invalidate(change.table)
+
+
+def auth_scope(request: Request) -> str:
+    """Empty for anonymous requests, otherwise a digest of the credentials"""
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return ""
+    return "auth:" + hashlib.sha256(authorization.encode()).hexdigest()[:16]
+
+
+def request_key(request: Request) -> str:
+    """Normalized path and query string, independent of parameter order, scoped by credentials"""
+    query = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    scope = auth_scope(request)
+    return f"{scope}|{request.url.path}?{query}" if scope else f"{request.url.path}?{query}"
+
+
+def _json_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return jsonable_encoder(value)
+
+
+def dump_json(content) -> bytes:
+    # 只有 json 不認得的值 (datetime、pydantic 模型) 才轉換，其餘直接編碼
+    return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
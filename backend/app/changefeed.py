@@ -0,0 +1,139 @@
+from typing import Iterable, Optional
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+import psycopg2
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from .database import DATABASE_URL, engine
+from .events import Change, on_change
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "avocado_changes"
+FEED_TABLES = {"jobs", "news", "cases", "products", "techniques"}
+# Only streamed to signed-in subscribers, as are writes to items not on the public site
+PRIVATE_FEED_TABLES = {"contacts"}
+# Events buffered per subscriber before a slow client is dropped (it reconnects and resyncs)
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def change_payload(change: Change) -> dict:
+    return {
+        "table": change.table,
+        "id": change.id,
+        "operation": change.operation,
+        "updated_at": change.updated_at.isoformat() if change.updated_at else None,
+        "live": change.live,
+    }
+
+
+@on_change
+def notify_change(change: Change):
+    """Publish the committed write to every worker through Postgres NOTIFY"""
+    with engine.connect() as conn:
+        conn.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": NOTIFY_CHANNEL, "payload": json.dumps(change_payload(change))},
+        )
+        conn.commit()
+
+
+class Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, tables: Optional[Iterable[str]] = None, private: bool = False):
+        self.loop = loop
+        self.tables = set(tables) if tables else None
+        self.private = private
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def wants(self, event: dict) -> bool:
+        if event["type"] != "change":
+            return True
+        data = event["data"]
+        # 匿名訂閱者只收到公開網站上看得到的變更；下架仍要送出，讓客戶端移除該項目
+        if not self.private and (data["table"] not in FEED_TABLES or not data.get("live", True) and data["operation"] != "delete"):
+            return False
+        return self.tables is None or data["table"] in self.tables
+
+    def deliver(self, event: dict):
+        # 在事件迴圈執行緒中呼叫
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait({"type": "overflow", "data": {}})
+
+
+class ChangeBroadcaster:
+    """One LISTEN connection per worker, fanned out to every SSE subscriber.
+
+    The listener thread starts with the first subscriber. If the
+    connection drops, notifications may have been missed, so subscribers
+    get a "reset" event telling them to refetch before applying changes.
+    """
+
+    def __init__(self, database_url: str = DATABASE_URL):
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, tables: Optional[Iterable[str]] = None, private: bool = False) -> Subscriber:
+        subscriber = Subscriber(asyncio.get_running_loop(), tables, private)
+        with self._lock:
+            self.subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name="change-feed", daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def broadcast(self, event: dict):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            if subscriber.wants(event):
+                subscriber.loop.call_soon_threadsafe(subscriber.deliver, event)
+
+    def _listen(self):
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                if connected_before:
+                    self.broadcast({"type": "reset", "data": {}})
+                connected_before = True
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self.broadcast({"type": "change", "data": json.loads(notify.payload)})
+            except Exception as exc:
+                logger.warning("change feed listener lost its connection: %s", exc)
+            finally:
+                if conn is not None:
+                    conn.close()
+            time.sleep(1)
+
+
+change_broadcaster = ChangeBroadcaster()
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence
+import logging
+import os
+import time
+from fastapi import HTTPException
+from psycopg2 import errorcodes
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+from dotenv import load_dotenv
+
+from .database import engine
+from .events import emit_change
+from .sync import SYNC_RESOURCES
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Soft-deleted rows untouched for this long move to <table>_archive
+COMPACTION_RETENTION_DAYS = int(os.getenv("COMPACTION_RETENTION_DAYS", "30"))
+COMPACTION_BATCH_ROWS = 1000
+# Each batch waits at most this long for row or table locks, then backs off and retries
+COMPACTION_LOCK_TIMEOUT = "2s"
+COMPACTION_RETRIES = 3
+# Pause between batches so compaction never saturates the primary or replication
+COMPACTION_BATCH_PAUSE_SECONDS = 0.05
+
+
+@dataclass
+class CompactionStats:
+    table: str
+    moved: int = 0
+    batches: int = 0
+    retries: int = 0
+    vacuumed: bool = False
+    elapsed: float = 0.0
+
+
+def archive_table(table: str) -> str:
+    return f"{table}_archive"
+
+
+def _columns(table: str) -> List[str]:
+    return [column.name for column in SYNC_RESOURCES[table][0].__table__.columns]
+
+
+def _live_column(table: str) -> str:
+    return SYNC_RESOURCES[table][2].name
+
+
+def ensure_archive_table(conn: Connection, table: str):
+    """Create <table>_archive shaped like table plus archived_at, adding columns the table gained since"""
+    archive = archive_table(table)
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {archive} (LIKE {table} INCLUDING DEFAULTS, "
+        f"archived_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'), PRIMARY KEY (id))"
+    ))
+    missing = conn.execute(
+        text(
+            "SELECT a.attname, format_type(a.atttypid, a.atttypmod) FROM pg_attribute a "
+            "WHERE a.attrelid = to_regclass(:table) AND a.attnum > 0 AND NOT a.attisdropped "
+            "AND a.attname NOT IN (SELECT attname FROM pg_attribute "
+            "WHERE attrelid = to_regclass(:archive) AND attnum > 0 AND NOT attisdropped)"
+        ),
+        {"table": table, "archive": archive},
+    ).all()
+    for name, type_ in missing:
+        conn.execute(text(f'ALTER TABLE {archive} ADD COLUMN "{name}" {type_}'))
+
+
+def move_sql(table: str, columns: Sequence[str], live_column: str) -> str:
+    """Move one batch of expired tombstones into the archive in a single statement.
+
+    SKIP LOCKED leaves rows an editor is touching for a later batch, so
+    compaction never waits on application transactions.
+    """
+    names = ", ".join(columns)
+    return (
+        f"WITH expired AS (SELECT id FROM {table} WHERE {live_column} = false AND updated_at < :cutoff "
+        f"ORDER BY id LIMIT :batch FOR UPDATE SKIP LOCKED), "
+        f"moved AS (DELETE FROM {table} t USING expired WHERE t.id = expired.id RETURNING t.*) "
+        f"INSERT INTO {archive_table(table)} ({names}) SELECT {names} FROM moved"
+    )
+
+
+def restore_sql(table: str, columns: Sequence[str], live_column: str) -> str:
+    """Move one archived row back into table as live, stamped now so sync clients pick it up"""
+    kept = [column for column in columns if column not in (live_column, "updated_at")]
+    return (
+        f"WITH restored AS (DELETE FROM {archive_table(table)} WHERE id = :id RETURNING *) "
+        f"INSERT INTO {table} ({', '.join(kept)}, {live_column}, updated_at) "
+        f"SELECT {', '.join(kept)}, true, :now FROM restored RETURNING *"
+    )
+
+
+def _is_lock_timeout(exc: OperationalError) -> bool:
+    return getattr(exc.orig, "pgcode", None) == errorcodes.LOCK_NOT_AVAILABLE
+
+
+def compact_table(
+    table: str,
+    retention_days: int = COMPACTION_RETENTION_DAYS,
+    batch_rows: int = COMPACTION_BATCH_ROWS,
+    vacuum: bool = True,
+    now: Optional[datetime] = None,
+) -> CompactionStats:
+    """Move rows soft-deleted more than retention_days ago into <table>_archive, then VACUUM table.
+
+    Every batch is its own short transaction with a lock timeout, so
+    compaction can run while the site is live; a batch that times out is
+    retried after a backoff. updated_at is the deletion time, since the
+    soft delete is the last write a dead row receives.
+    """
+    stats = CompactionStats(table)
+    started = time.monotonic()
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    statement = text(move_sql(table, _columns(table), _live_column(table)))
+    with engine.begin() as conn:
+        ensure_archive_table(conn, table)
+
+    attempts = 0
+    while True:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{COMPACTION_LOCK_TIMEOUT}'"))
+                moved = conn.execute(statement, {"cutoff": cutoff, "batch": batch_rows}).rowcount
+        except OperationalError as exc:
+            if not _is_lock_timeout(exc) or attempts >= COMPACTION_RETRIES:
+                raise
+            attempts += 1
+            stats.retries += 1
+            time.sleep(0.5 * 2 ** attempts)
+            continue
+        attempts = 0
+        if moved == 0:
+            break
+        stats.moved += moved
+        stats.batches += 1
+        time.sleep(COMPACTION_BATCH_PAUSE_SECONDS)
+
+    if stats.moved:
+        if vacuum:
+            # VACUUM 不能在交易內執行；讓空出的頁面可重用並更新統計
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+            stats.vacuumed = True
+        emit_change(table)
+    stats.elapsed = round(time.monotonic() - started, 3)
+    logger.info("compacted %s: %d rows in %d batches", table, stats.moved, stats.batches)
+    return stats
+
+
+def compact_all(tables: Optional[Sequence[str]] = None, **options) -> List[CompactionStats]:
+    return [compact_table(table, **options) for table in (tables or SYNC_RESOURCES)]
+
+
+def archived_rows(table: str, skip: int = 0, limit: int = 100) -> List[dict]:
+    """Archived rows of table, most recently archived first"""
+    with engine.begin() as conn:
+        ensure_archive_table(conn, table)
+        rows = conn.execute(
+            text(f"SELECT * FROM {archive_table(table)} ORDER BY archived_at DESC, id DESC OFFSET :skip LIMIT :limit"),
+            {"skip": skip, "limit": limit},
+        ).mappings()
+        return [dict(row) for row in rows]
+
+
+def restore_row(table: str, id: int):
+    """Put an archived row back into table as live; 404 when it is not in the archive"""
+    _, schema, live = SYNC_RESOURCES[table]
+    with engine.begin() as conn:
+        ensure_archive_table(conn, table)
+        row = conn.execute(
+            text(restore_sql(table, _columns(table), live.name)), {"id": id, "now": datetime.utcnow()}
+        ).mappings().first()
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"No archived {table} row with id {id}")
+        item = schema.model_validate(dict(row))
+    emit_change(table, item.id, "create", item.updated_at)
+    return item
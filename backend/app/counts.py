@@ -0,0 +1,128 @@
+from typing import Callable, NamedTuple
+import json
+import os
+import threading
+import time
+from fastapi import Request
+from sqlalchemy import func, text
+from sqlalchemy.orm import Query, Session
+from dotenv import load_dotenv
+
+from .cache import response_cache
+from .events import Change, on_change
+from .filters import FILTERS
+
+load_dotenv()
+
+# Up to this many matching rows the total is counted exactly; beyond it, estimated
+EXACT_COUNT_LIMIT = int(os.getenv("EXACT_COUNT_LIMIT", "1000"))
+# Row counters are re-seeded from the statistics this often to bound drift between workers
+COUNTER_REFRESH_SECONDS = int(os.getenv("COUNTER_REFRESH_SECONDS", "300"))
+
+
+class CountResult(NamedTuple):
+    total: int
+    exact: bool
+
+
+class RowCounters:
+    """Approximate live-row count per table, adjusted by the write handlers between re-seeds"""
+
+    def __init__(self, refresh_seconds: int = COUNTER_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def get(self, table: str, seed: Callable[[], int]) -> int:
+        with self._lock:
+            entry = self._counts.get(table)
+            if entry is not None and time.monotonic() - entry[1] < self.refresh_seconds:
+                return entry[0]
+        value = seed()
+        with self._lock:
+            self._counts[table] = (value, time.monotonic())
+        return value
+
+    def adjust(self, table: str, delta: int):
+        with self._lock:
+            entry = self._counts.get(table)
+            if entry is not None:
+                self._counts[table] = (max(entry[0] + delta, 0), entry[1])
+
+    def reset(self, table: str):
+        with self._lock:
+            self._counts.pop(table, None)
+
+
+row_counters = RowCounters()
+
+
+@on_change
+def adjust_row_counters(change: Change):
+    if change.id is None:
+        row_counters.reset(change.table)
+    elif change.operation == "create":
+        row_counters.adjust(change.table, 1)
+    elif change.operation == "delete":
+        row_counters.adjust(change.table, -1)
+
+
+def bounded_count(db: Session, query: Query, model, limit: int) -> int:
+    """COUNT(*) that stops after limit + 1 rows"""
+    rows = query.order_by(None).with_entities(model.id).limit(limit + 1).subquery()
+    return db.query(func.count()).select_from(rows).scalar()
+
+
+def estimate_rows(db: Session, query: Query) -> int:
+    """Planner row estimate; pg_class.reltuples for a query without WHERE"""
+    if db.get_bind().dialect.name != "postgresql":
+        # 快照 (SQLite) 沒有統計資訊，資料量小，直接計數
+        return query.order_by(None).count()
+    statement = query.order_by(None).statement
+    if statement.whereclause is None:
+        table = statement.get_final_froms()[0].name
+        reltuples = db.execute(
+            text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+        ).scalar()
+        # -1 表示從未 ANALYZE 過，改用查詢計劃估算
+        if reltuples is not None and reltuples >= 0:
+            return int(reltuples)
+    compiled = statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"render_postcompile": True})
+    plan = db.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_total(db: Session, query: Query, model, unfiltered: bool, use_counter: bool = True) -> CountResult:
+    """Exact total for small result sets, otherwise a cached counter or planner estimate.
+
+    query must not have OFFSET/LIMIT applied. Counters are only used for
+    the unfiltered base query of a route, whose size they track.
+    """
+    table = model.__tablename__
+    if unfiltered and use_counter:
+        total = row_counters.get(table, lambda: estimate_rows(db, query))
+        if total > EXACT_COUNT_LIMIT:
+            return CountResult(total, False)
+    total = bounded_count(db, query, model, EXACT_COUNT_LIMIT)
+    if total <= EXACT_COUNT_LIMIT:
+        return CountResult(total, True)
+    return CountResult(max(estimate_rows(db, query), total), False)
+
+
+def total_count_headers(request: Request, db: Session, query: Query, model, use_counter: bool = True) -> dict:
+    """X-Total-Count headers for a list response, cached alongside the list itself"""
+    filters = FILTERS[model]
+    params = sorted((key, value) for key, value in request.query_params.multi_items() if key in filters)
+    key = f"{request.url.path}#total?" + "&".join(f"{name}={value}" for name, value in params)
+
+    def load() -> bytes:
+        result = count_total(db, query, model, unfiltered=not params, use_counter=use_counter)
+        return json.dumps(result._asdict()).encode()
+
+    result = json.loads(response_cache.get_or_set(key, [model.__tablename__], load))
+    return {
+        "X-Total-Count": str(result["total"]),
+        "X-Total-Count-Exact": "true" if result["exact"] else "false",
+    }
@@ -0,0 +1,147 @@
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional, Tuple
+import asyncio
+import logging
+import os
+import threading
+import time
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from psycopg2 import errorcodes
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from .limiter import classify
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_ENABLED = os.getenv("DEADLINE_ENABLED", "true").lower() == "true"
+# Budget in seconds per limiter class: public reads must be fast, bulk import/export may take minutes
+DEADLINE_BUDGETS = {
+    "public": float(os.getenv("DEADLINE_PUBLIC_SECONDS", "3")),
+    "admin": float(os.getenv("DEADLINE_ADMIN_SECONDS", "15")),
+    "bulk": float(os.getenv("DEADLINE_BULK_SECONDS", "300")),
+}
+# Path prefixes with their own budget; None exempts long-lived routes
+ROUTE_BUDGETS = {
+    "/api/changes/stream": None,
+    "/health": 2.0,
+}
+# The database cancels the query at the deadline; this extra wait catches time spent outside queries
+DEADLINE_GRACE_SECONDS = 0.5
+
+# 目前請求的截止時間 (time.monotonic())；請求之外為 None
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's budget ran out before a new transaction or statement could start"""
+
+
+def remaining() -> Optional[float]:
+    deadline = request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def budget_for(request: Request) -> Tuple[str, Optional[float]]:
+    path = request.url.path
+    for prefix, seconds in ROUTE_BUDGETS.items():
+        if path.startswith(prefix):
+            return prefix, seconds
+    name = classify(request).name
+    return name, DEADLINE_BUDGETS[name]
+
+
+@event.listens_for(Session, "after_begin")
+def apply_statement_timeout(session, transaction, connection):
+    """Cap every transaction a request opens at the time its deadline leaves"""
+    left = remaining()
+    if left is None or connection.dialect.name != "postgresql":
+        return
+    if left <= 0:
+        raise DeadlineExceeded()
+    # SET LOCAL 只在這個交易內有效，連線回到連線池時自動還原
+    connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(1, int(left * 1000))}")
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def check_deadline(conn, cursor, statement, parameters, context, executemany):
+    """statement_timeout caps each statement, not the transaction; stop before the next one once time is up"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def is_query_canceled(exc: OperationalError) -> bool:
+    return getattr(exc.orig, "pgcode", None) == errorcodes.QUERY_CANCELED
+
+
+class DeadlineStats:
+    """Requests and timeouts per budget, and which routes time out"""
+
+    def __init__(self):
+        self.requests = Counter()
+        self.timeouts = Counter()
+        self.routes = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, budget: str, route: str, timed_out: bool):
+        with self._lock:
+            self.requests[budget] += 1
+            if timed_out:
+                self.timeouts[budget] += 1
+                self.routes[route] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "budgets": {
+                    name: {"seconds": seconds, "requests": self.requests[name], "timeouts": self.timeouts[name]}
+                    for name, seconds in {**DEADLINE_BUDGETS, **ROUTE_BUDGETS}.items()
+                    if seconds is not None
+                },
+                "top_timeout_routes": dict(self.routes.most_common(10)),
+            }
+
+
+deadline_stats = DeadlineStats()
+
+
+def deadline_response() -> JSONResponse:
+    return JSONResponse(status_code=504, content={"detail": "Request exceeded its deadline"})
+
+
+async def deadline_middleware(request: Request, call_next):
+    """Give each request a budget that bounds its queries, and answer 504 once it is spent.
+
+    The database is what ends the work: statement_timeout cancels the
+    running query at the deadline and no new statement or transaction
+    starts after it, so the handler fails fast and returns its
+    connection. A sync handler busy outside the database cannot be
+    interrupted, though. The 504 is sent when the wait runs out, but the
+    handler's thread runs on, and the middleware (with the limiter slot
+    around it) only returns once that thread finishes.
+    """
+    budget_name, budget = budget_for(request)
+    if not DEADLINE_ENABLED or budget is None:
+        return await call_next(request)
+    started = time.monotonic()
+    token = request_deadline.set(started + budget)
+    try:
+        response = await asyncio.wait_for(call_next(request), budget + DEADLINE_GRACE_SECONDS)
+    except asyncio.TimeoutError:
+        response = deadline_response()
+    finally:
+        request_deadline.reset(token)
+    route = getattr(request.scope.get("route"), "path", request.url.path)
+    timed_out = response.status_code == 504
+    deadline_stats.record(budget_name, f"{request.method} {route}", timed_out)
+    if timed_out:
+        logger.warning("%s %s exceeded its %.1fs deadline after %.2fs", request.method, route, budget, time.monotonic() - started)
+    return response
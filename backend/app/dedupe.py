@@ -0,0 +1,161 @@
+from datetime import datetime, timedelta
+from typing import List, Optional
+import hashlib
+import logging
+import os
+import threading
+import time
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from .cache import KEY_PREFIX, LocalCache, redis, response_cache
+from .database import engine
+from .models import Contact
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Identical contact submissions within this window are treated as one
+CONTACT_DEDUPE_WINDOW_SECONDS = int(os.getenv("CONTACT_DEDUPE_WINDOW_SECONDS", "600"))
+# 2^20 bits (128 KiB) and 7 hashes: about 1% false positives at 100k submissions per window
+BLOOM_BITS = 1 << 20
+BLOOM_HASHES = 7
+BLOOM_PREFIX = KEY_PREFIX + "bloom:"
+# Lookups of the contact stored by the request that holds a digest, before giving up with 409
+CLAIM_LOOKUP_ATTEMPTS = 5
+CLAIM_LOOKUP_DELAY_SECONDS = 0.05
+# Submissions this worker stored or answered recently, kept for the whole window
+CONTACT_DEDUPE_LOCAL_ENTRIES = 10000
+
+
+def contact_digest(email: str, message: str) -> str:
+    """Digest of what makes two submissions the same: the address and the normalized message"""
+    normalized = " ".join(message.split()).lower()
+    return hashlib.sha256(f"{email.strip().lower()}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+def bloom_positions(digest: str, bits: int = BLOOM_BITS, hashes: int = BLOOM_HASHES) -> List[int]:
+    # 雙重雜湊：由摘要的兩段 64 位元值組出 k 個位置
+    first, second = int(digest[:16], 16), int(digest[16:32], 16) | 1
+    return [(first + i * second) % bits for i in range(hashes)]
+
+
+class RecentDigests:
+    """Bloom filter of digests seen in the current and previous time window.
+
+    Each window has its own filter, so entries age out without deletes.
+    With Redis the filters are bitmaps shared by every worker (one
+    pipelined round trip per lookup); without it they live in process.
+    A positive answer may be false and must be confirmed against the
+    database; a negative one is certain.
+    """
+
+    def __init__(self, name: str, window: int = CONTACT_DEDUPE_WINDOW_SECONDS, redis_client=None):
+        self.name = name
+        self.window = window
+        self.redis = redis_client
+        self._filters = {}
+        self._lock = threading.Lock()
+
+    def _windows(self, now: float) -> List[int]:
+        current = int(now // self.window)
+        return [current, current - 1]
+
+    def might_contain(self, digest: str, now: float = None) -> bool:
+        windows = self._windows(time.time() if now is None else now)
+        positions = bloom_positions(digest)
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                for window in windows:
+                    for position in positions:
+                        pipe.getbit(f"{BLOOM_PREFIX}{self.name}:{window}", position)
+                bits = pipe.execute()
+                return any(all(bits[i:i + len(positions)]) for i in range(0, len(bits), len(positions)))
+            except redis.RedisError as exc:
+                logger.warning("shared bloom filter unavailable: %s", exc)
+                # 無法判斷時一律交給資料庫確認
+                return True
+        with self._lock:
+            return any(
+                window in self._filters and all(self._filters[window][p >> 3] & (1 << (p & 7)) for p in positions)
+                for window in windows
+            )
+
+    def add(self, digest: str, now: float = None):
+        window = self._windows(time.time() if now is None else now)[0]
+        positions = bloom_positions(digest)
+        if self.redis is not None:
+            try:
+                key = f"{BLOOM_PREFIX}{self.name}:{window}"
+                pipe = self.redis.pipeline(transaction=False)
+                for position in positions:
+                    pipe.setbit(key, position, 1)
+                pipe.expire(key, self.window * 2)
+                pipe.execute()
+                return
+            except redis.RedisError as exc:
+                logger.warning("shared bloom filter update failed: %s", exc)
+        with self._lock:
+            bits = self._filters.setdefault(window, bytearray(BLOOM_BITS // 8))
+            for position in positions:
+                bits[position >> 3] |= 1 << (position & 7)
+            for stale in [w for w in self._filters if w < window - 1]:
+                del self._filters[stale]
+
+
+# 第一層：本 worker 記得的送出結果，重複時不經 Redis 與資料庫
+recent_submissions = LocalCache(max_entries=CONTACT_DEDUPE_LOCAL_ENTRIES, ttl=CONTACT_DEDUPE_WINDOW_SECONDS)
+# 第二層：所有 worker 共用的 Bloom filter
+recent_contacts = RecentDigests("contacts", redis_client=response_cache.redis)
+
+# The unique key is reclaimed only once its last use left the window; otherwise nothing is written
+CLAIM_DIGEST = text(
+    "INSERT INTO contact_digests (content_hash, created_at) VALUES (:digest, :now) "
+    "ON CONFLICT (content_hash) DO UPDATE SET created_at = EXCLUDED.created_at "
+    "WHERE contact_digests.created_at < :since RETURNING content_hash"
+)
+
+
+def dedupe_since(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()) - timedelta(seconds=CONTACT_DEDUPE_WINDOW_SECONDS)
+
+
+def claim_digest(db: Session, digest: str) -> bool:
+    """Take the digest's unique key in the caller's transaction; False when a live submission holds it.
+
+    A concurrent claim of the same digest waits for the first transaction
+    and then sees its row, so only one of them inserts the contact.
+    """
+    now = datetime.utcnow()
+    return db.execute(CLAIM_DIGEST, {"digest": digest, "now": now, "since": dedupe_since(now)}).first() is not None
+
+
+def find_recent_contact(db: Session, digest: str) -> Optional[Contact]:
+    return (
+        db.query(Contact)
+        .filter(Contact.content_hash == digest, Contact.created_at >= dedupe_since())
+        .order_by(Contact.id.desc())
+        .first()
+    )
+
+
+def wait_for_contact(db: Session, digest: str, attempts: int = CLAIM_LOOKUP_ATTEMPTS) -> Optional[Contact]:
+    """The contact stored by the request holding the digest, which a losing claim never writes itself"""
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(CLAIM_LOOKUP_DELAY_SECONDS)
+        existing = find_recent_contact(db, digest)
+        if existing is not None:
+            return existing
+    return None
+
+
+def purge_contact_digests(now: Optional[datetime] = None) -> int:
+    """Delete unique keys that left the window; a later repeat would reclaim them anyway"""
+    with engine.begin() as conn:
+        return conn.execute(
+            text("DELETE FROM contact_digests WHERE created_at < :since"), {"since": dedupe_since(now)}
+        ).rowcount
@@ -0,0 +1,42 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Change:
+    """A committed write to one of the content tables"""
+    table: str
+    id: Optional[int] = None  # None means the whole table changed
+    operation: str = "update"  # create, update, delete; related when only the item's related list changed
+    updated_at: Optional[datetime] = None
+    live: bool = True  # False when the item is not on the public site, e.g. an unpublished draft
+
+
+# The item itself is unchanged, so listeners that reload or count items skip it
+RELATED = "related"
+
+_listeners: List[Callable[[Change], None]] = []
+
+
+def on_change(listener: Callable[[Change], None]):
+    """Register a listener called after every committed write"""
+    _listeners.append(listener)
+    return listener
+
+
+def emit_change(
+    table: str, id: Optional[int] = None, operation: str = "update", updated_at: Optional[datetime] = None, live: bool = True
+):
+    """Called by the write handlers right after commit"""
+    change = Change(table=table, id=id, operation=operation, updated_at=updated_at, live=live)
+    for listener in list(_listeners):
+        try:
+            listener(change)
+        except Exception:
+            # 快取或通知失敗不應讓已提交的寫入回傳錯誤
+            logger.exception("change listener %r failed for %s", listener, change)
+    return change
@@ -0,0 +1,274 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+import gzip
+import hashlib
+import os
+import threading
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from .cache import response_cache
+from .fields import fetch_projection
+from .http_cache import CachePolicy, cache_headers
+from .singleflight import SingleFlight
+from .sync import SYNC_RESOURCES
+
+load_dotenv()
+
+# Public site the feed and sitemap links point to
+SITE_URL = os.getenv("SITE_URL", "https://avocado.ai").rstrip("/")
+FEED_ENTRIES = int(os.getenv("FEED_ENTRIES", "50"))
+FEED_AUTHOR = "酪梨智慧 Avocado.ai"
+# Readers poll every few minutes; the ETag turns most polls into a 304
+FEED_POLICY = CachePolicy(max_age=300, s_maxage=300, stale_while_revalidate=600, stale_if_error=86400)
+ATOM_TYPE = "application/atom+xml; charset=utf-8"
+SITEMAP_TYPE = "application/xml; charset=utf-8"
+EPOCH = datetime(1970, 1, 1)
+
+# Site pages listed in sitemap.xml, with the tables whose latest change is the page's lastmod
+SITEMAP_PAGES = {
+    "/": ("jobs", "news", "cases", "products", "techniques"),
+    "/news": ("news",),
+    "/careers": ("jobs",),
+    "/cases": ("cases",),
+    "/products": ("products",),
+    "/techniques": ("techniques",),
+    "/contact": (),
+}
+
+
+@dataclass(frozen=True)
+class Document:
+    """A generated XML body, kept both plain and gzip-compressed"""
+    body: bytes
+    gzipped: bytes
+    etag: str
+    last_modified: datetime  # 不含時區的 UTC
+
+    @classmethod
+    def build(cls, body: bytes, last_modified: datetime) -> "Document":
+        # mtime=0：相同內容壓縮結果相同
+        return cls(body, gzip.compress(body, 9, mtime=0), f'"{hashlib.sha256(body).hexdigest()[:32]}"', last_modified)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(value.replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+
+
+def atom_date(value: datetime) -> str:
+    return value.replace(microsecond=0).isoformat() + "Z"
+
+
+def not_modified(request: Request, document: Document) -> bool:
+    """Conditional GET: If-None-Match wins over If-Modified-Since, as in RFC 9110"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or document.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return document.last_modified.replace(microsecond=0) <= since
+
+
+def document_response(request: Request, document: Document, media_type: str, surrogate_keys: Iterable[str]) -> Response:
+    headers = {
+        **cache_headers(request, FEED_POLICY, surrogate_keys),
+        "ETag": document.etag,
+        "Last-Modified": http_date(document.last_modified),
+        "Vary": "Accept-Encoding",
+    }
+    if not_modified(request, document):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return Response(document.gzipped, media_type=media_type, headers={**headers, "Content-Encoding": "gzip"})
+    return Response(document.body, media_type=media_type, headers=headers)
+
+
+def last_change(db: Session, table: str) -> datetime:
+    """Latest updated_at in table, live or not, so removals move it too"""
+    model = SYNC_RESOURCES[table][0]
+    return db.query(func.max(model.updated_at)).scalar() or EPOCH
+
+
+class GeneratedDocument:
+    """A document regenerated only when the cache version of its tables changes.
+
+    The version stamps are the ones the response cache uses, so a write on
+    any worker marks the document stale everywhere. Until then every
+    request is answered from memory, and a conditional request costs no
+    query at all. Concurrent rebuilds for the same version are coalesced.
+    """
+
+    tables: Tuple[str, ...] = ()
+
+    def __init__(self):
+        self.document: Optional[Document] = None
+        self.stamp = None
+        self.flights = SingleFlight()
+        self._lock = threading.Lock()
+
+    def get(self, db: Session) -> Document:
+        stamp = response_cache.stamp(self.tables)
+        if self.document is not None and self.stamp == stamp:
+            return self.document
+        return self.flights.do(stamp, lambda: self._rebuild(db, stamp))
+
+    def _rebuild(self, db: Session, stamp: str) -> Document:
+        # 版本號在查詢前取得：查詢期間的寫入會讓下一個請求再重建一次
+        with self._lock:
+            document = self.render(db)
+            self.document, self.stamp = document, stamp
+        return document
+
+    def render(self, db: Session) -> Document:
+        raise NotImplementedError
+
+
+@dataclass(frozen=True)
+class FeedSpec:
+    table: str
+    title: str
+    page: str  # site page the feed follows
+    link: str  # site URL of one entry, formatted with its id
+    date_column: str
+    columns: Tuple[str, ...]
+    entry: Callable[[dict], dict]  # row -> title, summary, content, content_type, category
+
+
+class AtomFeed(GeneratedDocument):
+    """Atom feed of a table's latest live rows.
+
+    Entry XML is kept per id with the updated_at it was rendered from. A
+    rebuild selects only the ids and updated_at of the latest rows and
+    loads the rows whose entries are missing or stale, so one edit
+    re-renders one entry.
+    """
+
+    def __init__(self, spec: FeedSpec, entries: int = FEED_ENTRIES):
+        super().__init__()
+        self.spec = spec
+        self.tables = (spec.table,)
+        self.entries = entries
+        self.fragments: Dict[int, Tuple[datetime, str]] = {}
+        self.rendered = 0
+
+    @property
+    def path(self) -> str:
+        return f"/api/{self.spec.table}/feed.xml"
+
+    def render(self, db: Session) -> Document:
+        spec = self.spec
+        model, _, live = SYNC_RESOURCES[spec.table]
+        date = getattr(model, spec.date_column)
+        latest = (
+            db.query(model.id, model.updated_at).filter(live == True).order_by(date.desc(), model.id.desc()).limit(self.entries).all()
+        )
+        stale = [id for id, updated_at in latest if self.fragments.get(id, (None,))[0] != updated_at]
+        if stale:
+            selected = list(dict.fromkeys(["id", "updated_at", spec.date_column, *spec.columns]))
+            for row in fetch_projection(db.query(model).filter(model.id.in_(stale)), model, selected):
+                self.fragments[row["id"]] = (row["updated_at"], self.render_entry(row))
+            self.rendered += len(stale)
+        keep = {id for id, _ in latest}
+        self.fragments = {id: fragment for id, fragment in self.fragments.items() if id in keep}
+
+        updated = last_change(db, spec.table)
+        head = (
+            '<?xml version="1.0" encoding="utf-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">'
+            f"<id>{escape(SITE_URL + spec.page)}</id><title>{escape(spec.title)}</title>"
+            f"<updated>{atom_date(updated)}</updated><author><name>{escape(FEED_AUTHOR)}</name></author>"
+            f'<link rel="self" href={quoteattr(SITE_URL + self.path)}/>'
+            f'<link rel="alternate" type="text/html" href={quoteattr(SITE_URL + spec.page)}/>'
+        )
+        entries = "".join(self.fragments[id][1] for id, _ in latest if id in self.fragments)
+        return Document.build((head + entries + "</feed>\n").encode("utf-8"), updated)
+
+    def render_entry(self, row: dict) -> str:
+        fields = self.spec.entry(row)
+        url = SITE_URL + self.spec.link.format(id=row["id"])
+        parts = [
+            f"<entry><id>{escape(url)}</id><title>{escape(fields['title'])}</title>",
+            f'<link rel="alternate" type="text/html" href={quoteattr(url)}/>',
+            f"<published>{atom_date(row[self.spec.date_column] or row['updated_at'])}</published>",
+            f"<updated>{atom_date(row['updated_at'])}</updated>",
+        ]
+        if fields.get("category"):
+            parts.append(f"<category term={quoteattr(fields['category'])}/>")
+        if fields.get("summary"):
+            parts.append(f"<summary>{escape(fields['summary'])}</summary>")
+        if fields.get("content"):
+            parts.append(f'<content type="{fields.get("content_type", "text")}">{escape(fields["content"])}</content>')
+        return "".join(parts) + "</entry>"
+
+
+class Sitemap(GeneratedDocument):
+    """sitemap.xml of the public site pages, each with the last change to the content it shows"""
+
+    tables = tuple(SYNC_RESOURCES)
+
+    def render(self, db: Session) -> Document:
+        changed = {table: last_change(db, table) for table in self.tables}
+        urls = []
+        for page, tables in SITEMAP_PAGES.items():
+            lastmod = max((changed[table] for table in tables), default=EPOCH)
+            urls.append(
+                f"<url><loc>{escape(SITE_URL + page)}</loc>"
+                + (f"<lastmod>{atom_date(lastmod)}</lastmod>" if lastmod > EPOCH else "")
+                + "</url>"
+            )
+        body = (
+            '<?xml version="1.0" encoding="utf-8"?>\n<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            + "".join(urls)
+            + "</urlset>\n"
+        )
+        return Document.build(body.encode("utf-8"), max(changed.values(), default=EPOCH))
+
+
+def news_entry(row: dict) -> dict:
+    return {
+        "title": row["title"],
+        "summary": row["excerpt"],
+        "content": row["content_html"],
+        "content_type": "html",
+        "category": row["category"],
+    }
+
+
+def job_entry(row: dict) -> dict:
+    return {
+        "title": row["title"],
+        "summary": " · ".join(value for value in (row["department"], row["location"], row["type"]) if value),
+        "content": row["description"],
+        "category": row["department"],
+    }
+
+
+news_feed = AtomFeed(FeedSpec(
+    "news", "酪梨智慧 News", "/news", "/news?id={id}", "published_date",
+    ("title", "category", "excerpt", "content_html"), news_entry,
+))
+jobs_feed = AtomFeed(FeedSpec(
+    "jobs", "酪梨智慧 Careers", "/careers", "/careers?id={id}", "posted_date",
+    ("title", "department", "location", "type", "description"), job_entry,
+))
+sitemap = Sitemap()
+
+
+def feed_response(request: Request, feed: AtomFeed, db: Session) -> Response:
+    return document_response(request, feed.get(db), ATOM_TYPE, [feed.spec.table])
+
+
+def sitemap_response(request: Request, db: Session) -> Response:
+    return document_response(request, sitemap.get(db), SITEMAP_TYPE, sitemap.tables)
@@ -0,0 +1,90 @@
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import func
+from sqlalchemy.orm import Query
+
+from .models import Case, Contact, Job, News, Product, Technique
+
+# List pages only show a teaser, so excerpts are cut in SQL and the large column never leaves the database
+EXCERPT_LENGTH = 200
+
+# Column each model's excerpt is taken from; news stores its excerpt, rendered on write (see rendering.py)
+EXCERPT_SOURCES = {
+    Job: Job.description,
+    Case: Case.challenge,
+    Product: Product.description,
+    Technique: Technique.description,
+    Contact: Contact.message,
+}
+
+# Built-in view=summary: everything a list page renders, without the large text columns
+SUMMARY_FIELDS = {
+    Job: ["id", "title", "department", "location", "type", "salary", "tags", "posted_date", "excerpt"],
+    News: ["id", "title", "category", "published_date", "images", "excerpt", "reading_time"],
+    Case: ["id", "title", "industry", "results", "excerpt"],
+    Product: ["id", "name", "category", "price", "features", "excerpt"],
+    Technique: ["id", "name", "category", "features", "excerpt"],
+    Contact: ["id", "name", "email", "company", "interest", "created_at", "excerpt"],
+}
+
+
+def select_fields(model, schema, fields: Optional[str] = None, view: Optional[str] = None) -> Optional[List[str]]:
+    """Resolve the fields/view query parameters; None means the full representation"""
+    if view is not None and view not in ("summary", "full"):
+        raise HTTPException(status_code=400, detail=f"Unknown view '{view}', expected 'summary' or 'full'")
+    if fields:
+        selected = [name.strip() for name in fields.split(",") if name.strip()]
+        allowed = set(schema.model_fields) | {"excerpt"}
+        unknown = [name for name in selected if name not in allowed]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(sorted(allowed))}",
+            )
+        return list(dict.fromkeys(selected))
+    if view == "summary":
+        return SUMMARY_FIELDS[model]
+    return None
+
+
+def make_excerpt(text: Optional[str]) -> str:
+    if not text:
+        return ""
+    truncated = len(text) > EXCERPT_LENGTH
+    text = " ".join(text[:EXCERPT_LENGTH].split())
+    if not truncated:
+        return text
+    # 英文在單字邊界截斷，中文沒有空白則直接截斷
+    if " " in text[len(text) // 2:]:
+        text = text.rsplit(" ", 1)[0]
+    return text.rstrip() + "…"
+
+
+def full_fields(model, schema) -> List[str]:
+    """The full representation as columns: every schema field, in schema order"""
+    return [name for name in schema.model_fields if name in model.__table__.columns]
+
+
+def fetch_projection(query: Query, model, selected: List[str]) -> List[dict]:
+    """Run query selecting only the selected columns and return plain dicts.
+
+    Rows come back as tuples rather than ORM instances, so nothing enters
+    the session identity map and no schema validation runs; this is the
+    read path for responses that are serialized straight to JSON.
+    """
+    computed = "excerpt" in selected and model in EXCERPT_SOURCES
+    columns = [
+        func.substr(EXCERPT_SOURCES[model], 1, EXCERPT_LENGTH + 1).label("excerpt")  # 多取一個字元以判斷是否被截斷
+        if name == "excerpt" and computed else getattr(model, name)
+        for name in selected
+    ]
+    items = [dict(zip(selected, row)) for row in query.with_entities(*columns)]
+    if computed:
+        for item in items:
+            item["excerpt"] = make_excerpt(item["excerpt"])
+    return items
+
+
+def fetch_first(query: Query, model, selected: List[str]) -> Optional[dict]:
+    items = fetch_projection(query.limit(1), model, selected)
+    return items[0] if items else None
@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List
+from fastapi import HTTPException, Request
+from sqlalchemy import ARRAY, Boolean, String, cast, exists, func, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Query
+from sqlalchemy.sql.expression import ColumnElement
+
+from .models import Case, Contact, Job, News, Product, Technique
+
+# Query parameters handled by the list endpoints themselves
+RESERVED_PARAMS = {"skip", "limit", "fields", "view", "sort", "include_total"}
+
+
+@dataclass(frozen=True)
+class Filter:
+    """A whitelisted list filter; every operator maps to an indexable predicate"""
+    column: object
+    op: str = "eq"  # eq (IN for repeated values), contains (array overlap), gte, lte
+
+    def clause(self, name: str, values: List[str]):
+        if self.op == "eq":
+            return self.column == values[0] if len(values) == 1 else self.column.in_(values)
+        if self.op == "contains":
+            return ArrayOverlap(self.column, values)
+        value = parse_datetime(name, values[-1])
+        return self.column >= value if self.op == "gte" else self.column <= value
+
+
+class ArrayOverlap(ColumnElement):
+    """True when an array column holds any of the values"""
+    type = Boolean()
+    inherit_cache = False
+
+    def __init__(self, column, values: List[str]):
+        self.column = column
+        self.values = list(values)
+
+
+@compiles(ArrayOverlap)
+def compile_array_overlap(element, compiler, **kw):
+    # @> / && 可以使用 GIN 索引，= ANY(tags) 不行
+    operator = "@>" if len(element.values) == 1 else "&&"
+    return compiler.process(element.column.op(operator)(cast(element.values, ARRAY(String))), **kw)
+
+
+@compiles(ArrayOverlap, "sqlite")
+def compile_array_overlap_sqlite(element, compiler, **kw):
+    # 快照中陣列存成 JSON
+    items = func.json_each(element.column).table_valued("value")
+    return compiler.process(exists(select(1).select_from(items).where(items.c.value.in_(element.values))), **kw)
+
+
+def parse_datetime(name: str, value: str) -> datetime:
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date for '{name}': {value}")
+
+
+FILTERS = {
+    Job: {
+        "department": Filter(Job.department),
+        "location": Filter(Job.location),
+        "type": Filter(Job.type),
+        "tag": Filter(Job.tags, "contains"),
+    },
+    News: {
+        "category": Filter(News.category),
+        "published_from": Filter(News.published_date, "gte"),
+        "published_to": Filter(News.published_date, "lte"),
+    },
+    Case: {"industry": Filter(Case.industry)},
+    Product: {"category": Filter(Product.category)},
+    Technique: {"category": Filter(Technique.category)},
+    Contact: {
+        "interest": Filter(Contact.interest),
+        "created_from": Filter(Contact.created_at, "gte"),
+        "created_to": Filter(Contact.created_at, "lte"),
+    },
+}
+
+# Sortable columns; each is indexed (see models.py)
+SORTS = {
+    Job: {"posted_date": Job.posted_date, "title": Job.title},
+    News: {"published_date": News.published_date, "title": News.title},
+    Case: {"created_at": Case.created_at, "title": Case.title},
+    Product: {"name": Product.name, "category": Product.category},
+    Technique: {"name": Technique.name, "category": Technique.category},
+    Contact: {"created_at": Contact.created_at, "name": Contact.name},
+}
+
+
+def apply_filters(query: Query, model, request: Request) -> Query:
+    """Apply the declared filters and sort from the query string, rejecting anything undeclared"""
+    filters = FILTERS[model]
+    params = request.query_params
+    unknown = sorted(set(params) - set(filters) - RESERVED_PARAMS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown parameters: {', '.join(unknown)}. Filters: {', '.join(sorted(filters))}",
+        )
+    for name, flt in filters.items():
+        values = params.getlist(name)
+        if values:
+            query = query.filter(flt.clause(name, values))
+    sort = params.get("sort")
+    if sort:
+        query = query.order_by(*sort_clauses(model, sort))
+    return query
+
+
+def sort_clauses(model, sort: str):
+    clauses = []
+    for key in sort.split(","):
+        key = key.strip()
+        descending = key.startswith("-")
+        column = SORTS[model].get(key.lstrip("-"))
+        if column is None:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot sort by '{key}'. Sortable: {', '.join(sorted(SORTS[model]))}",
+            )
+        clauses.append(column.desc() if descending else column.asc())
+    # id 作為穩定的次要排序，分頁才不會重複或遺漏
+    clauses.append(model.id.desc() if clauses and descending else model.id.asc())
+    return clauses
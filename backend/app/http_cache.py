@@ -0,0 +1,238 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from fastapi import HTTPException, Request, Response
+from dotenv import load_dotenv
+
+from .cache import LocalCache, dump_json, redis, request_key, response_cache
+from .database import LAST_WRITE_COOKIE
+from .events import RELATED, Change, on_change
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Internal nginx listener that refreshes cache entries (see nginx/sites-available/avocado.conf)
+NGINX_PURGE_URL = os.getenv("NGINX_PURGE_URL", "").rstrip("/")
+# URLs refetched per key on each purge; the rest stay registered and go first next time
+NGINX_PURGE_URLS_PER_KEY = int(os.getenv("NGINX_PURGE_URLS_PER_KEY", "20"))
+
+SURROGATE_PREFIX = "avocado:surrogates:"
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    """Cache-Control for a public route; s-maxage applies to nginx, max-age to browsers"""
+    max_age: int = 0
+    s_maxage: int = 60
+    stale_while_revalidate: int = 0
+    stale_if_error: int = 0
+
+    def header(self) -> str:
+        parts = ["public", f"max-age={self.max_age}", f"s-maxage={self.s_maxage}"]
+        if self.stale_while_revalidate:
+            parts.append(f"stale-while-revalidate={self.stale_while_revalidate}")
+        if self.stale_if_error:
+            parts.append(f"stale-if-error={self.stale_if_error}")
+        return ", ".join(parts)
+
+
+PUBLIC_LIST = CachePolicy(s_maxage=60, stale_while_revalidate=300, stale_if_error=86400)
+PUBLIC_DETAIL = CachePolicy(s_maxage=300, stale_while_revalidate=600, stale_if_error=86400)
+PRIVATE = "private, no-cache"
+
+
+class SurrogateRegistry:
+    """Remembers which URLs were served under each surrogate key.
+
+    Kept in Redis when the shared cache is configured so any worker can
+    purge URLs another worker served. Each URL keeps the time it was
+    first registered, so URLs a capped purge skipped are refetched first
+    by the next one. A URL is sent once per cache version of its keys: a
+    purge always follows a version bump, which every worker sees, so the
+    next request after it registers the URL again.
+    """
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self.urls = {}
+        self.seen = LocalCache()
+        self._lock = threading.Lock()
+
+    def register(self, keys: Iterable[str], url: str, version: Optional[str] = None):
+        keys = list(keys)
+        marker = f"{' '.join(keys)} {url}"
+        if version is not None and self.seen.get(marker) == version:
+            return
+        if self.redis is not None:
+            try:
+                now = time.time()
+                pipe = self.redis.pipeline(transaction=False)
+                for key in keys:
+                    pipe.zadd(SURROGATE_PREFIX + key, {url: now}, nx=True)
+                pipe.execute()
+                if version is not None:
+                    self.seen.set(marker, version)
+                return
+            except redis.RedisError as exc:
+                logger.warning("surrogate key registration failed: %s", exc)
+        with self._lock:
+            for key in keys:
+                self.urls.setdefault(key, {}).setdefault(url, None)
+        if version is not None:
+            self.seen.set(marker, version)
+
+    def pop_urls(self, keys: Iterable[str], prefix: Optional[str] = None, per_key: Optional[int] = None) -> set:
+        """Remove and return the URLs for the keys, plus every key starting with prefix.
+
+        With per_key, at most that many URLs of each key are returned, the
+        ones without a query string first and then the longest registered;
+        the rest stay registered for the next purge.
+        """
+        keys = list(keys)
+        urls = set()
+        self.seen.clear()
+        if self.redis is not None:
+            try:
+                names = [SURROGATE_PREFIX + key for key in keys]
+                if prefix:
+                    names.extend(name.decode() for name in self.redis.scan_iter(SURROGATE_PREFIX + prefix + "*"))
+                pipe = self.redis.pipeline(transaction=False)
+                for name in names:
+                    pipe.zrange(name, 0, -1)
+                chosen = [_first_urls([member.decode() for member in members], per_key) for members in pipe.execute()]
+                pipe = self.redis.pipeline(transaction=False)
+                for name, members in zip(names, chosen):
+                    if members:
+                        pipe.zrem(name, *members)
+                    urls.update(members)
+                pipe.execute()
+            except redis.RedisError as exc:
+                logger.warning("surrogate key lookup failed: %s", exc)
+        with self._lock:
+            if prefix:
+                keys.extend(key for key in self.urls if key.startswith(prefix))
+            for key in keys:
+                registered = self.urls.get(key, {})
+                for url in _first_urls(list(registered), per_key):
+                    del registered[url]
+                    urls.add(url)
+                if not registered:
+                    self.urls.pop(key, None)
+        return urls
+
+
+def _first_urls(urls: list, limit: Optional[int]) -> list:
+    # 先刷新不帶查詢字串的主要網址，其餘依登記先後輪流刷新
+    urls = sorted(urls, key=lambda url: "?" in url)
+    return urls if limit is None else urls[:limit]
+
+
+def surrogate_version(keys: Iterable[str]) -> str:
+    """Cache version of the tables whose writes purge these keys"""
+    return response_cache.stamp({key.split(":", 1)[0] for key in keys} | set(keys))
+
+
+class NginxPurger:
+    """Refreshes nginx cache entries in the background, one URL at a time.
+
+    A URL already waiting in the queue is not queued again.
+    """
+
+    def __init__(self, base_url: str = NGINX_PURGE_URL):
+        self.base_url = base_url
+        self.queue = queue.Queue()
+        self.queued = set()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def purge(self, urls: Iterable[str]):
+        if not self.base_url:
+            return
+        with self._lock:
+            urls = [url for url in urls if url not in self.queued]
+            self.queued.update(urls)
+        for url in urls:
+            self.queue.put(url)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="nginx-purge", daemon=True)
+                self._thread.start()
+
+    def refresh(self, url: str):
+        # 帶上剛寫入的 cookie，讓後端從主庫讀取而不是延遲中的副本
+        request = urllib.request.Request(
+            self.base_url + url, headers={"Cookie": f"{LAST_WRITE_COOKIE}={time.time()}"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+        except urllib.error.HTTPError as exc:
+            if exc.code != 404:
+                logger.warning("nginx purge of %s returned %s", url, exc.code)
+        except OSError as exc:
+            logger.warning("nginx purge of %s failed: %s", url, exc)
+
+    def _run(self):
+        while True:
+            url = self.queue.get()
+            with self._lock:
+                self.queued.discard(url)
+            self.refresh(url)
+
+
+surrogate_registry = SurrogateRegistry(response_cache.redis)
+nginx_purger = NginxPurger()
+
+
+@on_change
+def purge_proxy_cache(change: Change):
+    if change.operation == RELATED:
+        nginx_purger.purge(surrogate_registry.pop_urls([f"{change.table}:{change.id}"], per_key=NGINX_PURGE_URLS_PER_KEY))
+        return
+    keys = [change.table]
+    if change.id is not None:
+        keys.append(f"{change.table}:{change.id}")
+    prefix = f"{change.table}:" if change.id is None else None
+    nginx_purger.purge(surrogate_registry.pop_urls(keys, prefix=prefix, per_key=NGINX_PURGE_URLS_PER_KEY))
+
+
+def cache_headers(request: Request, policy: CachePolicy, surrogate_keys: Iterable[str]) -> dict:
+    if request.headers.get("authorization"):
+        return {"Cache-Control": PRIVATE}
+    surrogate_keys = list(surrogate_keys)
+    if not surrogate_keys:
+        # 不登記：只靠 s-maxage 到期
+        return {"Cache-Control": policy.header()}
+    url = str(request.url.path) + (f"?{request.url.query}" if request.url.query else "")
+    surrogate_registry.register(surrogate_keys, url, surrogate_version(surrogate_keys))
+    return {"Cache-Control": policy.header(), "Surrogate-Key": " ".join(surrogate_keys)}
+
+
+def cached_json(
+    request: Request,
+    tables: Iterable[str],
+    producer: Callable[[], object],
+    policy: CachePolicy = PUBLIC_LIST,
+    surrogate_keys: Iterable[str] = None,
+) -> Response:
+    """Serve a JSON body from the response cache with shared-cache headers.
+
+    Surrogate keys default to the table names; detail routes pass
+    "<table>:<id>" so a write only purges the lists and that one item.
+    """
+    headers = cache_headers(request, policy, surrogate_keys or tables)
+    try:
+        body = response_cache.get_or_set(request_key(request), tables, lambda: dump_json(producer()))
+    except HTTPException as exc:
+        if exc.status_code != 404:
+            raise
+        # 404 也讓 nginx 快取，刷新時才能覆蓋已刪除項目的舊條目
+        raise HTTPException(exc.status_code, exc.detail, headers={**(exc.headers or {}), **headers})
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,166 @@
+from typing import Optional
+import base64
+import hashlib
+import json
+import logging
+import os
+import threading
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from dotenv import load_dotenv
+
+from .cache import KEY_PREFIX, LocalCache, auth_scope, redis, response_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Responses to POSTs carrying an Idempotency-Key are replayed for this long
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A key stays locked this long while its first request runs, in case the worker dies
+IDEMPOTENCY_LOCK_SECONDS = 60
+IDEMPOTENCY_PREFIX = KEY_PREFIX + "idempotency:"
+MAX_KEY_LENGTH = 255
+# Responses streamed to the client as they are produced are never stored
+STREAMING_TYPES = ("text/event-stream", "application/x-ndjson")
+
+
+class IdempotencyStore:
+    """Stored responses by idempotency key; Redis when configured so every worker sees them"""
+
+    def __init__(self, redis_client=None, ttl: int = IDEMPOTENCY_TTL_SECONDS):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.local = LocalCache(max_entries=10000, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, fingerprint: str) -> Optional[dict]:
+        """Lock the key for a first request and return None, or return what is already recorded"""
+        pending = {"state": "pending", "fingerprint": fingerprint}
+        if self.redis is not None:
+            try:
+                if self.redis.set(IDEMPOTENCY_PREFIX + key, json.dumps(pending), nx=True, ex=IDEMPOTENCY_LOCK_SECONDS):
+                    return None
+                stored = self.redis.get(IDEMPOTENCY_PREFIX + key)
+                # 鎖剛好過期時當作新請求
+                return json.loads(stored) if stored else self.reserve(key, fingerprint)
+            except redis.RedisError as exc:
+                logger.warning("idempotency store unavailable, using local store: %s", exc)
+        with self._lock:
+            stored = self.local.get(key)
+            if stored is None:
+                self.local.set(key, pending)
+            return stored
+
+    def save(self, key: str, record: dict):
+        if self.redis is not None:
+            try:
+                self.redis.set(IDEMPOTENCY_PREFIX + key, json.dumps(record), ex=self.ttl)
+                return
+            except redis.RedisError as exc:
+                logger.warning("idempotency store write failed: %s", exc)
+        self.local.set(key, record)
+
+    def release(self, key: str):
+        if self.redis is not None:
+            try:
+                self.redis.delete(IDEMPOTENCY_PREFIX + key)
+            except redis.RedisError as exc:
+                logger.warning("idempotency store release failed: %s", exc)
+        with self._lock:
+            self.local.delete(key)
+
+
+idempotency_store = IdempotencyStore(response_cache.redis)
+
+
+class IdempotencyMiddleware:
+    """Replay the stored response when a POST is retried with the same Idempotency-Key.
+
+    The key is scoped by path and credentials. Reusing a key with a
+    different body is rejected with 422, and a retry that arrives while
+    the first request is still running gets 409. 5xx responses are not
+    stored, so those requests can be retried.
+    """
+
+    def __init__(self, app, store: IdempotencyStore = None):
+        self.app = app
+        self.store = store or idempotency_store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        headers = Headers(scope=scope)
+        idempotency_key = headers.get("idempotency-key")
+        # 檔案上傳 (大量匯入) 不緩衝整個請求
+        if not idempotency_key or headers.get("content-type", "").startswith("multipart/"):
+            return await self.app(scope, receive, send)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)
+            return await response(scope, receive, send)
+
+        chunks, more_body = [], True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        scope_key = auth_scope(Request(scope)) or "public"
+        key = f"{scope_key}|{scope['path']}|{idempotency_key}"
+
+        stored = await run_in_threadpool(self.store.reserve, key, fingerprint)
+        if stored is not None:
+            return await self.stored_response(stored, fingerprint)(scope, receive, send)
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        record = {"state": "done", "fingerprint": fingerprint, "status": 500, "headers": [], "body": b""}
+        storable = True
+
+        async def capture_send(message):
+            nonlocal storable
+            if message["type"] == "http.response.start":
+                record["status"] = message["status"]
+                record["headers"] = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in message["headers"]]
+                content_type = Headers(raw=message["headers"]).get("content-type", "")
+                storable = not content_type.startswith(STREAMING_TYPES)
+            elif message["type"] == "http.response.body" and storable:
+                record["body"] += message.get("body", b"")
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await run_in_threadpool(self.store.release, key)
+            raise
+        if storable and record["status"] < 500:
+            record["body"] = base64.b64encode(record["body"]).decode()
+            await run_in_threadpool(self.store.save, key, record)
+        else:
+            await run_in_threadpool(self.store.release, key)
+
+    @staticmethod
+    def stored_response(stored: dict, fingerprint: str) -> Response:
+        if stored["fingerprint"] != fingerprint:
+            return JSONResponse({"detail": "Idempotency-Key was already used with a different request body"}, status_code=422)
+        if stored["state"] == "pending":
+            return JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress"},
+                status_code=409,
+                headers={"Retry-After": "1"},
+            )
+        response = Response(content=base64.b64decode(stored["body"]), status_code=stored["status"])
+        response.raw_headers = [
+            (name.encode("latin-1"), value.encode("latin-1")) for name, value in stored["headers"]
+        ] + [(b"idempotent-replayed", b"true")]
+        return response
@@ -0,0 +1,202 @@
+from typing import NamedTuple
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import re
+import time
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CONCURRENCY_LIMIT_ENABLED = os.getenv("CONCURRENCY_LIMIT_ENABLED", "true").lower() == "true"
+CONCURRENCY_INITIAL_LIMIT = int(os.getenv("CONCURRENCY_INITIAL_LIMIT", "20"))
+CONCURRENCY_MIN_LIMIT = int(os.getenv("CONCURRENCY_MIN_LIMIT", "4"))
+CONCURRENCY_MAX_LIMIT = int(os.getenv("CONCURRENCY_MAX_LIMIT", "200"))
+
+# Long-lived or trivial routes that never take a slot
+EXEMPT_PATHS = {"/health", "/api/changes/stream"}
+# Path segments marking bulk endpoints
+BULK_SEGMENTS = {"export", "import", "bulk"}
+# Anonymous writes from the public site
+PUBLIC_WRITES = {"/api/contact/"}
+# Reads made only by the admin UI, listed by route since several live outside /api/admin/.
+# An Authorization header alone does not raise priority, since anyone can send one.
+ADMIN_READS = [
+    re.compile(pattern)
+    for pattern in (r"/api/admin/.*", r"/api/auth/me", r"/api/news/admin/all", r"/api/contact/(\d+)?")
+]
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class PriorityClass(NamedTuple):
+    name: str
+    priority: int  # 數字越小越優先
+    share: float  # fraction of the limit this class may fill
+    max_wait: float  # seconds to queue for a slot before being shed; 0 sheds immediately
+
+
+ADMIN = PriorityClass("admin", 0, 1.0, 5.0)
+PUBLIC = PriorityClass("public", 1, 0.9, 1.0)
+BULK = PriorityClass("bulk", 2, 0.5, 0.0)
+
+
+def classify(request: Request) -> PriorityClass:
+    path = request.url.path
+    segments = set(path.strip("/").split("/"))
+    if segments & BULK_SEGMENTS:
+        return BULK
+    if request.method not in READ_METHODS:
+        return PUBLIC if path in PUBLIC_WRITES else ADMIN
+    if any(route.fullmatch(path) for route in ADMIN_READS):
+        return ADMIN
+    return PUBLIC
+
+
+class GradientLimit:
+    """Concurrency limit driven by the latency gradient.
+
+    A long-term latency average stands in for the no-load latency; when
+    recent latency rises above it (by more than the tolerance) the limit
+    shrinks in proportion, otherwise it grows by about sqrt(limit), which
+    leaves room for a small queue. Overload responses cut it by 10%.
+    """
+
+    def __init__(
+        self,
+        initial: int = CONCURRENCY_INITIAL_LIMIT,
+        min_limit: int = CONCURRENCY_MIN_LIMIT,
+        max_limit: int = CONCURRENCY_MAX_LIMIT,
+        tolerance: float = 1.5,
+        smoothing: float = 0.2,
+    ):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.long_rtt = None
+        self.short_rtt = None
+
+    def update(self, rtt: float, inflight: int, dropped: bool = False):
+        if dropped:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+            return
+        if self.long_rtt is None:
+            self.long_rtt = self.short_rtt = rtt
+        self.long_rtt += (rtt - self.long_rtt) / 600
+        self.short_rtt += (rtt - self.short_rtt) / 10
+        # 長期平均被持續的高延遲拉高時，讓它回落，避免把過載當成常態
+        if self.long_rtt / self.short_rtt > 2:
+            self.long_rtt *= 0.95
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_rtt / self.short_rtt))
+        # 使用量不到一半時延遲不能反映上限是否足夠，只允許下修
+        if gradient >= 1.0 and inflight < self.limit / 2:
+            return
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - self.smoothing) + target * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+
+class ConcurrencyLimiter:
+    """Admits requests up to the adaptive limit; waiters are woken highest priority first"""
+
+    def __init__(self, limit: GradientLimit = None):
+        self.limit = limit or GradientLimit()
+        self.inflight = 0
+        self.shed = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+
+    def _has_room(self, cls: PriorityClass) -> bool:
+        return self.inflight < max(1, int(self.limit.limit * cls.share))
+
+    async def acquire(self, cls: PriorityClass) -> bool:
+        # 移除已逾時或取消的等待者
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        queued_ahead = self._waiters and self._waiters[0][0] <= cls.priority
+        if self._has_room(cls) and not queued_ahead:
+            self.inflight += 1
+            return True
+        if cls.max_wait <= 0:
+            self.shed += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (cls.priority, next(self._sequence), waiter, cls))
+        try:
+            await asyncio.wait_for(waiter, cls.max_wait)
+            return True
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            # 已分配到名額卻被取消 (客戶端斷線)，歸還名額
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self.inflight -= 1
+        while self._waiters and self._has_room(self._waiters[0][3]):
+            _, _, waiter, _ = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            self.inflight += 1
+            waiter.set_result(True)
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit.limit, 1),
+            "inflight": self.inflight,
+            "queued": sum(1 for waiter in self._waiters if not waiter[2].done()),
+            "shed": self.shed,
+        }
+
+
+concurrency_limiter = ConcurrencyLimiter()
+
+
+class ConcurrencyLimitMiddleware:
+    """Shed low-priority requests with 503 before they slow down the rest.
+
+    Pure ASGI, so the slot is held until the last body chunk is sent: a
+    streamed import or export keeps counting against the bulk share for
+    as long as it runs, not just until its headers go out.
+    """
+
+    def __init__(self, app, limiter: ConcurrencyLimiter = None):
+        self.app = app
+        self.limiter = limiter or concurrency_limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not CONCURRENCY_LIMIT_ENABLED or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+        cls = classify(Request(scope))
+        if not await self.limiter.acquire(cls):
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server is busy, please retry shortly"},
+                headers={"Retry-After": "1"},
+            )
+            return await response(scope, receive, send)
+        inflight = self.limiter.inflight
+        start = time.monotonic()
+        status_code = 500
+
+        async def record_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, record_status)
+        finally:
+            self.limiter.release()
+            # 大量匯入/匯出本來就慢，不納入延遲取樣
+            if cls is not BULK:
+                self.limiter.limit.update(time.monotonic() - start, inflight, dropped=status_code in (503, 504))
@@ -1,9 +1,34 @@
 from fastapi import FastAPI
+import logging
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, products, cases, techniques, contact, news, jobs
+from sqlalchemy.exc import OperationalError
+from app.breaker import CircuitBreakerMiddleware
+from app.database import read_your_writes_middleware
+from app.deadlines import DeadlineExceeded, deadline_middleware, deadline_response, is_query_canceled
+from app.idempotency import IdempotencyMiddleware
+from app.limiter import ConcurrencyLimitMiddleware
+from app.partitions import ensure_partitions
+from app.related import related_refresher
+from app.snapshot import snapshot_mode_middleware, snapshot_source
+from app.routers import auth, products, cases, techniques, contact, news, jobs, changes, admin, suggest, sitemap
 
 app = FastAPI(title="酪梨智慧 API", version="1.0.0")
 
+# 自適應併發上限，過載時依優先級排隊或回 503；在 CORS 之內註冊，503 也帶 CORS 標頭
+app.add_middleware(ConcurrencyLimitMiddleware)
+
+# 每個請求的時間預算 (含排隊時間)，剩餘時間成為每個交易的 statement_timeout，用完回 504
+app.middleware("http")(deadline_middleware)
+
+# 帶 Idempotency-Key 的 POST 重送時回放第一次的回應，不佔併發名額
+app.add_middleware(IdempotencyMiddleware)
+
+# Postgres 連不上時開路：公開 GET 回最後一次成功的副本 (標示過期)，其餘回 503，背景探測恢復
+app.add_middleware(CircuitBreakerMiddleware)
+
+# 唯讀快照節點：寫入回 405，需要 Postgres 的路由回 404
+app.middleware("http")(snapshot_mode_middleware)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -11,8 +36,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "X-Total-Count-Exact"],
 )
 
+# 寫入後短時間內的讀取改走主庫 (read-your-writes)
+app.middleware("http")(read_your_writes_middleware)
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request, exc):
+    return deadline_response()
+
+@app.exception_handler(OperationalError)
+async def statement_timeout(request, exc):
+    if is_query_canceled(exc):
+        return deadline_response()
+    raise exc
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(contact.router, prefix="/api/contact", tags=["Contact"])
@@ -21,6 +60,25 @@ app.include_router(news.router, prefix="/api/news", tags=["News"])
 app.include_router(cases.router, prefix="/api/cases", tags=["Cases"])
 app.include_router(products.router, prefix="/api/products", tags=["Products"])
 app.include_router(techniques.router, prefix="/api/techniques", tags=["Techniques"])
+app.include_router(changes.router, prefix="/api/changes", tags=["Changes"])
+app.include_router(suggest.router, prefix="/api/suggest", tags=["Suggest"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+app.include_router(sitemap.router, prefix="/api", tags=["Feeds"])
+
+@app.on_event("startup")
+def create_upcoming_partitions():
+    # 每次啟動補齊接下來幾個月的分區；失敗時資料落入預設分區，不影響寫入
+    if snapshot_source is not None:
+        return
+    try:
+        ensure_partitions()
+    except Exception as exc:
+        logging.getLogger(__name__).warning("could not create upcoming partitions: %s", exc)
+
+@app.on_event("startup")
+def start_related_refresher():
+    # 啟動時在背景擬合模型，第一次寫入只需增量更新
+    related_refresher.start()
 
 @app.get("/")
 def read_root():
@@ -28,6 +86,9 @@ def read_root():
 
 @app.get("/health")
 def health_check():
+    if snapshot_source is not None:
+        snapshot_source.refresh()
+        return {"status": "healthy", "message": "酪梨智慧 API is running", "snapshot": snapshot_source.exported_at}
     return {"status": "healthy", "message": "酪梨智慧 API is running"}
 
 @app.get("/test/jobs")
@@ -0,0 +1,51 @@
+import os
+from typing import List, Optional
+from dotenv import load_dotenv
+
+from .compaction import COMPACTION_RETENTION_DAYS, compact_all
+from .database import engine
+from .dedupe import purge_contact_digests
+from .partitions import CONTACT_RETENTION_MONTHS, apply_retention, ensure_partitions
+from .related import rebuild_related
+from .snapshot_export import export_snapshot
+from .tasks import purge_tasks, task
+
+load_dotenv()
+
+DAY = 24 * 60 * 60
+# Set on the primary to have the workers publish the edge snapshot on a schedule
+SNAPSHOT_EXPORT_PATH = os.getenv("SNAPSHOT_EXPORT_PATH", "")
+SNAPSHOT_EXPORT_SECONDS = int(os.getenv("SNAPSHOT_EXPORT_SECONDS", "3600"))
+
+# 以下為 worker.py 執行的定期維護工作，取代各自的 cron 排程
+
+
+@task(queue="maintenance", every=DAY)
+def compact_content(tables: Optional[List[str]] = None, days: int = COMPACTION_RETENTION_DAYS):
+    compact_all(tables, retention_days=days)
+
+
+@task(queue="maintenance", every=DAY)
+def manage_partitions(months: int = CONTACT_RETENTION_MONTHS):
+    ensure_partitions()
+    apply_retention(months=months)
+
+
+@task(queue="maintenance", every=DAY)
+def build_related():
+    rebuild_related()
+
+
+@task(queue="maintenance", every=DAY)
+def purge_finished_tasks():
+    purge_tasks()
+
+
+@task(queue="maintenance", every=DAY)
+def purge_expired_contact_digests():
+    purge_contact_digests()
+
+
+@task(name="export_snapshot", queue="snapshot", max_attempts=3, every=SNAPSHOT_EXPORT_SECONDS if SNAPSHOT_EXPORT_PATH else None)
+def export_snapshot_task(path: str = SNAPSHOT_EXPORT_PATH):
+    export_snapshot(engine, path)
@@ -0,0 +1,363 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+import importlib.util
+import logging
+import os
+import re
+import time
+from psycopg2 import errorcodes
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from dotenv import load_dotenv
+
+from .database import engine as default_engine
+from .models import Base
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+# Every DDL statement waits at most this long for its lock, so it never queues
+# behind a long query while holding up every query that arrives after it
+MIGRATION_LOCK_TIMEOUT = os.getenv("MIGRATION_LOCK_TIMEOUT", "3s")
+MIGRATION_LOCK_RETRIES = int(os.getenv("MIGRATION_LOCK_RETRIES", "5"))
+MIGRATION_RETRY_SECONDS = 0.5
+MIGRATION_BATCH_ROWS = 1000
+# Pause between backfill batches so replicas and autovacuum keep up
+MIGRATION_BATCH_PAUSE_SECONDS = 0.05
+
+VERSION_FILE = re.compile(r"^(?P<version>\d{4})_(?P<name>\w+)\.py$")
+
+# 各種鎖對線上流量的影響，供 dry run 報告
+LOCK_EFFECTS = {
+    None: "no lock on existing tables",
+    "ROW EXCLUSIVE": "row locks per batch; reads and other writes continue",
+    "SHARE UPDATE EXCLUSIVE": "reads and writes continue; other DDL and VACUUM wait",
+    "SHARE": "reads continue; writes wait",
+    "SHARE ROW EXCLUSIVE": "reads continue; writes wait",
+    "ACCESS EXCLUSIVE": "reads and writes wait",
+}
+
+
+def is_lock_timeout(exc: OperationalError) -> bool:
+    return getattr(exc.orig, "pgcode", None) == errorcodes.LOCK_NOT_AVAILABLE
+
+
+def with_lock_retry(action: Callable[[], object], description: str, retries: int = MIGRATION_LOCK_RETRIES):
+    """Run action, backing off and retrying when it gives up waiting for a lock"""
+    attempt = 0
+    while True:
+        try:
+            return action()
+        except OperationalError as exc:
+            if not is_lock_timeout(exc) or attempt >= retries:
+                raise
+            attempt += 1
+            logger.warning("lock timeout on %s, retry %d/%d", description, attempt, retries)
+            time.sleep(MIGRATION_RETRY_SECONDS * 2 ** attempt)
+
+
+@dataclass
+class Step:
+    description: str
+    lock: Optional[str]
+    table: Optional[str]
+    # 只改目錄資料：鎖只持有數毫秒；否則持有到整個步驟結束
+    brief: bool
+    run: Callable[[Engine], object] = field(repr=False)
+
+    @property
+    def effect(self) -> str:
+        effect = LOCK_EFFECTS[self.lock]
+        if self.lock == "ACCESS EXCLUSIVE":
+            effect += " for milliseconds (catalog only)" if self.brief else " for the whole step"
+        return effect
+
+
+def _transaction(*statements: str) -> Callable[[Engine], None]:
+    def run(engine: Engine):
+        with engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'"))
+            for statement in statements:
+                conn.execute(text(statement))
+    return run
+
+
+def _constraint_exists(conn: Connection, table: str, name: str) -> bool:
+    return conn.execute(
+        text("SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(:table) AND conname = :name)"),
+        {"table": table, "name": name},
+    ).scalar()
+
+
+class Operations:
+    """The schema changes a migration declares, each planned with the lock it takes.
+
+    up(op) only records steps; the runner executes them one by one, or
+    prints them for a dry run. Every step is idempotent, so a migration
+    interrupted halfway is simply run again.
+    """
+
+    def __init__(self):
+        self.steps: List[Step] = []
+
+    def _add(self, description: str, lock: Optional[str], table: Optional[str], brief: bool, run: Callable[[Engine], object]):
+        self.steps.append(Step(description, lock, table, brief, run))
+
+    def create_tables(self, *tables: str):
+        """Create tables from app.models that do not exist yet (all of them when none are named)"""
+        selected = [Base.metadata.tables[name] for name in tables] or None
+
+        def run(engine: Engine):
+            with engine.begin() as conn:
+                Base.metadata.create_all(conn, tables=selected, checkfirst=True)
+        self._add(f"create missing tables {', '.join(tables) or '(all models)'}", None, None, True, run)
+
+    def add_column(self, table: str, column: str, definition: str):
+        """Add a nullable column, or one with a constant default; neither rewrites the table"""
+        statement = f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}"
+        self._add(statement, "ACCESS EXCLUSIVE", table, True, _transaction(statement))
+
+    def drop_column(self, table: str, column: str):
+        statement = f"ALTER TABLE {table} DROP COLUMN IF EXISTS {column}"
+        self._add(statement, "ACCESS EXCLUSIVE", table, True, _transaction(statement))
+
+    def create_index(self, name: str, table: str, columns: str, using: Optional[str] = None, unique: bool = False):
+        """CREATE INDEX CONCURRENTLY; an invalid index left by an earlier failed attempt is dropped first.
+
+        Partitioned tables cannot be indexed concurrently: the index is
+        created ON ONLY the parent, built concurrently on each partition and
+        attached, and becomes valid once every partition has it.
+        """
+        def create(target: str, index: str, only: bool = False) -> str:
+            return (
+                f"CREATE {'UNIQUE ' if unique else ''}INDEX {'' if only else 'CONCURRENTLY '}IF NOT EXISTS {index} "
+                f"ON {'ONLY ' if only else ''}{target}{f' USING {using}' if using else ''} ({columns})"
+            )
+
+        def run(engine: Engine):
+            # CONCURRENTLY 不能在交易內執行
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(f"SET lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'"))
+                try:
+                    valid = conn.execute(
+                        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+                    ).scalar()
+                    kind = conn.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar()
+                    if kind != "p":
+                        if valid is False:
+                            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+                        conn.execute(text(create(table, name)))
+                        return
+                    if valid:
+                        return
+                    conn.execute(text(create(table, name, only=True)))
+                    children = conn.execute(
+                        text("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(:table)"),
+                        {"table": table},
+                    ).scalars().all()
+                    for child in children:
+                        index = f"{child}_{name.removeprefix('ix_')}"[:63]
+                        conn.execute(text(create(child, index)))
+                        conn.execute(text(f"ALTER INDEX {name} ATTACH PARTITION {index}"))
+                finally:
+                    conn.execute(text("RESET lock_timeout"))
+        self._add(create(table, name), "SHARE UPDATE EXCLUSIVE", table, False, run)
+
+    def backfill(
+        self,
+        table: str,
+        assignments: str,
+        where: str,
+        batch_rows: int = MIGRATION_BATCH_ROWS,
+        pause: float = MIGRATION_BATCH_PAUSE_SECONDS,
+    ):
+        """UPDATE table SET assignments WHERE where, in id-ordered batches of short transactions"""
+        statement = text(
+            f"WITH batch AS (SELECT id FROM {table} WHERE id > :after AND ({where}) ORDER BY id LIMIT :batch) "
+            f"UPDATE {table} SET {assignments} FROM batch WHERE {table}.id = batch.id RETURNING {table}.id"
+        )
+        self.run_batches(
+            f"UPDATE {table} SET {assignments} WHERE {where} (batches of {batch_rows})",
+            lambda conn, after: conn.execute(statement, {"after": after, "batch": batch_rows}).scalars().all(),
+            "ROW EXCLUSIVE",
+            table,
+            pause,
+        )
+
+    def run_batches(
+        self,
+        description: str,
+        batch: Callable[[Connection, int], List[int]],
+        lock: Optional[str],
+        table: Optional[str] = None,
+        pause: float = MIGRATION_BATCH_PAUSE_SECONDS,
+    ):
+        """Custom code in id-ordered batches, one short transaction each.
+
+        batch(conn, after) handles the next rows with an id above after and
+        returns their ids; the step ends when it returns none.
+        """
+        def run(engine: Engine) -> int:
+            after, done = 0, 0
+            while True:
+                def attempt():
+                    with engine.begin() as conn:
+                        conn.execute(text(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'"))
+                        return batch(conn, after)
+                ids = with_lock_retry(attempt, description)
+                if not ids:
+                    return done
+                after, done = max(ids), done + len(ids)
+                time.sleep(pause)
+        self._add(description, lock, table, False, run)
+
+    def add_check(self, table: str, name: str, condition: str):
+        """Add a CHECK constraint as NOT VALID, then validate it without blocking writes"""
+        def add(engine: Engine):
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'"))
+                if not _constraint_exists(conn, table, name):
+                    conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} CHECK ({condition}) NOT VALID"))
+        self._add(f"ALTER TABLE {table} ADD CONSTRAINT {name} CHECK ({condition}) NOT VALID", "ACCESS EXCLUSIVE", table, True, add)
+        validate = f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"
+        self._add(validate, "SHARE UPDATE EXCLUSIVE", table, False, _transaction(validate))
+
+    def set_not_null(self, table: str, column: str):
+        """SET NOT NULL without a scan under ACCESS EXCLUSIVE: a validated CHECK proves it first"""
+        check = f"{table}_{column}_not_null"
+        self.add_check(table, check, f"{column} IS NOT NULL")
+        statement = f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"
+        self._add(statement, "ACCESS EXCLUSIVE", table, True, _transaction(statement))
+        drop = f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}"
+        self._add(drop, "ACCESS EXCLUSIVE", table, True, _transaction(drop))
+
+    def run(
+        self,
+        description: str,
+        action: Callable[[Connection], object],
+        lock: Optional[str],
+        table: Optional[str] = None,
+        brief: bool = False,
+    ):
+        """Custom code in one transaction with the lock timeout set; action must be safe to run twice.
+
+        brief marks an action that only changes the catalog while holding lock.
+        """
+        def run(engine: Engine):
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{MIGRATION_LOCK_TIMEOUT}'"))
+                return action(conn)
+        self._add(description, lock, table, brief, run)
+
+
+@dataclass
+class Migration:
+    version: str
+    description: str
+    up: Callable[[Operations], None] = field(repr=False)
+
+    def plan(self) -> List[Step]:
+        op = Operations()
+        self.up(op)
+        return op.steps
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Migrations from NNNN_name.py files in directory, in version order"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = VERSION_FILE.match(filename)
+        if match is None:
+            continue
+        spec = importlib.util.spec_from_file_location(f"migrations.{filename[:-3]}", os.path.join(directory, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        description = (module.__doc__ or match["name"].replace("_", " ")).strip().splitlines()[0]
+        migrations.append(Migration(filename[:-3], description, module.up))
+    versions = [migration.version[:4] for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate migration versions: {', '.join(duplicates)}")
+    return migrations
+
+
+def ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations (version VARCHAR PRIMARY KEY, description TEXT, "
+        "applied_at TIMESTAMP NOT NULL, duration_seconds FLOAT)"
+    ))
+
+
+def applied_versions(conn: Connection) -> Dict[str, datetime]:
+    if conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar() is None:
+        return {}
+    return dict(conn.execute(text("SELECT version, applied_at FROM schema_migrations")).all())
+
+
+def table_rows(conn: Connection, table: str) -> Optional[int]:
+    """Planner estimate of table's rows, for sizing locks and backfills in a dry run"""
+    rows = conn.execute(text("SELECT reltuples FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}).scalar()
+    return int(rows) if rows is not None and rows >= 0 else None
+
+
+def migrate(
+    target: Optional[str] = None,
+    dry_run: bool = False,
+    directory: str = MIGRATIONS_DIR,
+    engine: Engine = default_engine,
+    report: Callable[[str], None] = print,
+) -> List[Migration]:
+    """Apply every pending migration up to target in version order; with dry_run only report the plan.
+
+    A session advisory lock keeps two deploys from migrating at once.
+    Each migration is recorded in schema_migrations once all its steps
+    have run.
+    """
+    pending = []
+    with engine.connect() as guard:
+        if not dry_run:
+            guard.execute(text("SELECT pg_advisory_lock(hashtext('schema_migrations'))"))
+            guard.commit()
+        try:
+            applied = applied_versions(guard)
+            guard.commit()
+            pending = [
+                migration for migration in load_migrations(directory)
+                if migration.version not in applied and (target is None or migration.version[:4] <= target[:4])
+            ]
+            for migration in pending:
+                steps = migration.plan()
+                report(f"{'📝' if dry_run else '🔄'} {migration.version}: {migration.description}")
+                started = time.monotonic()
+                for number, step in enumerate(steps, 1):
+                    if dry_run:
+                        size = table_rows(guard, step.table) if step.table else None
+                        rows = f", ~{size} rows" if size is not None else ""
+                        report(f"   {number}. {step.description}")
+                        report(f"      lock: {step.lock or 'none'}{rows}: {step.effect}")
+                        continue
+                    with_lock_retry(lambda: step.run(engine), step.description)
+                    report(f"   ✅ {step.description}")
+                if dry_run:
+                    continue
+                with engine.begin() as conn:
+                    ensure_version_table(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migrations VALUES (:version, :description, :applied_at, :duration)"),
+                        {
+                            "version": migration.version,
+                            "description": migration.description,
+                            "applied_at": datetime.utcnow(),
+                            "duration": round(time.monotonic() - started, 3),
+                        },
+                    )
+            guard.rollback()
+        finally:
+            if not dry_run:
+                guard.execute(text("SELECT pg_advisory_unlock(hashtext('schema_migrations'))"))
+                guard.commit()
+    return pending
@@ -1,10 +1,13 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, ARRAY
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey, ARRAY, JSON, Index, DDL, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 Base = declarative_base()
 
+# 字串陣列；唯讀 SQLite 快照中以 JSON 儲存
+StringArray = ARRAY(String).with_variant(JSON, "sqlite")
+
 class User(Base):
     __tablename__ = "users"
     
@@ -16,68 +19,112 @@ class User(Base):
 
 class Contact(Base):
     __tablename__ = "contacts"
+    # 依 created_at 按月分區，舊分區由 manage_partitions.py 歸檔後移除
+    __table_args__ = (
+        Index("ix_contacts_content_hash_created_at", "content_hash", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
+    # 分區表的主鍵必須包含分區鍵
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     name = Column(String)
     email = Column(String)
     company = Column(String)
     phone = Column(String)
     message = Column(Text)
-    interest = Column(String)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    interest = Column(String, index=True)
+    content_hash = Column(String(64))  # email + message digest for duplicate suppression
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow, index=True)
+
+class ContactDigest(Base):
+    """One row per contact digest submitted within the dedupe window; see app.dedupe.
+
+    contacts is partitioned by created_at, so a unique index there would
+    have to include created_at and could not reject a repeat. This table
+    holds the unique key instead.
+    """
+    __tablename__ = "contact_digests"
+
+    content_hash = Column(String(64), primary_key=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+
+# 預設分區接住還沒有月分區的資料，避免寫入失敗
+event.listen(
+    Contact.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS contacts_default PARTITION OF contacts DEFAULT").execute_if(dialect="postgresql"),
+)
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_tags", "tags", postgresql_using="gin"),
+        Index("ix_jobs_updated_at_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    department = Column(String, nullable=False)
-    location = Column(String, nullable=False)
-    type = Column(String, nullable=False)  # Full-time, Part-time, Contract
+    department = Column(String, nullable=False, index=True)
+    location = Column(String, nullable=False, index=True)
+    type = Column(String, nullable=False, index=True)  # Full-time, Part-time, Contract
     salary = Column(String, nullable=False)
     description = Column(Text, nullable=False)
-    requirements = Column(ARRAY(String), nullable=False)
-    benefits = Column(ARRAY(String), nullable=False)
-    tags = Column(ARRAY(String), default=[])  # 新增 tags 欄位
-    posted_date = Column(DateTime, default=datetime.utcnow)
+    requirements = Column(StringArray, nullable=False)
+    benefits = Column(StringArray, nullable=False)
+    tags = Column(StringArray, default=[])  # 新增 tags 欄位
+    posted_date = Column(DateTime, default=datetime.utcnow, index=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class News(Base):
     __tablename__ = "news"
+    __table_args__ = (
+        Index("ix_news_category_published_date", "category", "published_date"),
+        Index("ix_news_updated_at_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
     content = Column(Text, nullable=False)
     category = Column(String, nullable=False)  # Product Launch, Company News, Industry Update
-    published_date = Column(DateTime, default=datetime.utcnow)
+    published_date = Column(DateTime, default=datetime.utcnow, index=True)
     is_published = Column(Boolean, default=True)
-    images = Column(ARRAY(String), default=[])  # 存儲圖片URL列表，最多3張
+    images = Column(StringArray, default=[])  # 存儲圖片URL列表，最多3張
+    # 由 content (Markdown) 在寫入時產生，見 rendering.py
+    content_html = Column(Text)
+    excerpt = Column(String)
+    reading_time = Column(Integer)  # minutes
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Case(Base):
     __tablename__ = "cases"
+    __table_args__ = (
+        Index("ix_cases_updated_at_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    industry = Column(String, nullable=False)
+    industry = Column(String, nullable=False, index=True)
     challenge = Column(Text, nullable=False)
     solution = Column(Text, nullable=False)
-    results = Column(ARRAY(String), nullable=False)
+    results = Column(StringArray, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_updated_at_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    category = Column(String, nullable=False)
+    category = Column(String, nullable=False, index=True)
     description = Column(Text, nullable=False)
-    features = Column(ARRAY(String), nullable=False)
+    features = Column(StringArray, nullable=False)
     price = Column(String, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -85,12 +132,54 @@ class Product(Base):
 
 class Technique(Base):
     __tablename__ = "techniques"
+    __table_args__ = (
+        Index("ix_techniques_updated_at_id", "updated_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    category = Column(String, nullable=False)  # AI, ML, Cybersecurity, Data Analysis
+    category = Column(String, nullable=False, index=True)  # AI, ML, Cybersecurity, Data Analysis
     description = Column(Text, nullable=False)
-    features = Column(ARRAY(String), nullable=False)
+    features = Column(StringArray, nullable=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
\ No newline at end of file
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow) 
+
+class RelatedItem(Base):
+    """Precomputed nearest neighbours of a job, news item or case, rebuilt by app.related"""
+    __tablename__ = "related_items"
+
+    source_table = Column(String(20), primary_key=True)
+    source_id = Column(Integer, primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    target_table = Column(String(20), nullable=False)
+    target_id = Column(Integer, nullable=False)
+    title = Column(String, nullable=False)  # 冗餘存放標題，詳情頁只需一次查詢
+    score = Column(Float, nullable=False)
+
+class Task(Base):
+    """A unit of background work run by worker.py; see app.tasks"""
+    __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_status_finished_at", "status", "finished_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    queue = Column(String(50), nullable=False, default="default")
+    name = Column(String(100), nullable=False)
+    payload = Column(JSON, nullable=False, default={})
+    priority = Column(Integer, nullable=False, default=0)  # 數字大者先執行
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, done, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=5)
+    unique_key = Column(String(200), unique=True)  # 相同鍵只排入一次，例如週期任務的每個時段
+    run_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = Column(DateTime)
+    locked_by = Column(String(100))
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+# 只索引待執行的任務，領取時依優先級與時間取第一筆
+Index("ix_tasks_ready", Task.queue, Task.priority.desc(), Task.run_at, Task.id, postgresql_where=Task.status == "queued")
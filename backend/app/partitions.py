@@ -0,0 +1,223 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import gzip
+import json
+import logging
+import os
+import re
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from dotenv import load_dotenv
+
+from .database import engine
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Monthly partitions older than this are detached, archived and dropped
+CONTACT_RETENTION_MONTHS = int(os.getenv("CONTACT_RETENTION_MONTHS", "24"))
+# Partitions are created this many months ahead so inserts never land in the default partition
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "3"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# Partition DDL waits at most this long for locks instead of queueing behind long queries
+PARTITION_LOCK_TIMEOUT = "5s"
+ARCHIVE_FETCH_ROWS = 10000
+
+# 分區表與其分區鍵
+PARTITIONED_TABLES = {"contacts": "created_at"}
+PARTITION_NAME = re.compile(r"^(?P<table>[a-z_]+)_(?P<year>\d{4})_(?P<month>\d{2})$")
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_{start:%Y_%m}"
+
+
+def parse_partition(name: str) -> Optional[Tuple[str, datetime]]:
+    match = PARTITION_NAME.match(name)
+    if match is None:
+        return None
+    return match["table"], datetime(int(match["year"]), int(match["month"]), 1)
+
+
+def _bounds(start: datetime) -> str:
+    # DDL 不能用綁定參數；邊界由 datetime 產生，不含使用者輸入
+    return f"FROM ('{start:%Y-%m-%d %H:%M:%S}') TO ('{add_months(start, 1):%Y-%m-%d %H:%M:%S}')"
+
+
+def _lock(conn: Connection, table: str):
+    conn.execute(text(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}'"))
+    # 多個 worker 同時啟動時只讓一個建立分區
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"partitions:{table}"})
+
+
+def partitions(conn: Connection, table: str) -> Dict[str, datetime]:
+    """Monthly partitions currently attached to table, by name"""
+    rows = conn.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table)"
+        ),
+        {"table": table},
+    ).scalars()
+    attached = {}
+    for name in rows:
+        parsed = parse_partition(name)
+        if parsed and parsed[0] == table:
+            attached[name] = parsed[1]
+    return attached
+
+
+def create_partition(conn: Connection, table: str, start: datetime, column: Optional[str] = None) -> bool:
+    """Create the partition for the month starting at start; False if it already exists.
+
+    Rows the default partition caught for that month are moved into the new
+    partition before it is attached, since attaching would otherwise fail.
+    column is the partition key, looked up in PARTITIONED_TABLES by default.
+    """
+    name = partition_name(table, start)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return False
+    column = column or PARTITIONED_TABLES[table]
+    default = f"{table}_default"
+    in_month = f"{column} >= :start AND {column} < :end"
+    params = {"start": start, "end": add_months(start, 1)}
+    caught = conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})"), params).scalar()
+    if not caught:
+        conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} FOR VALUES {_bounds(start)}"))
+        return True
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    conn.execute(
+        text(f"WITH moved AS (DELETE FROM {default} WHERE {in_month} RETURNING *) INSERT INTO {name} SELECT * FROM moved"),
+        params,
+    )
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES {_bounds(start)}"))
+    logger.info("moved rows for %s out of %s", name, default)
+    return True
+
+
+def create_partitions(conn: Connection, table: str, first: datetime, last: datetime, column: Optional[str] = None) -> List[str]:
+    """Create the default partition and every missing monthly partition from first through last"""
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"))
+    created = []
+    start = month_start(first)
+    while start <= last:
+        if create_partition(conn, table, start, column):
+            created.append(partition_name(table, start))
+        start = add_months(start, 1)
+    return created
+
+
+def ensure_partitions(
+    table: str = "contacts",
+    first: Optional[datetime] = None,
+    months_ahead: int = PARTITION_PREMAKE_MONTHS,
+    now: Optional[datetime] = None,
+) -> List[str]:
+    """Create monthly partitions from first (default: this month) through months_ahead months from now"""
+    current = month_start(now or datetime.utcnow())
+    with engine.begin() as conn:
+        _lock(conn, table)
+        created = create_partitions(conn, table, first or current, add_months(current, months_ahead))
+    if created:
+        logger.info("created partitions %s", ", ".join(created))
+    return created
+
+
+def detached_partitions(conn: Connection, table: str) -> Dict[str, datetime]:
+    """Monthly tables of table that were detached but not yet archived"""
+    rows = conn.execute(
+        text(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+            "AND relnamespace = 'public'::regnamespace AND relname LIKE :pattern"
+        ),
+        {"pattern": f"{table}\\_%"},
+    ).scalars()
+    detached = {}
+    for name in rows:
+        parsed = parse_partition(name)
+        if parsed and parsed[0] == table:
+            detached[name] = parsed[1]
+    return detached
+
+
+def archive_partition(name: str, archive_dir: str = ARCHIVE_DIR) -> Tuple[str, int]:
+    """Write every row of a detached partition to <archive_dir>/<table>/<name>.jsonl.gz.
+
+    Rows are streamed through a server-side cursor. The file is written
+    under a temporary name and renamed once complete, so a file with the
+    final name is always a full archive.
+    """
+    table = parse_partition(name)[0]
+    directory = os.path.join(archive_dir, table)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.jsonl.gz")
+    partial = path + ".partial"
+    rows = 0
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor(name=f"archive_{name}")
+        cursor.itersize = ARCHIVE_FETCH_ROWS
+        cursor.execute(f"SELECT * FROM {name} ORDER BY id")
+        with open(partial, "wb") as raw:
+            with gzip.open(raw, "wt", encoding="utf-8") as archive:
+                columns = None
+                for row in cursor:
+                    if columns is None:
+                        columns = [column.name for column in cursor.description]
+                    archive.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=str) + "\n")
+                    rows += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        cursor.close()
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(partial, path)
+    return path, rows
+
+
+def apply_retention(
+    table: str = "contacts",
+    months: int = CONTACT_RETENTION_MONTHS,
+    archive_dir: str = ARCHIVE_DIR,
+    now: Optional[datetime] = None,
+) -> List[dict]:
+    """Detach partitions older than months, archive each to disk, then drop it.
+
+    A partition is dropped only after its archive is written and holds as
+    many rows as the table, so a failure at any step leaves the data in
+    the database and the next run picks the detached table up again.
+    """
+    cutoff = add_months(month_start(now or datetime.utcnow()), -months)
+    with engine.begin() as conn:
+        _lock(conn, table)
+        expired = [name for name, start in sorted(partitions(conn, table).items()) if add_months(start, 1) <= cutoff]
+        for name in expired:
+            # 只改目錄資料，但需要短暫的 ACCESS EXCLUSIVE 鎖
+            conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+    if expired:
+        logger.info("detached partitions %s", ", ".join(expired))
+
+    with engine.connect() as conn:
+        pending = sorted(name for name, start in detached_partitions(conn, table).items() if start < cutoff)
+    archived = []
+    for name in pending:
+        path, rows = archive_partition(name, archive_dir)
+        with engine.begin() as conn:
+            count = conn.execute(text(f"SELECT count(*) FROM {name}")).scalar()
+            if count != rows:
+                logger.error("archive of %s has %d rows, table has %d; keeping the table", name, rows, count)
+                continue
+            conn.execute(text(f"DROP TABLE {name}"))
+        archived.append({"partition": name, "rows": rows, "path": path})
+    return archived
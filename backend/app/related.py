@@ -0,0 +1,402 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import logging
+import math
+import os
+import re
+import threading
+import time
+import numpy as np
+from scipy import sparse
+from sqlalchemy import insert, text, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from .database import SessionLocal, engine
+from .events import RELATED, Change, emit_change, on_change
+from .models import Case, Job, News, RelatedItem
+from .snapshot import snapshot_source
+from .suggest import CJK, normalize
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RELATED_TOP_K = int(os.getenv("RELATED_TOP_K", "5"))
+# Pairs less similar than this are not worth showing
+RELATED_MIN_SCORE = float(os.getenv("RELATED_MIN_SCORE", "0.05"))
+# The in-process model is refitted (and the table fully rewritten) at most this often; in between writes patch it
+RELATED_REFRESH_SECONDS = int(os.getenv("RELATED_REFRESH_SECONDS", "300"))
+# Writes arriving within this window are folded into one refresh
+RELATED_DEBOUNCE_SECONDS = 1.0
+# Rows multiplied against the whole matrix at once when ranking neighbours
+RELATED_BLOCK_ROWS = 256
+
+# Text that describes each item, with the weight of each column; the live column hides deleted rows
+RELATED_SOURCES = {
+    "jobs": (Job, "is_active", [("title", 2), ("tags", 2), ("description", 1)]),
+    "news": (News, "is_published", [("title", 2), ("category", 1), ("content", 1)]),
+    "cases": (Case, "is_active", [("title", 2), ("industry", 1), ("challenge", 1), ("solution", 1)]),
+}
+
+# 英文以單字為詞；中日韓文字沒有空白，以相鄰兩字為詞
+TOKEN = re.compile(rf"[a-z0-9][a-z0-9+#]*|{CJK.pattern}+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or our that the this to was we will with you your".split()
+)
+
+Key = Tuple[str, int]
+Neighbours = List[Tuple[Key, float]]
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in TOKEN.finditer(normalize(text)):
+        token = match.group()
+        if CJK.match(token):
+            tokens.extend([token] if len(token) == 1 else [token[i:i + 2] for i in range(len(token) - 1)])
+        elif len(token) > 1 and token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def term_counts(table: str, values: Dict[str, object]) -> Counter:
+    """Weighted term counts of one item's describing columns"""
+    counts = Counter()
+    for column, weight in RELATED_SOURCES[table][2]:
+        value = values.get(column)
+        for body in value if isinstance(value, list) else [value]:
+            for token in tokenize(str(body or "")):
+                counts[token] += weight
+    return counts
+
+
+class RelatedModel:
+    """TF-IDF vectors of every live item and each item's top-k most similar others.
+
+    Rows are L2-normalized, so a sparse matrix product gives cosine
+    similarity. Items are compared across jobs, news and cases. Between
+    fits, upsert() and remove() patch one row and re-rank only the items
+    whose neighbour lists it can change; the vocabulary and IDF weights
+    stay those of the last fit, so terms new since then are ignored.
+    """
+
+    def __init__(self, top_k: int = RELATED_TOP_K, min_score: float = RELATED_MIN_SCORE):
+        self.top_k = top_k
+        self.min_score = min_score
+        self.keys: List[Key] = []
+        self.rows: Dict[Key, int] = {}
+        self.titles: Dict[Key, str] = {}
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = np.zeros(0)
+        self.matrix = sparse.csr_matrix((0, 0))
+        self.neighbours: Dict[Key, Neighbours] = {}
+
+    def fit(self, documents: Dict[Key, Counter], titles: Dict[Key, str]) -> Dict[Key, Neighbours]:
+        self.keys = list(documents)
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.titles = dict(titles)
+        document_frequency = Counter(term for counts in documents.values() for term in counts)
+        self.vocabulary = {term: column for column, term in enumerate(sorted(document_frequency))}
+        total = len(self.keys)
+        # 平滑 IDF：出現在每一筆的詞權重仍大於零
+        self.idf = np.array(
+            [math.log((1 + total) / (1 + document_frequency[term])) + 1 for term in sorted(document_frequency)]
+        )
+        self.matrix = self._vectors([documents[key] for key in self.keys])
+        self.neighbours = self._rank(range(total))
+        return self.neighbours
+
+    def _vectors(self, documents: Sequence[Counter]) -> sparse.csr_matrix:
+        rows, columns, values = [], [], []
+        for row, counts in enumerate(documents):
+            for term, count in counts.items():
+                column = self.vocabulary.get(term)
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    values.append((1 + math.log(count)) * self.idf[column])
+        matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(documents), len(self.vocabulary)))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+    def _rank(self, rows: Iterable[int]) -> Dict[Key, Neighbours]:
+        rows = list(rows)
+        ranked = {}
+        for start in range(0, len(rows), RELATED_BLOCK_ROWS):
+            block = rows[start:start + RELATED_BLOCK_ROWS]
+            scores = (self.matrix[block] @ self.matrix.T).toarray()
+            for offset, row in enumerate(block):
+                similarity = scores[offset]
+                similarity[row] = 0
+                candidates = np.flatnonzero(similarity >= self.min_score)
+                if len(candidates) > self.top_k:
+                    candidates = candidates[np.argpartition(-similarity[candidates], self.top_k)[:self.top_k]]
+                best = sorted(((self.keys[column], float(similarity[column])) for column in candidates), key=lambda pair: (-pair[1], pair[0]))
+                ranked[self.keys[row]] = best
+        return ranked
+
+    def _replace_row(self, row: int, vector: sparse.csr_matrix):
+        self.matrix = sparse.vstack([self.matrix[:row], vector, self.matrix[row + 1:]], format="csr")
+
+    def _pointing_at(self, key: Key) -> Set[Key]:
+        return {source for source, best in self.neighbours.items() if any(target == key for target, _ in best)}
+
+    def upsert(self, key: Key, counts: Counter, title: str) -> Set[Key]:
+        """Put one item's new text in and re-rank what it can affect; returns the items whose lists were recomputed"""
+        vector = self._vectors([counts])
+        if key in self.rows:
+            row = self.rows[key]
+            self._replace_row(row, vector)
+        else:
+            row = len(self.keys)
+            self.keys.append(key)
+            self.rows[key] = row
+            self.matrix = sparse.vstack([self.matrix, vector], format="csr")
+        self.titles[key] = title
+        similarity = (self.matrix @ vector.T).toarray().ravel()
+        affected = {key} | self._pointing_at(key)
+        # 新分數擠進某筆前 k 名時，那一筆也要重排
+        for other in np.flatnonzero(similarity >= self.min_score):
+            source = self.keys[other]
+            if source not in self.rows or source in affected:
+                continue
+            best = self.neighbours.get(source, [])
+            if len(best) < self.top_k or similarity[other] > best[-1][1]:
+                affected.add(source)
+        self.neighbours.update(self._rank(self.rows[source] for source in affected))
+        return affected
+
+    def remove(self, key: Key) -> Set[Key]:
+        """Drop an item; its row becomes an empty vector until the next fit"""
+        if key not in self.rows:
+            return set()
+        row = self.rows.pop(key)
+        self._replace_row(row, sparse.csr_matrix((1, self.matrix.shape[1])))
+        self.titles.pop(key, None)
+        self.neighbours.pop(key, None)
+        affected = self._pointing_at(key)
+        self.neighbours.update(self._rank(self.rows[source] for source in affected))
+        return affected | {key}
+
+
+def _load_items(db: Session, table: str, ids: Optional[List[int]] = None) -> List[dict]:
+    model, live_column, columns = RELATED_SOURCES[table]
+    names = ["id", live_column, "title"] + [column for column, _ in columns if column != "title"]
+    query = db.query(*[getattr(model, name) for name in names])
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+    else:
+        query = query.filter(getattr(model, live_column) == True)
+    return [dict(zip(["id", "live"] + names[2:], row)) for row in query]
+
+
+def build_model(db: Session) -> RelatedModel:
+    documents, titles = {}, {}
+    for table in RELATED_SOURCES:
+        for item in _load_items(db, table):
+            key = (table, item["id"])
+            documents[key] = term_counts(table, item)
+            titles[key] = item["title"]
+    model = RelatedModel()
+    model.fit(documents, titles)
+    return model
+
+
+def _lock(conn: Connection):
+    # 全部重建與增量更新互斥，避免兩個 worker 交錯寫入同一筆的清單
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('related_items'))"))
+
+
+def save_neighbours(conn: Connection, model: RelatedModel, keys: Optional[Iterable[Key]] = None) -> int:
+    """Replace the stored lists of keys (every item when None) with the model's current ones"""
+    table = RelatedItem.__table__
+    if keys is None:
+        conn.execute(table.delete())
+        keys = list(model.neighbours)
+    else:
+        keys = list(keys)
+        if keys:
+            conn.execute(table.delete().where(tuple_(table.c.source_table, table.c.source_id).in_(keys)))
+    rows = [
+        {
+            "source_table": source[0],
+            "source_id": source[1],
+            "rank": rank,
+            "target_table": target[0],
+            "target_id": target[1],
+            "title": model.titles[target],
+            "score": round(score, 4),
+        }
+        for source in keys
+        for rank, (target, score) in enumerate(model.neighbours.get(source, []))
+    ]
+    if rows:
+        conn.execute(insert(table), rows)
+    return len(rows)
+
+
+def _stored_neighbours(conn: Connection) -> Dict[Key, list]:
+    table = RelatedItem.__table__
+    stored = {}
+    rows = conn.execute(
+        table.select().order_by(table.c.source_table, table.c.source_id, table.c.rank)
+    ).mappings()
+    for row in rows:
+        stored.setdefault((row["source_table"], row["source_id"]), []).append(
+            (row["target_table"], row["target_id"], row["title"], row["score"])
+        )
+    return stored
+
+
+def emit_related_changes(keys: Iterable[Key]):
+    # 只有清單變了的項目：快取與 nginx 只刷新這些詳情頁
+    for table, id in sorted(keys):
+        emit_change(table, id, RELATED)
+
+
+def rebuild_related() -> Tuple[RelatedModel, dict]:
+    """Fit the model over every live item and rewrite the whole related_items table"""
+    started = time.monotonic()
+    db = SessionLocal()
+    try:
+        model = build_model(db)
+    finally:
+        db.close()
+    with engine.begin() as conn:
+        RelatedItem.__table__.create(conn, checkfirst=True)
+        _lock(conn)
+        before = _stored_neighbours(conn)
+        pairs = save_neighbours(conn, model)
+        after = _stored_neighbours(conn)
+    changed = {key for key in before.keys() | after.keys() if before.get(key) != after.get(key)}
+    emit_related_changes(changed)
+    stats = {
+        "items": len(model.rows),
+        "pairs": pairs,
+        "changed": len(changed),
+        "elapsed": round(time.monotonic() - started, 3),
+    }
+    logger.info("related items rebuilt: %(items)d items, %(pairs)d pairs in %(elapsed)ss", stats)
+    return model, stats
+
+
+class RelatedRefresher:
+    """Keeps related_items current as items are written, off the request path.
+
+    Writes are queued and handled by one background thread per process,
+    which fits the model when it starts (see start()). Each batch patches
+    the model and rewrites only the lists that changed. Once the model is
+    older than refresh_seconds it is refitted in memory first, which
+    picks up writes made through other workers; the nightly
+    build_related task rewrites the whole table. A whole-table change
+    (bulk import) triggers that full rebuild right away.
+    """
+
+    def __init__(self, refresh_seconds: int = RELATED_REFRESH_SECONDS, delay: float = RELATED_DEBOUNCE_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.delay = delay
+        self.model: Optional[RelatedModel] = None
+        self.fitted_at = 0.0
+        self.rebuild = False
+        self.pending: Set[Key] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the thread, which fits the model before the first write arrives"""
+        if snapshot_source:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="related-refresher", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, change: Change):
+        # RELATED 是本模組自己發出的事件
+        if change.table not in RELATED_SOURCES or change.operation == RELATED or snapshot_source:
+            return
+        with self._lock:
+            if change.id is None:
+                # 整張表變動 (例如大量匯入)：下一批全部重建
+                self.rebuild = True
+            else:
+                self.pending.add((change.table, change.id))
+        self.start()
+        self._wake.set()
+
+    def _fit(self):
+        db = SessionLocal()
+        try:
+            self.model = build_model(db)
+        finally:
+            db.close()
+        self.fitted_at = time.monotonic()
+
+    def _run(self):
+        try:
+            self._fit()
+        except Exception:
+            logger.exception("related model fit failed")
+        while True:
+            self._wake.wait()
+            time.sleep(self.delay)
+            self._wake.clear()
+            with self._lock:
+                batch, self.pending = self.pending, set()
+                rebuild, self.rebuild = self.rebuild, False
+            try:
+                if rebuild:
+                    self.model, _ = rebuild_related()
+                    self.fitted_at = time.monotonic()
+                self.process(batch)
+            except Exception:
+                logger.exception("related items refresh failed")
+                self.model = None
+
+    def process(self, batch: Set[Key]):
+        if not batch:
+            return
+        if self.model is None or time.monotonic() - self.fitted_at >= self.refresh_seconds:
+            self._fit()
+        affected = set()
+        db = SessionLocal()
+        try:
+            for table in RELATED_SOURCES:
+                ids = [id for name, id in batch if name == table]
+                loaded = {item["id"]: item for item in _load_items(db, table, ids)} if ids else {}
+                for id in ids:
+                    item = loaded.get(id)
+                    if item and item["live"]:
+                        affected |= self.model.upsert((table, id), term_counts(table, item), item["title"])
+                    else:
+                        affected |= self.model.remove((table, id))
+        finally:
+            db.close()
+        if not affected:
+            return
+        with engine.begin() as conn:
+            _lock(conn)
+            save_neighbours(conn, self.model, affected)
+        emit_related_changes(affected)
+
+
+related_refresher = RelatedRefresher()
+
+
+@on_change
+def refresh_related(change: Change):
+    related_refresher.enqueue(change)
+
+
+def related_for(db: Session, table: str, id: int) -> List[dict]:
+    """The stored neighbours of one item: a single primary-key range scan"""
+    rows = (
+        db.query(RelatedItem.target_table, RelatedItem.target_id, RelatedItem.title, RelatedItem.score)
+        .filter(RelatedItem.source_table == table, RelatedItem.source_id == id)
+        .order_by(RelatedItem.rank)
+    )
+    return [{"table": target_table, "id": target_id, "title": title, "score": score} for target_table, target_id, title, score in rows]
@@ -0,0 +1,109 @@
+from typing import List, Optional
+import html
+import math
+import re
+import time
+import markdown
+import nh3
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from .database import engine as default_engine
+from .events import emit_change
+from .fields import make_excerpt
+from .suggest import CJK
+
+# News content is Markdown; these columns are derived from it on every write
+RENDERED_COLUMNS = ("content_html", "excerpt", "reading_time")
+MARKDOWN_EXTENSIONS = ["extra", "sane_lists"]
+# Everything else (script, style, iframes, event handlers) is stripped from the rendered HTML
+ALLOWED_TAGS = {
+    "a", "abbr", "blockquote", "br", "code", "dd", "del", "div", "dl", "dt", "em", "h1", "h2", "h3", "h4", "h5",
+    "h6", "hr", "img", "li", "ol", "p", "pre", "span", "strong", "sub", "sup", "table", "tbody", "td", "th",
+    "thead", "tr", "ul",
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "abbr": {"title"},
+    "img": {"src", "alt", "title"},
+    "td": {"align"},
+    "th": {"align"},
+}
+URL_SCHEMES = {"http", "https", "mailto"}
+# 閱讀速度：英文每分鐘 200 字，中日韓每分鐘 400 字
+WORDS_PER_MINUTE = 200
+CJK_CHARS_PER_MINUTE = 400
+WORD = re.compile(r"[^\s]+")
+RENDER_BATCH_ROWS = 200
+
+
+def render_markdown(content: str) -> str:
+    """Markdown to HTML that is safe to insert into a page as is"""
+    rendered = markdown.markdown(content or "", extensions=MARKDOWN_EXTENSIONS, output_format="html")
+    return nh3.clean(
+        rendered,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        url_schemes=URL_SCHEMES,
+        link_rel="noopener noreferrer nofollow",
+    )
+
+
+def plain_text(content_html: str) -> str:
+    return " ".join(html.unescape(nh3.clean(content_html, tags=set())).split())
+
+
+def reading_minutes(text: str) -> int:
+    cjk = len(CJK.findall(text))
+    words = len(WORD.findall(CJK.sub(" ", text)))
+    return max(1, math.ceil(words / WORDS_PER_MINUTE + cjk / CJK_CHARS_PER_MINUTE))
+
+
+def render_news(content: Optional[str]) -> dict:
+    """The derived columns for one news item's content"""
+    content_html = render_markdown(content)
+    text = plain_text(content_html)
+    return {"content_html": content_html, "excerpt": make_excerpt(text), "reading_time": reading_minutes(text)}
+
+
+def render_news_values(values: dict) -> dict:
+    """values plus the derived columns when the write sets content"""
+    if values.get("content") is None:
+        return values
+    return {**values, **render_news(values["content"])}
+
+
+UPDATE_RENDERED = text(
+    "UPDATE news SET content_html = :content_html, excerpt = :excerpt, reading_time = :reading_time WHERE id = :row_id"
+)
+
+
+def render_batch(conn: Connection, after: int, only_missing: bool, batch_rows: int = RENDER_BATCH_ROWS) -> List[int]:
+    """Render one id-ordered batch of rows after the given id; returns their ids"""
+    rows = conn.execute(
+        text(
+            "SELECT id, content FROM news WHERE id > :after"
+            + (" AND content_html IS NULL" if only_missing else "")
+            + " ORDER BY id LIMIT :batch"
+        ),
+        {"after": after, "batch": batch_rows},
+    ).all()
+    if rows:
+        # updated_at 不變：內容沒有改，同步客戶端不需要重新下載
+        conn.execute(UPDATE_RENDERED, [{"row_id": id, **render_news(content)} for id, content in rows])
+    return [id for id, _ in rows]
+
+
+def rerender_news(engine: Engine = default_engine, only_missing: bool = False) -> dict:
+    """Re-render news in short batches, one transaction each, e.g. after the allowed tags change"""
+    started = time.monotonic()
+    after, rendered = 0, 0
+    while True:
+        with engine.begin() as conn:
+            ids = render_batch(conn, after, only_missing)
+        if not ids:
+            break
+        after, rendered = ids[-1], rendered + len(ids)
+    if rendered:
+        emit_change("news")
+    return {"rendered": rendered, "elapsed": round(time.monotonic() - started, 3)}
@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from typing import Optional, Type
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from .events import emit_change
+
+
+def patch_values(patch: BaseModel) -> dict:
+    """Columns a PATCH body actually sets; null cannot clear a required column"""
+    return {name: value for name, value in patch.model_dump(exclude_unset=True).items() if value is not None}
+
+
+def parse_if_match(request: Request) -> Optional[datetime]:
+    """The updated_at the client last saw, sent as If-Match; None when absent or *"""
+    value = request.headers.get("if-match", "").strip()
+    if not value or value == "*":
+        return None
+    value = value.removeprefix("W/").strip('"')
+    try:
+        expected = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must carry the updated_at of the resource")
+    # updated_at 以不含時區的 UTC 儲存
+    if expected.tzinfo is not None:
+        expected = expected.astimezone(timezone.utc).replace(tzinfo=None)
+    return expected
+
+
+def etag(updated_at: datetime) -> str:
+    return f'"{updated_at.isoformat()}"'
+
+
+class Repository:
+    """Single-statement writes for one model.
+
+    Every write is one INSERT/UPDATE/DELETE ... RETURNING followed by the
+    commit, so the response is built from the returned row instead of a
+    refresh. The change event is emitted after the commit.
+    """
+
+    def __init__(self, model, schema: Type[BaseModel], live_column: str = "is_active", not_found: str = "Not found"):
+        self.table = model.__table__
+        self.schema = schema
+        self.live_column = live_column
+        self.not_found = not_found
+
+    def create(self, db: Session, values: dict) -> BaseModel:
+        row = db.execute(insert(self.table).values(**values).returning(*self.table.c)).mappings().one()
+        item = self.schema.model_validate(dict(row))
+        db.commit()
+        emit_change(self.table.name, item.id, "create", getattr(item, "updated_at", None), self._live(row))
+        return item
+
+    def update(self, db: Session, id: int, values: dict, expected_updated_at: Optional[datetime] = None) -> BaseModel:
+        """UPDATE only the given columns; with expected_updated_at, 412 if the row changed since"""
+        condition = self.table.c.id == id
+        if expected_updated_at is not None:
+            condition &= self.table.c.updated_at == expected_updated_at
+        if not values:
+            row = db.execute(select(self.table).where(condition)).mappings().first()
+        else:
+            row = db.execute(update(self.table).where(condition).values(**values).returning(*self.table.c)).mappings().first()
+        if row is None:
+            db.rollback()
+            self._raise_missing_or_conflict(db, id)
+        item = self.schema.model_validate(dict(row))
+        db.commit()
+        if values:
+            operation = "delete" if values.get(self.live_column) is False else "update"
+            emit_change(self.table.name, item.id, operation, item.updated_at, self._live(row))
+        return item
+
+    def soft_delete(self, db: Session, id: int):
+        statement = update(self.table).where(self.table.c.id == id).values({self.live_column: False})
+        if db.execute(statement.returning(self.table.c.id)).first() is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail=self.not_found)
+        db.commit()
+        emit_change(self.table.name, id, "delete")
+
+    def delete(self, db: Session, id: int):
+        statement = delete(self.table).where(self.table.c.id == id).returning(self.table.c.id)
+        if db.execute(statement).first() is None:
+            db.rollback()
+            raise HTTPException(status_code=404, detail=self.not_found)
+        db.commit()
+        emit_change(self.table.name, id, "delete")
+
+    def _live(self, row) -> bool:
+        # 沒有上架欄位的資料表 (聯絡表單) 一律視為存在
+        return row.get(self.live_column) is not False
+
+    def _raise_missing_or_conflict(self, db: Session, id: int):
+        # 只有失敗時才多查一次，區分不存在 (404) 與已被他人修改 (412)
+        if db.execute(select(self.table.c.id).where(self.table.c.id == id)).first() is None:
+            raise HTTPException(status_code=404, detail=self.not_found)
+        raise HTTPException(
+            status_code=412,
+            detail="The resource was modified since the If-Match version; fetch it again and retry",
+        )
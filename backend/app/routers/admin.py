@@ -0,0 +1,101 @@
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional
+import io
+import json
+import queue
+import threading
+
+from ..breaker import db_breaker
+from ..bulk_import import IMPORT_SPECS, import_records, read_records, resolve_key
+from ..compaction import archived_rows, restore_row
+from ..deadlines import deadline_stats
+from ..limiter import concurrency_limiter
+from ..sync import SYNC_RESOURCES
+from ..tasks import list_tasks, queue_stats, retry_task
+from .auth import get_current_user
+
+router = APIRouter(dependencies=[Depends(get_current_user)])
+
+@router.post("/import/{table}")
+def import_content(
+    table: str,
+    file: UploadFile = File(...),
+    format: Optional[str] = None,
+    key: Optional[str] = None,
+):
+    """Stream a CSV/JSONL upload into a content table; progress is reported as one JSON line per batch"""
+    spec = IMPORT_SPECS.get(table)
+    if spec is None:
+        raise HTTPException(status_code=404, detail=f"Unknown table '{table}'")
+    format = format or ("jsonl" if (file.filename or "").endswith((".jsonl", ".ndjson")) else "csv")
+    if format not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="format must be csv or jsonl")
+    try:
+        natural_key = resolve_key(spec, None if key is None else [name.strip() for name in key.split(",") if name.strip()])
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    events = queue.Queue()
+
+    def run():
+        try:
+            stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+            records = read_records(stream, format, spec.schema)
+            stats = import_records(table, records, key=natural_key, progress=lambda s: events.put(s.progress()))
+            events.put({**stats.progress(), "done": True, "errors": stats.errors})
+        except Exception as exc:
+            events.put({"done": True, "error": str(exc)})
+
+    def report():
+        # 匯入在背景執行緒進行，每完成一批就回報一行進度
+        threading.Thread(target=run, name=f"import-{table}", daemon=True).start()
+        while True:
+            event = events.get()
+            yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+            if event.get("done"):
+                break
+
+    return StreamingResponse(report(), media_type="application/x-ndjson")
+
+def _archived_table(table: str) -> str:
+    if table not in SYNC_RESOURCES:
+        raise HTTPException(status_code=404, detail=f"Table '{table}' has no archive")
+    return table
+
+@router.get("/archive/{table}")
+def list_archived(table: str, skip: int = 0, limit: int = 100):
+    """Rows moved out of a content table by compaction, most recently archived first"""
+    return JSONResponse(jsonable_encoder(archived_rows(_archived_table(table), skip=skip, limit=min(limit, 1000))))
+
+@router.post("/archive/{table}/{item_id}/restore")
+def restore_archived(table: str, item_id: int):
+    """Move an archived row back into its table as live content"""
+    return restore_row(_archived_table(table), item_id)
+
+@router.get("/tasks/stats")
+def task_stats():
+    """Per queue: ready, scheduled, running and failed tasks, age of the oldest ready one, wait and run times over the last hour"""
+    return queue_stats()
+
+@router.get("/tasks")
+def list_background_tasks(status: Optional[str] = None, queue: Optional[str] = None, limit: int = 100):
+    """Most recent background tasks, e.g. ?status=failed to see errors"""
+    return JSONResponse(jsonable_encoder(list_tasks(status, queue, min(limit, 1000))))
+
+@router.post("/tasks/{task_id}/retry")
+def retry_background_task(task_id: int):
+    """Queue a failed task again with a fresh set of attempts"""
+    if not retry_task(task_id):
+        raise HTTPException(status_code=404, detail=f"No failed task with id {task_id}")
+    return {"message": "Task queued"}
+
+@router.get("/metrics")
+def server_metrics():
+    """This worker's concurrency limiter, deadline budgets and database circuit breaker"""
+    return {
+        "concurrency": concurrency_limiter.stats(),
+        "deadlines": deadline_stats.stats(),
+        "breaker": db_breaker.stats(),
+    }
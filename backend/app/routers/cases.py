@@ -1,64 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import json
 
-from ..database import get_db
+from ..counts import total_count_headers
+from ..database import get_db, get_read_db
+from ..fields import fetch_first, fetch_projection, full_fields, select_fields
+from ..filters import apply_filters
+from ..http_cache import PUBLIC_DETAIL, cached_json
 from ..models import Case
-from ..schemas import Case as CaseSchema, CaseCreate
+from ..related import related_for
+from ..repository import Repository, etag, parse_if_match, patch_values
+from ..schemas import Case as CaseSchema, CaseDetail, CaseCreate, CaseUpdate
+from ..sync import CHANGES_PAGE_SIZE, CHANGES_POLICY, resource_changes
 
 router = APIRouter()
+repository = Repository(Case, CaseSchema, not_found="Case study not found")
 
 @router.get("/", response_model=List[CaseSchema])
-def get_case_studies(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    cases = db.query(Case).filter(Case.is_active == True).offset(skip).limit(limit).all()
-    return cases
+def get_case_studies(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    selected = select_fields(Case, CaseSchema, fields, view)
+    filtered = apply_filters(db.query(Case).filter(Case.is_active == True), Case, request)
+    query = filtered.offset(skip).limit(limit)
+    def load():
+        return fetch_projection(query, Case, selected or full_fields(Case, CaseSchema))
+    response = cached_json(request, ["cases"], load)
+    if include_total:
+        response.headers.update(total_count_headers(request, db, filtered, Case))
+    return response
 
-@router.get("/{case_id}", response_model=CaseSchema)
-def get_case_study(case_id: int, db: Session = Depends(get_db)):
-    case = db.query(Case).filter(Case.id == case_id, Case.is_active == True).first()
-    if case is None:
-        raise HTTPException(status_code=404, detail="Case study not found")
-    return case
+@router.get("/changes")
+def get_case_changes(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = CHANGES_PAGE_SIZE,
+    db: Session = Depends(get_db),
+):
+    """Cases upserted or removed since the token returned by the previous call"""
+    # 走主庫：副本延遲可能讓 token 跳過尚未同步的資料
+    return cached_json(request, ["cases"], lambda: resource_changes(db, "cases", since, limit), CHANGES_POLICY)
+
+@router.get("/{case_id}", response_model=CaseDetail)
+def get_case_study(request: Request, case_id: int, db: Session = Depends(get_read_db)):
+    def load():
+        query = db.query(Case).filter(Case.id == case_id, Case.is_active == True)
+        case = fetch_first(query, Case, full_fields(Case, CaseSchema))
+        if case is None:
+            raise HTTPException(status_code=404, detail="Case study not found")
+        case["related"] = related_for(db, "cases", case_id)
+        return case
+    return cached_json(request, ["cases", f"cases:{case_id}"], load, PUBLIC_DETAIL, [f"cases:{case_id}"])
 
 @router.post("/", response_model=CaseSchema)
 def create_case_study(case: CaseCreate, db: Session = Depends(get_db)):
-    db_case = Case(
-        title=case.title,
-        industry=case.industry,
-        challenge=case.challenge,
-        solution=case.solution,
-        results=case.results
-    )
-    db.add(db_case)
-    db.commit()
-    db.refresh(db_case)
-    return db_case
+    return repository.create(db, case.model_dump())
 
 @router.put("/{case_id}", response_model=CaseSchema)
-def update_case_study(case_id: int, case: CaseCreate, db: Session = Depends(get_db)):
-    db_case = db.query(Case).filter(Case.id == case_id).first()
-    if db_case is None:
-        raise HTTPException(status_code=404, detail="Case study not found")
-    
-    db_case.title = case.title
-    db_case.industry = case.industry
-    db_case.challenge = case.challenge
-    db_case.solution = case.solution
-    db_case.results = case.results
-    
-    db.commit()
-    db.refresh(db_case)
-    return db_case
+def update_case_study(request: Request, response: Response, case_id: int, case: CaseCreate, db: Session = Depends(get_db)):
+    updated = repository.update(db, case_id, case.model_dump(), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
+
+@router.patch("/{case_id}", response_model=CaseSchema)
+def patch_case_study(request: Request, response: Response, case_id: int, case: CaseUpdate, db: Session = Depends(get_db)):
+    """Update only the fields present in the body; If-Match: <updated_at> rejects concurrent edits with 412"""
+    updated = repository.update(db, case_id, patch_values(case), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
 
 @router.delete("/{case_id}")
 def delete_case_study(case_id: int, db: Session = Depends(get_db)):
-    db_case = db.query(Case).filter(Case.id == case_id).first()
-    if db_case is None:
-        raise HTTPException(status_code=404, detail="Case study not found")
-    
-    db_case.is_active = False
-    db.commit()
+    repository.soft_delete(db, case_id)
     return {"message": "Case study deleted successfully"}
 
 # Sample data endpoint
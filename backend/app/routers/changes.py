@@ -0,0 +1,72 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+import asyncio
+
+from ..changefeed import FEED_TABLES, PRIVATE_FEED_TABLES, change_broadcaster, format_sse
+from ..database import get_db
+from ..http_cache import cached_json
+from ..sync import CHANGES_PAGE_SIZE, CHANGES_POLICY, SYNC_RESOURCES, combined_changes
+from .auth import get_current_user, oauth2_scheme
+
+router = APIRouter()
+
+# Seconds between keep-alive comments so proxies keep the stream open
+KEEPALIVE_SECONDS = 15
+
+def parse_tables(tables: Optional[str], known) -> Optional[list]:
+    selected = [table.strip() for table in tables.split(",") if table.strip()] if tables else None
+    unknown = set(selected or ()) - set(known)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(sorted(unknown))}")
+    return selected
+
+@router.get("/")
+def get_changes(
+    request: Request,
+    since: Optional[str] = None,
+    tables: Optional[str] = None,
+    limit: int = CHANGES_PAGE_SIZE,
+    db: Session = Depends(get_db),
+):
+    """Delta sync across resources; pass back the returned token as since on the next call"""
+    resources = parse_tables(tables, SYNC_RESOURCES) or list(SYNC_RESOURCES)
+    return cached_json(request, resources, lambda: combined_changes(db, resources, since, limit), CHANGES_POLICY)
+
+@router.get("/stream")
+async def stream_changes(request: Request, tables: Optional[str] = None, db: Session = Depends(get_db)):
+    """Server-sent events for every committed write: table, id, operation, the new updated_at and live.
+
+    Anonymous subscribers only get writes visible on the public site. With
+    a bearer token, contacts and unpublished items are streamed too.
+    """
+    selected = parse_tables(tables, FEED_TABLES | PRIVATE_FEED_TABLES)
+    private = bool(request.headers.get("authorization")) or bool(set(selected or ()) & PRIVATE_FEED_TABLES)
+    if private:
+        await get_current_user(await oauth2_scheme(request), db)
+    # 認證後立即歸還連線，串流期間不佔用
+    db.close()
+    subscriber = change_broadcaster.subscribe(selected, private)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+                # 客戶端跟不上，結束串流讓它重新連線並重新載入
+                if event["type"] == "overflow":
+                    break
+        finally:
+            change_broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
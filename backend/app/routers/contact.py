@@ -1,32 +1,72 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
+from ..counts import total_count_headers
 from ..database import get_db
+from ..dedupe import claim_digest, contact_digest, find_recent_contact, recent_contacts, recent_submissions, wait_for_contact
+from ..events import emit_change
+from ..fields import fetch_projection, select_fields
+from ..filters import apply_filters
 from ..models import Contact
+from ..repository import Repository
 from ..schemas import Contact as ContactSchema, ContactCreate
 
 router = APIRouter()
+repository = Repository(Contact, ContactSchema, not_found="Contact not found")
 
 @router.post("/", response_model=ContactSchema)
 def create_contact(contact: ContactCreate, db: Session = Depends(get_db)):
-    db_contact = Contact(
-        name=contact.name,
-        email=contact.email,
-        company=contact.company,
-        phone=contact.phone,
-        message=contact.message,
-        interest=contact.interest
-    )
-    db.add(db_contact)
-    db.commit()
-    db.refresh(db_contact)
-    return db_contact
+    digest = contact_digest(contact.email, contact.message)
+    answered = recent_submissions.get(digest)
+    if answered is not None:
+        return answered
+    # 重複送出：過濾器命中時才查資料庫確認，未命中的新內容直接寫入
+    if recent_contacts.might_contain(digest):
+        existing = find_recent_contact(db, digest)
+        if existing is not None:
+            return remember_submission(digest, existing)
+    # 唯一鍵擋下同時送出的重複 (或過濾器漏記的)，只有取得鍵的請求寫入
+    if not claim_digest(db, digest):
+        db.rollback()
+        existing = wait_for_contact(db, digest)
+        if existing is None:
+            # 持有鍵的請求的資料看不到 (例如已被刪除)：不寫入重複資料
+            raise HTTPException(status_code=409, detail="An identical message was just submitted")
+        return remember_submission(digest, existing)
+    created = repository.create(db, {**contact.model_dump(), "content_hash": digest})
+    recent_contacts.add(digest)
+    return remember_submission(digest, created)
+
+def remember_submission(digest: str, contact) -> ContactSchema:
+    item = ContactSchema.model_validate(contact)
+    recent_submissions.set(digest, item)
+    return item
 
 @router.get("/", response_model=List[ContactSchema])
-def get_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    contacts = db.query(Contact).offset(skip).limit(limit).all()
-    return contacts
+def get_contacts(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+):
+    selected = select_fields(Contact, ContactSchema, fields, view)
+    filtered = apply_filters(db.query(Contact), Contact, request)
+    if "sort" not in request.query_params:
+        # 預設最新在前：依分區鍵排序，LIMIT 只需讀最近分區的索引
+        filtered = filtered.order_by(Contact.created_at.desc(), Contact.id.desc())
+    query = filtered.offset(skip).limit(limit)
+    headers = total_count_headers(request, db, filtered, Contact) if include_total else {}
+    if selected:
+        return JSONResponse(jsonable_encoder(fetch_projection(query, Contact, selected)), headers=headers)
+    response.headers.update(headers)
+    return query.all()
 
 @router.get("/{contact_id}", response_model=ContactSchema)
 def get_contact(contact_id: int, db: Session = Depends(get_db)):
@@ -43,14 +83,10 @@ def mark_contact_processed(contact_id: int, db: Session = Depends(get_db)):
     
     contact.is_processed = True
     db.commit()
+    emit_change("contacts", contact_id, "update")
     return {"message": "Contact marked as processed"}
 
 @router.delete("/{contact_id}")
 def delete_contact(contact_id: int, db: Session = Depends(get_db)):
-    contact = db.query(Contact).filter(Contact.id == contact_id).first()
-    if contact is None:
-        raise HTTPException(status_code=404, detail="Contact not found")
-    
-    db.delete(contact)
-    db.commit()
+    repository.delete(db, contact_id)
     return {"message": "Contact deleted successfully"} 
\ No newline at end of file
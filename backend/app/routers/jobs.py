@@ -1,83 +1,104 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import json
 from datetime import datetime
 
-from ..database import get_db
+from ..counts import total_count_headers
+from ..database import get_db, get_read_db
+from ..feeds import feed_response, jobs_feed
+from ..fields import fetch_first, fetch_projection, full_fields, select_fields
+from ..filters import apply_filters
+from ..http_cache import PUBLIC_DETAIL, cached_json
 from ..models import Job
-from ..schemas import Job as JobSchema, JobCreate
+from ..related import related_for
+from ..repository import Repository, etag, parse_if_match, patch_values
+from ..schemas import Job as JobSchema, JobDetail, JobCreate, JobUpdate
+from ..sync import CHANGES_PAGE_SIZE, CHANGES_POLICY, resource_changes
 
 router = APIRouter()
+repository = Repository(Job, JobSchema, not_found="Job not found")
 
 @router.get("/", response_model=List[JobSchema])
-def get_jobs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    jobs = db.query(Job).filter(Job.is_active == True).offset(skip).limit(limit).all()
-    return jobs
+def get_jobs(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    selected = select_fields(Job, JobSchema, fields, view)
+    filtered = apply_filters(db.query(Job).filter(Job.is_active == True), Job, request)
+    query = filtered.offset(skip).limit(limit)
+    def load():
+        return fetch_projection(query, Job, selected or full_fields(Job, JobSchema))
+    response = cached_json(request, ["jobs"], load)
+    if include_total:
+        response.headers.update(total_count_headers(request, db, filtered, Job))
+    return response
 
 @router.get("/tags", response_model=List[str])
-def get_all_tags(db: Session = Depends(get_db)):
+def get_all_tags(request: Request, db: Session = Depends(get_read_db)):
     """Get all unique tags from all jobs"""
-    jobs = db.query(Job).filter(Job.is_active == True).all()
-    all_tags = []
-    for job in jobs:
-        if job.tags:
-            all_tags.extend(job.tags)
-    return list(set(all_tags))  # Remove duplicates
+    def load():
+        jobs = db.query(Job).filter(Job.is_active == True).all()
+        all_tags = []
+        for job in jobs:
+            if job.tags:
+                all_tags.extend(job.tags)
+        return list(set(all_tags))  # Remove duplicates
+    return cached_json(request, ["jobs"], load)
 
-@router.get("/{job_id}", response_model=JobSchema)
-def get_job(job_id: int, db: Session = Depends(get_db)):
-    job = db.query(Job).filter(Job.id == job_id, Job.is_active == True).first()
-    if job is None:
-        raise HTTPException(status_code=404, detail="Job not found")
-    return job
+@router.get("/changes")
+def get_job_changes(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = CHANGES_PAGE_SIZE,
+    db: Session = Depends(get_db),
+):
+    """Jobs upserted or removed since the token returned by the previous call"""
+    # 走主庫：副本延遲可能讓 token 跳過尚未同步的資料
+    return cached_json(request, ["jobs"], lambda: resource_changes(db, "jobs", since, limit), CHANGES_POLICY)
+
+# 必須在 /{id} 之前註冊
+@router.get("/feed.xml", response_class=Response)
+def get_jobs_feed(request: Request, db: Session = Depends(get_read_db)):
+    """Atom feed of the latest open positions; conditional requests get 304"""
+    return feed_response(request, jobs_feed, db)
+
+@router.get("/{job_id}", response_model=JobDetail)
+def get_job(request: Request, job_id: int, db: Session = Depends(get_read_db)):
+    def load():
+        query = db.query(Job).filter(Job.id == job_id, Job.is_active == True)
+        job = fetch_first(query, Job, full_fields(Job, JobSchema))
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        job["related"] = related_for(db, "jobs", job_id)
+        return job
+    return cached_json(request, ["jobs", f"jobs:{job_id}"], load, PUBLIC_DETAIL, [f"jobs:{job_id}"])
 
 @router.post("/", response_model=JobSchema)
 def create_job(job: JobCreate, db: Session = Depends(get_db)):
-    db_job = Job(
-        title=job.title,
-        department=job.department,
-        location=job.location,
-        type=job.type,
-        salary=job.salary,
-        description=job.description,
-        requirements=job.requirements,
-        benefits=job.benefits,
-        tags=job.tags
-    )
-    db.add(db_job)
-    db.commit()
-    db.refresh(db_job)
-    return db_job
+    return repository.create(db, job.model_dump())
 
 @router.put("/{job_id}", response_model=JobSchema)
-def update_job(job_id: int, job: JobCreate, db: Session = Depends(get_db)):
-    db_job = db.query(Job).filter(Job.id == job_id).first()
-    if db_job is None:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    db_job.title = job.title
-    db_job.department = job.department
-    db_job.location = job.location
-    db_job.type = job.type
-    db_job.salary = job.salary
-    db_job.description = job.description
-    db_job.requirements = job.requirements
-    db_job.benefits = job.benefits
-    db_job.tags = job.tags
-    
-    db.commit()
-    db.refresh(db_job)
-    return db_job
+def update_job(request: Request, response: Response, job_id: int, job: JobCreate, db: Session = Depends(get_db)):
+    updated = repository.update(db, job_id, job.model_dump(), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
+
+@router.patch("/{job_id}", response_model=JobSchema)
+def patch_job(request: Request, response: Response, job_id: int, job: JobUpdate, db: Session = Depends(get_db)):
+    """Update only the fields present in the body; If-Match: <updated_at> rejects concurrent edits with 412"""
+    updated = repository.update(db, job_id, patch_values(job), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
 
 @router.delete("/{job_id}")
 def delete_job(job_id: int, db: Session = Depends(get_db)):
-    db_job = db.query(Job).filter(Job.id == job_id).first()
-    if db_job is None:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    db_job.is_active = False
-    db.commit()
+    repository.soft_delete(db, job_id)
     return {"message": "Job deleted successfully"}
 
 # Sample data endpoint
@@ -1,103 +1,134 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import json
 from datetime import datetime, timezone
 
-from ..database import get_db
+from ..counts import total_count_headers
+from ..database import get_db, get_read_db
+from ..feeds import feed_response, news_feed
+from ..fields import fetch_first, fetch_projection, full_fields, select_fields
+from ..filters import apply_filters
+from ..http_cache import PUBLIC_DETAIL, cached_json
 from ..models import News
-from ..schemas import News as NewsSchema, NewsCreate
+from ..related import related_for
+from ..rendering import render_news_values
+from ..repository import Repository, etag, parse_if_match, patch_values
+from ..schemas import News as NewsSchema, NewsDetail, NewsCreate, NewsUpdate
+from ..sync import CHANGES_PAGE_SIZE, CHANGES_POLICY, resource_changes
 
 router = APIRouter()
+repository = Repository(News, NewsSchema, live_column="is_published", not_found="News item not found")
 
 @router.get("/", response_model=List[NewsSchema])
-def get_news(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    news = db.query(News).filter(News.is_published == True).offset(skip).limit(limit).all()
-    return news
+def get_news(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    selected = select_fields(News, NewsSchema, fields, view)
+    filtered = apply_filters(db.query(News).filter(News.is_published == True), News, request)
+    query = filtered.offset(skip).limit(limit)
+    def load():
+        return fetch_projection(query, News, selected or full_fields(News, NewsSchema))
+    response = cached_json(request, ["news"], load)
+    if include_total:
+        response.headers.update(total_count_headers(request, db, filtered, News))
+    return response
 
 @router.get("/admin/all", response_model=List[NewsSchema])
-def get_all_news(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_all_news(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+):
     """Get all news for admin interface (including unpublished)"""
-    news = db.query(News).offset(skip).limit(limit).all()
-    return news
+    selected = select_fields(News, NewsSchema, fields, view)
+    filtered = apply_filters(db.query(News), News, request)
+    query = filtered.offset(skip).limit(limit)
+    headers = total_count_headers(request, db, filtered, News, use_counter=False) if include_total else {}
+    if selected:
+        return JSONResponse(jsonable_encoder(fetch_projection(query, News, selected)), headers=headers)
+    response.headers.update(headers)
+    return query.all()
 
-@router.get("/{news_id}", response_model=NewsSchema)
-def get_news_item(news_id: int, db: Session = Depends(get_db)):
-    news_item = db.query(News).filter(News.id == news_id, News.is_published == True).first()
-    if news_item is None:
-        raise HTTPException(status_code=404, detail="News item not found")
-    return news_item
+@router.get("/changes")
+def get_news_changes(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = CHANGES_PAGE_SIZE,
+    db: Session = Depends(get_db),
+):
+    """News upserted or removed since the token returned by the previous call"""
+    # 走主庫：副本延遲可能讓 token 跳過尚未同步的資料
+    return cached_json(request, ["news"], lambda: resource_changes(db, "news", since, limit), CHANGES_POLICY)
+
+# 必須在 /{id} 之前註冊
+@router.get("/feed.xml", response_class=Response)
+def get_news_feed(request: Request, db: Session = Depends(get_read_db)):
+    """Atom feed of the latest published news; conditional requests get 304"""
+    return feed_response(request, news_feed, db)
+
+@router.get("/{news_id}", response_model=NewsDetail)
+def get_news_item(request: Request, news_id: int, db: Session = Depends(get_read_db)):
+    def load():
+        query = db.query(News).filter(News.id == news_id, News.is_published == True)
+        news_item = fetch_first(query, News, full_fields(News, NewsDetail))
+        if news_item is None:
+            raise HTTPException(status_code=404, detail="News item not found")
+        news_item["related"] = related_for(db, "news", news_id)
+        return news_item
+    return cached_json(request, ["news", f"news:{news_id}"], load, PUBLIC_DETAIL, [f"news:{news_id}"])
+
+# 圖片最多3張
+MAX_IMAGES = 3
 
 @router.post("/", response_model=NewsSchema)
 def create_news(news: NewsCreate, db: Session = Depends(get_db)):
-    # 處理日期時區問題
-    published_date = None
-    if hasattr(news, 'published_date') and news.published_date:
-        # 如果日期是字符串格式，轉換為 datetime
-        if isinstance(news.published_date, str):
-            published_date = datetime.fromisoformat(news.published_date.replace('Z', '+00:00'))
-        else:
-            published_date = news.published_date
-    else:
-        published_date = datetime.now(timezone.utc)
-    
-    # 處理圖片，限制最多3張
-    images = news.images if hasattr(news, 'images') and news.images else []
-    if len(images) > 3:
-        images = images[:3]
-    
-    db_news = News(
-        title=news.title,
-        content=news.content,
-        category=news.category,
-        published_date=published_date,
-        is_published=news.is_published if hasattr(news, 'is_published') else True,
-        images=images
-    )
-    db.add(db_news)
-    db.commit()
-    db.refresh(db_news)
-    return db_news
+    values = news.model_dump()
+    # 未指定發布日期時使用當前時間
+    values["published_date"] = news.published_date or datetime.now(timezone.utc)
+    values["is_published"] = news.is_published if news.is_published is not None else True
+    values["images"] = (news.images or [])[:MAX_IMAGES]
+    return repository.create(db, render_news_values(values))
 
 @router.put("/{news_id}", response_model=NewsSchema)
-def update_news(news_id: int, news: NewsCreate, db: Session = Depends(get_db)):
-    db_news = db.query(News).filter(News.id == news_id).first()
-    if db_news is None:
-        raise HTTPException(status_code=404, detail="News item not found")
-    
-    db_news.title = news.title
-    db_news.content = news.content
-    db_news.category = news.category
-    
-    # 處理日期時區問題
-    if hasattr(news, 'published_date') and news.published_date:
-        if isinstance(news.published_date, str):
-            db_news.published_date = datetime.fromisoformat(news.published_date.replace('Z', '+00:00'))
-        else:
-            db_news.published_date = news.published_date
-    
-    if hasattr(news, 'is_published'):
-        db_news.is_published = news.is_published
-    
-    # 處理圖片，限制最多3張
-    if hasattr(news, 'images') and news.images is not None:
-        images = news.images if news.images else []
-        if len(images) > 3:
-            images = images[:3]
-        db_news.images = images
-    
-    db.commit()
-    db.refresh(db_news)
-    return db_news
+def update_news(request: Request, response: Response, news_id: int, news: NewsCreate, db: Session = Depends(get_db)):
+    values = {"title": news.title, "content": news.content, "category": news.category}
+    if news.published_date:
+        values["published_date"] = news.published_date
+    if news.is_published is not None:
+        values["is_published"] = news.is_published
+    if news.images is not None:
+        values["images"] = news.images[:MAX_IMAGES]
+    updated = repository.update(db, news_id, render_news_values(values), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
+
+@router.patch("/{news_id}", response_model=NewsSchema)
+def patch_news(request: Request, response: Response, news_id: int, news: NewsUpdate, db: Session = Depends(get_db)):
+    """Update only the fields present in the body; If-Match: <updated_at> rejects concurrent edits with 412"""
+    values = patch_values(news)
+    if "images" in values:
+        values["images"] = values["images"][:MAX_IMAGES]
+    updated = repository.update(db, news_id, render_news_values(values), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
 
 @router.delete("/{news_id}")
 def delete_news(news_id: int, db: Session = Depends(get_db)):
-    db_news = db.query(News).filter(News.id == news_id).first()
-    if db_news is None:
-        raise HTTPException(status_code=404, detail="News item not found")
-    
-    db_news.is_published = False
-    db.commit()
+    repository.soft_delete(db, news_id)
     return {"message": "News item deleted successfully"}
 
 # Sample data endpoint
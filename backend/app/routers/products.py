@@ -1,64 +1,82 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import json
 
-from ..database import get_db
+from ..counts import total_count_headers
+from ..database import get_db, get_read_db
+from ..fields import fetch_first, fetch_projection, full_fields, select_fields
+from ..filters import apply_filters
+from ..http_cache import PUBLIC_DETAIL, cached_json
 from ..models import Product
-from ..schemas import Product as ProductSchema, ProductCreate
+from ..repository import Repository, etag, parse_if_match, patch_values
+from ..schemas import Product as ProductSchema, ProductCreate, ProductUpdate
+from ..sync import CHANGES_PAGE_SIZE, CHANGES_POLICY, resource_changes
 
 router = APIRouter()
+repository = Repository(Product, ProductSchema, not_found="Product not found")
 
 @router.get("/", response_model=List[ProductSchema])
-def get_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    products = db.query(Product).filter(Product.is_active == True).offset(skip).limit(limit).all()
-    return products
+def get_products(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    selected = select_fields(Product, ProductSchema, fields, view)
+    filtered = apply_filters(db.query(Product).filter(Product.is_active == True), Product, request)
+    query = filtered.offset(skip).limit(limit)
+    def load():
+        return fetch_projection(query, Product, selected or full_fields(Product, ProductSchema))
+    response = cached_json(request, ["products"], load)
+    if include_total:
+        response.headers.update(total_count_headers(request, db, filtered, Product))
+    return response
+
+@router.get("/changes")
+def get_product_changes(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = CHANGES_PAGE_SIZE,
+    db: Session = Depends(get_db),
+):
+    """Products upserted or removed since the token returned by the previous call"""
+    # 走主庫：副本延遲可能讓 token 跳過尚未同步的資料
+    return cached_json(request, ["products"], lambda: resource_changes(db, "products", since, limit), CHANGES_POLICY)
 
 @router.get("/{product_id}", response_model=ProductSchema)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id, Product.is_active == True).first()
-    if product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+def get_product(request: Request, product_id: int, db: Session = Depends(get_read_db)):
+    def load():
+        query = db.query(Product).filter(Product.id == product_id, Product.is_active == True)
+        product = fetch_first(query, Product, full_fields(Product, ProductSchema))
+        if product is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return product
+    return cached_json(request, ["products"], load, PUBLIC_DETAIL, [f"products:{product_id}"])
 
 @router.post("/", response_model=ProductSchema)
 def create_product(product: ProductCreate, db: Session = Depends(get_db)):
-    db_product = Product(
-        name=product.name,
-        category=product.category,
-        description=product.description,
-        features=product.features,
-        price=product.price
-    )
-    db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
-    return db_product
+    return repository.create(db, product.model_dump())
 
 @router.put("/{product_id}", response_model=ProductSchema)
-def update_product(product_id: int, product: ProductCreate, db: Session = Depends(get_db)):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
-    if db_product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    db_product.name = product.name
-    db_product.category = product.category
-    db_product.description = product.description
-    db_product.features = product.features
-    db_product.price = product.price
-    
-    db.commit()
-    db.refresh(db_product)
-    return db_product
+def update_product(request: Request, response: Response, product_id: int, product: ProductCreate, db: Session = Depends(get_db)):
+    updated = repository.update(db, product_id, product.model_dump(), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
+
+@router.patch("/{product_id}", response_model=ProductSchema)
+def patch_product(request: Request, response: Response, product_id: int, product: ProductUpdate, db: Session = Depends(get_db)):
+    """Update only the fields present in the body; If-Match: <updated_at> rejects concurrent edits with 412"""
+    updated = repository.update(db, product_id, patch_values(product), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
 
 @router.delete("/{product_id}")
 def delete_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
-    if db_product is None:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    db_product.is_active = False
-    db.commit()
+    repository.soft_delete(db, product_id)
     return {"message": "Product deleted successfully"}
 
 # Sample data endpoint
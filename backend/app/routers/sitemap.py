@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.orm import Session
+
+from ..database import get_read_db
+from ..feeds import sitemap_response
+
+router = APIRouter()
+
+@router.get("/sitemap.xml", response_class=Response)
+def get_sitemap(request: Request, db: Session = Depends(get_read_db)):
+    """Public site pages with the time their content last changed"""
+    return sitemap_response(request, db)
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
+from typing import Optional
+
+from ..http_cache import CachePolicy, cache_headers
+from ..suggest import SUGGEST_KINDS, SUGGEST_MAX_RESULTS, suggester
+
+router = APIRouter()
+
+# Every distinct q is its own URL, so suggestions are not registered for purging and just expire
+SUGGEST_POLICY = CachePolicy(s_maxage=10, stale_while_revalidate=30, stale_if_error=86400)
+
+@router.get("/")
+def suggest(request: Request, q: str = "", limit: int = 10, kinds: Optional[str] = None):
+    """Autocomplete suggestions for a prefix of a title, name, tag or category (English or Chinese)"""
+    selected = [kind.strip() for kind in kinds.split(",") if kind.strip()] if kinds else None
+    unknown = sorted(set(selected or []) - SUGGEST_KINDS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown kinds: {', '.join(unknown)}. Kinds: {', '.join(sorted(SUGGEST_KINDS))}",
+        )
+    # 記憶體內查詢不經回應快取；只加上 CDN/瀏覽器快取標頭
+    results = suggester.search(q, max(1, min(limit, SUGGEST_MAX_RESULTS)), selected)
+    return JSONResponse(results, headers=cache_headers(request, SUGGEST_POLICY, []))
@@ -1,62 +1,85 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import json
+from datetime import datetime
 
-from ..database import get_db
+from ..bulk_import import import_records
+from ..counts import total_count_headers
+from ..database import get_db, get_read_db
+from ..events import emit_change
+from ..fields import fetch_first, fetch_projection, full_fields, select_fields
+from ..filters import apply_filters
+from ..http_cache import PUBLIC_DETAIL, cached_json
 from ..models import Technique
-from ..schemas import Technique as TechniqueSchema, TechniqueCreate
+from ..repository import Repository, etag, parse_if_match, patch_values
+from ..schemas import Technique as TechniqueSchema, TechniqueCreate, TechniqueUpdate
+from ..sync import CHANGES_PAGE_SIZE, CHANGES_POLICY, resource_changes
 
 router = APIRouter()
+repository = Repository(Technique, TechniqueSchema, not_found="Technique not found")
 
 @router.get("/", response_model=List[TechniqueSchema])
-def get_techniques(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    techniques = db.query(Technique).filter(Technique.is_active == True).offset(skip).limit(limit).all()
-    return techniques
+def get_techniques(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+):
+    selected = select_fields(Technique, TechniqueSchema, fields, view)
+    filtered = apply_filters(db.query(Technique).filter(Technique.is_active == True), Technique, request)
+    query = filtered.offset(skip).limit(limit)
+    def load():
+        return fetch_projection(query, Technique, selected or full_fields(Technique, TechniqueSchema))
+    response = cached_json(request, ["techniques"], load)
+    if include_total:
+        response.headers.update(total_count_headers(request, db, filtered, Technique))
+    return response
+
+@router.get("/changes")
+def get_technique_changes(
+    request: Request,
+    since: Optional[str] = None,
+    limit: int = CHANGES_PAGE_SIZE,
+    db: Session = Depends(get_db),
+):
+    """Techniques upserted or removed since the token returned by the previous call"""
+    # 走主庫：副本延遲可能讓 token 跳過尚未同步的資料
+    return cached_json(request, ["techniques"], lambda: resource_changes(db, "techniques", since, limit), CHANGES_POLICY)
 
 @router.get("/{technique_id}", response_model=TechniqueSchema)
-def get_technique(technique_id: int, db: Session = Depends(get_db)):
-    technique = db.query(Technique).filter(Technique.id == technique_id, Technique.is_active == True).first()
-    if technique is None:
-        raise HTTPException(status_code=404, detail="Technique not found")
-    return technique
+def get_technique(request: Request, technique_id: int, db: Session = Depends(get_read_db)):
+    def load():
+        query = db.query(Technique).filter(Technique.id == technique_id, Technique.is_active == True)
+        technique = fetch_first(query, Technique, full_fields(Technique, TechniqueSchema))
+        if technique is None:
+            raise HTTPException(status_code=404, detail="Technique not found")
+        return technique
+    return cached_json(request, ["techniques"], load, PUBLIC_DETAIL, [f"techniques:{technique_id}"])
 
 @router.post("/", response_model=TechniqueSchema)
 def create_technique(technique: TechniqueCreate, db: Session = Depends(get_db)):
-    db_technique = Technique(
-        name=technique.name,
-        description=technique.description,
-        features=technique.features,
-        category=technique.category
-    )
-    db.add(db_technique)
-    db.commit()
-    db.refresh(db_technique)
-    return db_technique
+    return repository.create(db, technique.model_dump())
 
 @router.put("/{technique_id}", response_model=TechniqueSchema)
-def update_technique(technique_id: int, technique: TechniqueCreate, db: Session = Depends(get_db)):
-    db_technique = db.query(Technique).filter(Technique.id == technique_id).first()
-    if db_technique is None:
-        raise HTTPException(status_code=404, detail="Technique not found")
-    
-    db_technique.name = technique.name
-    db_technique.description = technique.description
-    db_technique.features = technique.features
-    db_technique.category = technique.category
-    
-    db.commit()
-    db.refresh(db_technique)
-    return db_technique
+def update_technique(request: Request, response: Response, technique_id: int, technique: TechniqueCreate, db: Session = Depends(get_db)):
+    updated = repository.update(db, technique_id, technique.model_dump(), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
+
+@router.patch("/{technique_id}", response_model=TechniqueSchema)
+def patch_technique(request: Request, response: Response, technique_id: int, technique: TechniqueUpdate, db: Session = Depends(get_db)):
+    """Update only the fields present in the body; If-Match: <updated_at> rejects concurrent edits with 412"""
+    updated = repository.update(db, technique_id, patch_values(technique), parse_if_match(request))
+    response.headers["ETag"] = etag(updated.updated_at)
+    return updated
 
 @router.delete("/{technique_id}")
 def delete_technique(technique_id: int, db: Session = Depends(get_db)):
-    db_technique = db.query(Technique).filter(Technique.id == technique_id).first()
-    if db_technique is None:
-        raise HTTPException(status_code=404, detail="Technique not found")
-    
-    db_technique.is_active = False
-    db.commit()
+    repository.soft_delete(db, technique_id)
     return {"message": "Technique deleted successfully"}
 
 # Sample data endpoint with new AI techniques
@@ -108,11 +131,7 @@ def get_sample_techniques():
 # Initialize database with default techniques
 @router.post("/init/default")
 def initialize_default_techniques(db: Session = Depends(get_db)):
-    # Clear existing techniques
-    db.query(Technique).delete()
-    db.commit()
-    
-    # Add default techniques
+    # Default techniques, upserted by name
     default_techniques = [
         {
             "name": "1️⃣ AI-Powered Threat Detection & Behavioral Analytics",
@@ -146,9 +165,14 @@ def initialize_default_techniques(db: Session = Depends(get_db)):
         }
     ]
     
-    for technique_data in default_techniques:
-        db_technique = Technique(**technique_data)
-        db.add(db_technique)
-    
+    import_records("techniques", ({**technique, "is_active": True} for technique in default_techniques))
+
+    # Retire everything else (soft delete keeps tombstones for delta sync)
+    names = [technique["name"] for technique in default_techniques]
+    retired = db.query(Technique).filter(Technique.is_active == True, Technique.name.notin_(names)).update(
+        {"is_active": False, "updated_at": datetime.utcnow()}, synchronize_session=False
+    )
     db.commit()
+    if retired:
+        emit_change("techniques")
     return {"message": "Default techniques initialized successfully"} 
\ No newline at end of file
@@ -33,6 +33,13 @@ class Contact(ContactBase):
     class Config:
         from_attributes = True
 
+# Related content schemas
+class RelatedItem(BaseModel):
+    table: str
+    id: int
+    title: str
+    score: float
+
 # Job schemas
 class JobBase(BaseModel):
     title: str
@@ -70,6 +77,9 @@ class Job(JobBase):
     class Config:
         from_attributes = True
 
+class JobDetail(Job):
+    related: List[RelatedItem] = []
+
 # News schemas
 class NewsBase(BaseModel):
     title: str
@@ -94,12 +104,18 @@ class News(NewsBase):
     published_date: datetime
     is_published: bool
     images: List[str]
+    excerpt: Optional[str] = None
+    reading_time: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
     class Config:
         from_attributes = True
 
+class NewsDetail(News):
+    content_html: Optional[str] = None
+    related: List[RelatedItem] = []
+
 # Case schemas
 class CaseBase(BaseModel):
     title: str
@@ -128,6 +144,9 @@ class Case(CaseBase):
     class Config:
         from_attributes = True
 
+class CaseDetail(Case):
+    related: List[RelatedItem] = []
+
 # Product schemas
 class ProductBase(BaseModel):
     name: str
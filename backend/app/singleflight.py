@@ -0,0 +1,67 @@
+from typing import Callable, Optional
+import os
+import threading
+from fastapi import HTTPException
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How long a request waits for an identical in-flight computation before giving up
+SINGLE_FLIGHT_TIMEOUT_SECONDS = float(os.getenv("SINGLE_FLIGHT_TIMEOUT_SECONDS", "10"))
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs one computation per key at a time; concurrent callers with the same key share its result.
+
+    The first caller (the leader) runs the producer in its own thread. The
+    others block until it finishes and get the same value, or the same
+    exception if it failed. A follower that waits longer than the timeout
+    gets a 504 instead of starting a duplicate computation.
+    """
+
+    def __init__(self, timeout: float = SINGLE_FLIGHT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.coalesced = 0
+        self.timeouts = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, producer: Callable[[], object], timeout: Optional[float] = None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout if timeout is None else timeout):
+                self.timeouts += 1
+                raise HTTPException(status_code=504, detail="Timed out waiting for an identical request in progress")
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = producer()
+        except Exception as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        return {"in_flight": in_flight, "coalesced": self.coalesced, "timeouts": self.timeouts}
@@ -0,0 +1,106 @@
+from typing import Optional
+import logging
+import os
+import sqlite3
+import threading
+import time
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+from dotenv import load_dotenv
+
+from .cache import response_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Set on edge nodes: serve public GETs from this SQLite file instead of Postgres
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")
+# How often a node checks whether a new snapshot file has been swapped in
+SNAPSHOT_CHECK_SECONDS = float(os.getenv("SNAPSHOT_CHECK_SECONDS", "2"))
+
+# Tables copied into the snapshot; the rest of the API is not served by snapshot nodes
+SNAPSHOT_TABLES = ("jobs", "news", "cases", "products", "techniques")
+# Public GET routes that need Postgres or data the snapshot does not carry
+SNAPSHOT_UNAVAILABLE = ("/api/admin", "/api/auth", "/api/contact", "/api/changes/stream")
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class SnapshotSource:
+    """Sessions over a read-only SQLite snapshot, reopened when a new file replaces it.
+
+    Snapshots are published with os.replace, so the path always names a
+    complete file and a node notices a new one by its inode. Files are
+    opened immutable: SQLite takes no locks and never looks for a journal.
+    Connections still open on the previous file keep reading it until they
+    are closed.
+    """
+
+    def __init__(self, path: str, check_interval: float = SNAPSHOT_CHECK_SECONDS):
+        self.path = os.path.abspath(path)
+        self.check_interval = check_interval
+        self.version = None
+        self.exported_at = None
+        self.engine = None
+        self.SessionLocal = None
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def refresh(self, now: float = None):
+        now = now or time.monotonic()
+        if self.engine is not None and now - self.checked_at < self.check_interval:
+            return
+        with self._lock:
+            self.checked_at = now
+            try:
+                signature = self._signature()
+            except FileNotFoundError:
+                if self.engine is None:
+                    raise
+                logger.warning("snapshot %s disappeared, still serving the open one", self.path)
+                return
+            if signature == self.version:
+                return
+            engine = create_engine("sqlite://", creator=self._connect)
+            with engine.connect() as conn:
+                exported_at = conn.execute(text("SELECT value FROM snapshot_meta WHERE key = 'exported_at'")).scalar()
+            previous, self.engine = self.engine, engine
+            self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            self.version, self.exported_at = signature, exported_at
+        if previous is not None:
+            previous.dispose()
+            # 新快照上線，讓快取的回應重新產生
+            for table in SNAPSHOT_TABLES:
+                response_cache.invalidate(table)
+        logger.info("serving snapshot exported at %s", exported_at)
+
+    def session(self) -> Session:
+        self.refresh()
+        return self.SessionLocal()
+
+
+snapshot_source: Optional[SnapshotSource] = SnapshotSource(SNAPSHOT_PATH) if SNAPSHOT_PATH else None
+
+
+async def snapshot_mode_middleware(request: Request, call_next):
+    """On snapshot nodes, reject writes with 405 and routes the snapshot cannot serve with 404"""
+    if snapshot_source is None:
+        return await call_next(request)
+    if request.method not in READ_METHODS:
+        return JSONResponse(
+            status_code=405,
+            content={"detail": "This node serves a read-only snapshot"},
+            headers={"Allow": ", ".join(READ_METHODS)},
+        )
+    if request.url.path.startswith(SNAPSHOT_UNAVAILABLE):
+        return JSONResponse(status_code=404, content={"detail": "Not available on read-only snapshot nodes"})
+    return await call_next(request)
@@ -0,0 +1,92 @@
+from datetime import datetime
+import os
+import sqlite3
+from sqlalchemy import ARRAY, String, Text, create_engine, insert, select, text
+from sqlalchemy.engine import Engine
+
+from .models import Base, RelatedItem
+from .snapshot import SNAPSHOT_TABLES
+from .sync import SYNC_RESOURCES
+
+EXPORT_BATCH_ROWS = 5000
+
+
+def tombstone(table, row: dict, live_column: str) -> dict:
+    """A soft-deleted row reduced to what delta sync needs, so drafts never leave the primary"""
+    kept = {"id", live_column, "created_at", "updated_at"}
+    stub = dict(row)
+    for column in table.columns:
+        if column.name in kept:
+            continue
+        if isinstance(column.type, ARRAY):
+            stub[column.name] = []
+        elif isinstance(column.type, (String, Text)):
+            stub[column.name] = ""
+    return stub
+
+
+def _fsync(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def export_snapshot(source: Engine, path: str) -> dict:
+    """Copy the public content tables from Postgres into a new SQLite file and swap it in at path.
+
+    Every table is read in one REPEATABLE READ transaction, so the
+    snapshot is consistent across tables. The file is built under a
+    temporary name and published with os.replace; nodes serving the old
+    file keep their open connections and switch on their next check.
+    """
+    path = os.path.abspath(path)
+    partial = f"{path}.{os.getpid()}.partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    target = create_engine(f"sqlite:///{partial}")
+    # 相關內容表讓快照節點的詳情頁也帶 related
+    tables = [SYNC_RESOURCES[name][0].__table__ for name in SNAPSHOT_TABLES] + [RelatedItem.__table__]
+    Base.metadata.create_all(target, tables=tables)
+    counts = {}
+    exported_at = datetime.utcnow()
+    try:
+        with source.connect().execution_options(isolation_level="REPEATABLE READ") as src, target.begin() as dst:
+            for name in SNAPSHOT_TABLES:
+                table = SYNC_RESOURCES[name][0].__table__
+                live = SYNC_RESOURCES[name][2].name
+                result = src.execution_options(yield_per=EXPORT_BATCH_ROWS).execute(select(table))
+                counts[name] = 0
+                for batch in result.mappings().partitions():
+                    rows = [dict(row) if row[live] else tombstone(table, row, live) for row in batch]
+                    dst.execute(insert(table), rows)
+                    counts[name] += len(rows)
+            related = RelatedItem.__table__
+            if src.execute(text("SELECT to_regclass('related_items')")).scalar() is not None:
+                rows = [dict(row) for row in src.execute(select(related)).mappings()]
+                if rows:
+                    dst.execute(insert(related), rows)
+                counts["related_items"] = len(rows)
+            dst.exec_driver_sql("CREATE TABLE snapshot_meta (key TEXT PRIMARY KEY, value TEXT)")
+            dst.exec_driver_sql(
+                "INSERT INTO snapshot_meta VALUES ('exported_at', ?)", (exported_at.isoformat(),)
+            )
+        target.dispose()
+        # 以一般連線做 ANALYZE 與 VACUUM，讓查詢計劃有統計資訊、檔案緊密
+        conn = sqlite3.connect(partial)
+        try:
+            conn.execute("ANALYZE")
+            conn.commit()
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+        _fsync(partial)
+        os.replace(partial, path)
+        _fsync(os.path.dirname(path))
+    except BaseException:
+        target.dispose()
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return {"path": path, "exported_at": exported_at.isoformat(), "rows": counts}
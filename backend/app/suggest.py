@@ -0,0 +1,324 @@
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import itertools
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import unicodedata
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from .database import SessionLocal
+from .events import RELATED, Change, on_change
+from .models import Case, Job, News, Product, Technique
+from .snapshot import snapshot_source
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Writes in other workers reach this worker's index by a full rebuild at most this long after
+SUGGEST_REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", "300"))
+# Only this many leading characters of each suffix are indexed
+SUGGEST_KEY_CHARS = 24
+# Matches examined per lookup, which bounds lookup time for one-letter prefixes
+SUGGEST_SCAN_LIMIT = 200
+SUGGEST_MAX_RESULTS = 20
+
+
+@dataclass(frozen=True)
+class SuggestField:
+    column: str
+    kind: str
+    shared: bool = False  # 標籤與分類由多筆資料共用，合併成一個建議並計數
+
+
+# Indexed columns per table and the live column that hides deleted rows
+SUGGEST_SOURCES = {
+    "jobs": (Job, "is_active", [SuggestField("title", "job"), SuggestField("tags", "tag", True)]),
+    "news": (News, "is_published", [SuggestField("title", "news"), SuggestField("category", "category", True)]),
+    "cases": (Case, "is_active", [SuggestField("title", "case"), SuggestField("industry", "category", True)]),
+    "products": (Product, "is_active", [SuggestField("name", "product"), SuggestField("category", "category", True)]),
+    "techniques": (Technique, "is_active", [SuggestField("name", "technique"), SuggestField("category", "category", True)]),
+}
+SUGGEST_KINDS = {source.kind for _, _, fields in SUGGEST_SOURCES.values() for source in fields}
+
+# 中日韓文字沒有空白分詞，每個字元都可以是搜尋起點
+CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]")
+
+
+def normalize(text: str) -> str:
+    """NFKC and case folding, so full-width and upper-case input match too"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def suffix_keys(text: str) -> List[str]:
+    """Index keys for text: the suffixes starting at each English word and at every CJK character"""
+    normalized = normalize(text)
+    keys = []
+    for position, char in enumerate(normalized):
+        if char == " ":
+            continue
+        word_start = position == 0 or not normalized[position - 1].isalnum()
+        if word_start or CJK.match(char):
+            keys.append(normalized[position:position + SUGGEST_KEY_CHARS])
+    return list(dict.fromkeys(keys))
+
+
+@dataclass
+class Term:
+    text: str
+    kind: str
+    table: str
+    shared_key: Optional[Tuple[str, str]] = None
+    refs: Set[Tuple[str, int]] = field(default_factory=set)
+    keys: List[str] = field(default_factory=list)
+
+
+class PrefixIndex:
+    """Suggestions by prefix over a sorted array of (suffix key, term id).
+
+    A lookup is a binary search plus a short scan, so it runs in well
+    under a millisecond for the site's content. Items are replaced one at
+    a time as they are written; each insert or removal shifts the array,
+    which is cheap at this size.
+    """
+
+    def __init__(self):
+        self.entries: List[Tuple[str, int]] = []
+        self.terms: Dict[int, Term] = {}
+        self.shared: Dict[Tuple[str, str], int] = {}  # (kind, normalized text) -> term id
+        self.items: Dict[Tuple[str, int], List[int]] = {}  # (table, id) -> term ids
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _add_term(self, term: Term, bulk: bool = False) -> int:
+        term_id = next(self._ids)
+        term.keys = suffix_keys(term.text)
+        self.terms[term_id] = term
+        if term.shared_key:
+            self.shared[term.shared_key] = term_id
+        for key in term.keys:
+            if bulk:
+                self.entries.append((key, term_id))
+            else:
+                insort(self.entries, (key, term_id))
+        return term_id
+
+    def _drop_term(self, term_id: int):
+        term = self.terms.pop(term_id)
+        for key in term.keys:
+            position = bisect_left(self.entries, (key, term_id))
+            if position < len(self.entries) and self.entries[position] == (key, term_id):
+                del self.entries[position]
+        if term.shared_key:
+            del self.shared[term.shared_key]
+
+    def _remove_item(self, item: Tuple[str, int]):
+        for term_id in self.items.pop(item, []):
+            term = self.terms[term_id]
+            term.refs.discard(item)
+            if not term.refs:
+                self._drop_term(term_id)
+
+    def put(self, table: str, id: int, values: Dict[str, object], bulk: bool = False):
+        """Index one live item, replacing whatever was indexed for it before.
+
+        bulk appends keys unsorted; call sort() once the whole load is in.
+        """
+        item = (table, id)
+        with self._lock:
+            self._remove_item(item)
+            term_ids = []
+            for source in SUGGEST_SOURCES[table][2]:
+                value = values.get(source.column)
+                texts = value if isinstance(value, list) else [value]
+                for text in texts:
+                    if not text or not str(text).strip():
+                        continue
+                    text = str(text).strip()
+                    shared_key = (source.kind, normalize(text)) if source.shared else None
+                    term_id = self.shared.get(shared_key) if shared_key else None
+                    if term_id is None:
+                        term_id = self._add_term(Term(text, source.kind, table, shared_key), bulk)
+                    if term_id not in term_ids:
+                        self.terms[term_id].refs.add(item)
+                        term_ids.append(term_id)
+            self.items[item] = term_ids
+
+    def sort(self):
+        with self._lock:
+            self.entries.sort()
+
+    def remove(self, table: str, id: int):
+        with self._lock:
+            self._remove_item((table, id))
+
+    def search(self, prefix: str, limit: int = 10, kinds: Optional[Iterable[str]] = None) -> List[dict]:
+        prefix = normalize(prefix)[:SUGGEST_KEY_CHARS]
+        if not prefix:
+            return []
+        kinds = set(kinds) if kinds else None
+        matches = {}
+        with self._lock:
+            position = bisect_left(self.entries, (prefix,))
+            for key, term_id in itertools.islice(self.entries, position, position + SUGGEST_SCAN_LIMIT):
+                if not key.startswith(prefix):
+                    break
+                term = self.terms[term_id]
+                if kinds and term.kind not in kinds:
+                    continue
+                # 從開頭就相符的排在中間字詞相符之前
+                at_start = term.keys[0].startswith(prefix)
+                if term_id not in matches or at_start:
+                    matches[term_id] = (term, at_start, len(term.refs))
+        ranked = sorted(matches.values(), key=lambda match: (not match[1], -match[2], len(match[0].text), match[0].text))
+        results = []
+        for term, _, count in ranked[:limit]:
+            suggestion = {"text": term.text, "kind": term.kind, "count": count}
+            if term.kind not in ("tag", "category"):
+                suggestion["table"], suggestion["id"] = next(iter(term.refs))
+            results.append(suggestion)
+        return results
+
+
+def _session() -> Session:
+    return snapshot_source.session() if snapshot_source else SessionLocal()
+
+
+def _load_rows(db: Session, table: str, ids: Optional[List[int]] = None):
+    model, live_column, fields = SUGGEST_SOURCES[table]
+    columns = [model.id, getattr(model, live_column)] + [getattr(model, source.column) for source in fields]
+    query = db.query(*columns)
+    if ids is not None:
+        query = query.filter(model.id.in_(ids))
+    names = ["id", "live"] + [source.column for source in fields]
+    return [dict(zip(names, row)) for row in query]
+
+
+class Suggester:
+    """The process-wide index: built on first use, patched on local writes, rebuilt periodically.
+
+    Only the first build runs in a request. Later rebuilds run in a
+    background thread while requests keep using the old index. Writes are
+    queued by the change listener and patched in by a background thread,
+    in order; those patched during a rebuild are replayed onto the new
+    index before it replaces the old one.
+    """
+
+    def __init__(self, refresh_seconds: int = SUGGEST_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.index: Optional[PrefixIndex] = None
+        self.built_at = 0.0
+        self.replay: Optional[List[Change]] = None  # 重建期間收到的寫入
+        self.pending = queue.Queue()
+        self._patcher = None
+        self._build_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+
+    def build(self) -> PrefixIndex:
+        index = PrefixIndex()
+        db = _session()
+        try:
+            for table in SUGGEST_SOURCES:
+                for row in _load_rows(db, table):
+                    if row["live"]:
+                        index.put(table, row["id"], row, bulk=True)
+        finally:
+            db.close()
+        index.sort()
+        return index
+
+    def current(self) -> PrefixIndex:
+        if self.index is None:
+            with self._build_lock:
+                if self.index is None:
+                    self._rebuild()
+        elif time.monotonic() - self.built_at >= self.refresh_seconds and self._build_lock.acquire(blocking=False):
+            # 只讓一個執行緒在背景重建，請求繼續用舊索引
+            threading.Thread(target=self._rebuild_in_background, name="suggest-rebuild", daemon=True).start()
+        return self.index
+
+    def _rebuild_in_background(self):
+        try:
+            self._rebuild()
+        except Exception:
+            logger.exception("suggest index rebuild failed")
+            # 舊索引繼續使用，下一個請求再試
+        finally:
+            self._build_lock.release()
+
+    def _rebuild(self):
+        started = time.monotonic()
+        with self._replay_lock:
+            self.replay = []
+        try:
+            index = self.build()
+            with self._replay_lock:
+                for change in self.replay:
+                    self._patch(index, change)
+                self.index = index
+                self.built_at = time.monotonic()
+        finally:
+            with self._replay_lock:
+                self.replay = None
+        logger.info("suggest index built in %.1f ms", (self.built_at - started) * 1000)
+
+    def apply(self, change: Change):
+        if change.table not in SUGGEST_SOURCES or change.operation == RELATED:
+            return
+        if change.id is None:
+            # 整張表變動 (例如大量匯入)：下次查詢時重建
+            self.built_at = 0.0
+            return
+        # 修補要查資料庫，不在寫入請求的執行緒中進行
+        self.pending.put(change)
+        with self._replay_lock:
+            if self._patcher is None:
+                self._patcher = threading.Thread(target=self._run_patcher, name="suggest-patch", daemon=True)
+                self._patcher.start()
+
+    def _run_patcher(self):
+        while True:
+            change = self.pending.get()
+            try:
+                with self._replay_lock:
+                    if self.replay is not None:
+                        self.replay.append(change)
+                    index = self.index
+                if index is not None:
+                    self._patch(index, change)
+            except Exception:
+                # 修補失敗只影響這一筆，下次重建時補上
+                logger.exception("suggest index patch failed for %s", change)
+            finally:
+                self.pending.task_done()
+
+    def _patch(self, index: PrefixIndex, change: Change):
+        if change.operation == "delete":
+            index.remove(change.table, change.id)
+            return
+        db = _session()
+        try:
+            rows = _load_rows(db, change.table, [change.id])
+        finally:
+            db.close()
+        if rows and rows[0]["live"]:
+            index.put(change.table, change.id, rows[0])
+        else:
+            index.remove(change.table, change.id)
+
+    def search(self, prefix: str, limit: int = 10, kinds: Optional[Iterable[str]] = None) -> List[dict]:
+        return self.current().search(prefix, limit, kinds)
+
+
+suggester = Suggester()
+
+
+@on_change
+def update_suggestions(change: Change):
+    suggester.apply(change)
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+import base64
+import binascii
+import json
+import os
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from .http_cache import CachePolicy
+from .models import Case, Job, News, Product, Technique
+from .schemas import Case as CaseSchema, Job as JobSchema, News as NewsSchema
+from .schemas import Product as ProductSchema, Technique as TechniqueSchema
+
+load_dotenv()
+
+# Rows updated more recently than this are held back so a transaction that
+# stamped updated_at earlier but commits later is never skipped by a token
+CHANGES_SAFETY_SECONDS = int(os.getenv("CHANGES_SAFETY_SECONDS", "5"))
+CHANGES_PAGE_SIZE = 500
+
+CHANGES_POLICY = CachePolicy(s_maxage=CHANGES_SAFETY_SECONDS, stale_if_error=60)
+
+# Synced resources: model, schema, and the column whose False value is the tombstone
+SYNC_RESOURCES = {
+    "jobs": (Job, JobSchema, Job.is_active),
+    "news": (News, NewsSchema, News.is_published),
+    "cases": (Case, CaseSchema, Case.is_active),
+    "products": (Product, ProductSchema, Product.is_active),
+    "techniques": (Technique, TechniqueSchema, Technique.is_active),
+}
+
+Cursor = Tuple[datetime, int]
+
+
+def encode_token(value) -> str:
+    raw = json.dumps(value, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid change token")
+
+
+def cursor_to_json(cursor: Cursor) -> list:
+    return [cursor[0].isoformat(), cursor[1]]
+
+
+def cursor_from_json(value) -> Cursor:
+    try:
+        timestamp, row_id = value
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid change token")
+
+
+def fetch_changes(db: Session, resource: str, since: Optional[Cursor], limit: int = CHANGES_PAGE_SIZE) -> dict:
+    """Rows changed after the cursor, ordered by (updated_at, id).
+
+    Without a cursor this is the initial sync and tombstones are left out.
+    The returned cursor is the last row read, or the safety horizon once
+    the client has caught up.
+    """
+    model, schema, live = SYNC_RESOURCES[resource]
+    limit = min(max(limit, 1), CHANGES_PAGE_SIZE)
+    horizon = datetime.utcnow() - timedelta(seconds=CHANGES_SAFETY_SECONDS)
+    query = db.query(model).filter(model.updated_at <= horizon)
+    if since is None:
+        query = query.filter(live == True)
+    else:
+        # 行值比較可以直接走 (updated_at, id) 索引
+        query = query.filter(tuple_(model.updated_at, model.id) > tuple_(*since))
+    rows = query.order_by(model.updated_at, model.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if has_more:
+        cursor = (rows[-1].updated_at, rows[-1].id)
+    else:
+        cursor = max(since, (horizon, 0)) if since else (horizon, 0)
+    return {
+        "upserted": [schema.model_validate(row) for row in rows if getattr(row, live.key)],
+        "deleted": [row.id for row in rows if not getattr(row, live.key)],
+        "cursor": cursor,
+        "has_more": has_more,
+    }
+
+
+def resource_changes(db: Session, resource: str, since: Optional[str], limit: int = CHANGES_PAGE_SIZE) -> dict:
+    """Delta for one resource; the token is opaque to clients"""
+    cursor = cursor_from_json(decode_token(since)) if since else None
+    changes = fetch_changes(db, resource, cursor, limit)
+    changes["next"] = encode_token(cursor_to_json(changes.pop("cursor")))
+    return changes
+
+
+def combined_changes(db: Session, resources, since: Optional[str], limit: int = CHANGES_PAGE_SIZE) -> dict:
+    """Delta across several resources under a single token holding one cursor per resource"""
+    cursors: Dict[str, list] = decode_token(since) if since else {}
+    if not isinstance(cursors, dict):
+        raise HTTPException(status_code=400, detail="Invalid change token")
+    changes, next_cursors = {}, dict(cursors)
+    for resource in resources:
+        cursor = cursor_from_json(cursors[resource]) if resource in cursors else None
+        delta = fetch_changes(db, resource, cursor, limit)
+        next_cursors[resource] = cursor_to_json(delta.pop("cursor"))
+        changes[resource] = delta
+    return {
+        "changes": {resource: {"upserted": d["upserted"], "deleted": d["deleted"]} for resource, d in changes.items()},
+        "next": encode_token(next_cursors),
+        "has_more": any(delta["has_more"] for delta in changes.values()),
+    }
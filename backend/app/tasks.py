@@ -0,0 +1,401 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+import logging
+import os
+import random
+import select
+import socket
+import threading
+import traceback
+import psycopg2
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Connection, make_url
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+
+from .database import DATABASE_URL, engine
+from .models import Task
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "avocado_tasks"
+# Idle workers look for due tasks at least this often; new tasks wake them through NOTIFY
+TASK_POLL_SECONDS = float(os.getenv("TASK_POLL_SECONDS", "5"))
+# A running task whose worker stopped renewing its lease for this long is requeued
+TASK_LEASE_SECONDS = int(os.getenv("TASK_LEASE_SECONDS", "300"))
+TASK_RETRY_BASE_SECONDS = 10
+TASK_RETRY_MAX_SECONDS = 3600
+TASK_RETENTION_DAYS = int(os.getenv("TASK_RETENTION_DAYS", "7"))
+# Tasks of one queue running at once across every worker, e.g. "default=4,maintenance=1"
+DEFAULT_QUEUE_LIMIT = 4
+QUEUE_LIMITS = {
+    "maintenance": 1,
+    "snapshot": 1,
+    **{
+        name.strip(): int(limit)
+        for name, limit in (item.split("=") for item in os.getenv("TASK_QUEUE_LIMITS", "").split(",") if "=" in item)
+    },
+}
+
+
+@dataclass
+class TaskSpec:
+    name: str
+    handler: Callable[..., object]
+    queue: str = "default"
+    priority: int = 0
+    max_attempts: int = 5
+    every: Optional[int] = None  # 週期任務的間隔秒數
+
+
+TASKS: Dict[str, TaskSpec] = {}
+
+
+def task(name: Optional[str] = None, queue: str = "default", priority: int = 0, max_attempts: int = 5, every: Optional[int] = None):
+    """Register a handler; it is called with the task's payload as keyword arguments.
+
+    every schedules the task each that many seconds (payload empty); the
+    workers enqueue it at most once per period between them.
+    """
+    def register(handler: Callable[..., object]):
+        spec = TaskSpec(name or handler.__name__, handler, queue, priority, max_attempts, every)
+        TASKS[spec.name] = spec
+        return handler
+    return register
+
+
+def queue_limit(queue: str) -> int:
+    return QUEUE_LIMITS.get(queue, DEFAULT_QUEUE_LIMIT)
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter after the attempts-th failure"""
+    delay = min(TASK_RETRY_MAX_SECONDS, TASK_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
+def enqueue(
+    name: str,
+    payload: Optional[dict] = None,
+    db: Optional[Session] = None,
+    delay: float = 0,
+    run_at: Optional[datetime] = None,
+    priority: Optional[int] = None,
+    unique_key: Optional[str] = None,
+) -> Optional[int]:
+    """Queue a registered task; returns its id, or None when unique_key was already used.
+
+    Pass db to enqueue inside the caller's transaction, so the task exists
+    exactly when the write that needs it commits.
+    """
+    spec = TASKS.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown task '{name}'")
+    statement = (
+        insert(Task)
+        .values(
+            queue=spec.queue,
+            name=name,
+            payload=payload or {},
+            priority=spec.priority if priority is None else priority,
+            max_attempts=spec.max_attempts,
+            unique_key=unique_key,
+            run_at=run_at or datetime.utcnow() + timedelta(seconds=delay),
+            created_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["unique_key"])
+        .returning(Task.id)
+    )
+    notify = text("SELECT pg_notify(:channel, :queue)")
+    params = {"channel": NOTIFY_CHANNEL, "queue": spec.queue}
+    if db is not None:
+        # NOTIFY 在交易提交時才送出；鍵已存在時沒有新任務，不喚醒 worker
+        task_id = db.execute(statement).scalar()
+        if task_id is not None:
+            db.execute(notify, params)
+        return task_id
+    with engine.begin() as conn:
+        task_id = conn.execute(statement).scalar()
+        if task_id is not None:
+            conn.execute(notify, params)
+    return task_id
+
+
+CLAIM_SQL = text(
+    "UPDATE tasks SET status = 'running', attempts = attempts + 1, started_at = :now, "
+    "locked_until = :locked_until, locked_by = :worker "
+    "WHERE id = (SELECT id FROM tasks WHERE queue = :queue AND status = 'queued' AND run_at <= :now "
+    "ORDER BY priority DESC, run_at, id LIMIT 1 FOR UPDATE SKIP LOCKED) "
+    "RETURNING id, name, payload, attempts, max_attempts"
+)
+
+
+def ready_queues(conn: Connection, queues: Optional[Iterable[str]], now: datetime) -> List[str]:
+    """Queues with due tasks, the one holding the most urgent task first"""
+    rows = conn.execute(
+        text(
+            "SELECT queue FROM tasks WHERE status = 'queued' AND run_at <= :now "
+            "GROUP BY queue ORDER BY max(priority) DESC, min(run_at)"
+        ),
+        {"now": now},
+    ).scalars()
+    return [queue for queue in rows if queues is None or queue in queues]
+
+
+def next_wait(next_runs: Dict[str, datetime], now: datetime) -> float:
+    """Seconds until the earliest future run_at, capped at TASK_POLL_SECONDS.
+
+    Queues whose tasks are already due were just found full (no free
+    slot), so they only wake a thread at the next poll or when a task
+    finishes, not in a busy loop.
+    """
+    upcoming = [run_at for run_at in next_runs.values() if run_at > now]
+    if not upcoming:
+        return TASK_POLL_SECONDS
+    return min(TASK_POLL_SECONDS, max(0.05, (min(upcoming) - now).total_seconds()))
+
+
+def current_period(now: datetime, every: int) -> int:
+    """Index of the every-second period containing now, a naive UTC datetime"""
+    return int(now.replace(tzinfo=timezone.utc).timestamp()) // every
+
+
+def queue_stats(now: Optional[datetime] = None) -> List[dict]:
+    """Depth, wait and run time per queue for the admin endpoint"""
+    now = now or datetime.utcnow()
+    hour_ago = now - timedelta(hours=1)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                "SELECT queue, "
+                "count(*) FILTER (WHERE status = 'queued' AND run_at <= :now) AS ready, "
+                "count(*) FILTER (WHERE status = 'queued' AND run_at > :now) AS scheduled, "
+                "count(*) FILTER (WHERE status = 'running') AS running, "
+                "count(*) FILTER (WHERE status = 'failed') AS failed, "
+                "count(*) FILTER (WHERE status = 'done' AND finished_at >= :hour_ago) AS done_last_hour, "
+                "EXTRACT(EPOCH FROM :now - min(run_at) FILTER (WHERE status = 'queued' AND run_at <= :now)) AS oldest_ready_seconds, "
+                "percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM started_at - run_at)) "
+                "FILTER (WHERE started_at >= :hour_ago) AS wait_p50_seconds, "
+                "percentile_cont(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM started_at - run_at)) "
+                "FILTER (WHERE started_at >= :hour_ago) AS wait_p95_seconds, "
+                "avg(EXTRACT(EPOCH FROM finished_at - started_at)) "
+                "FILTER (WHERE status = 'done' AND finished_at >= :hour_ago) AS run_avg_seconds "
+                "FROM tasks GROUP BY queue ORDER BY queue"
+            ),
+            {"now": now, "hour_ago": hour_ago},
+        ).mappings()
+        stats = []
+        for row in rows:
+            item = {key: round(float(value), 3) if key.endswith("_seconds") and value is not None else value for key, value in row.items()}
+            item["limit"] = queue_limit(row["queue"])
+            stats.append(item)
+        return stats
+
+
+class Worker:
+    """Runs tasks from the tasks table with a pool of threads.
+
+    Tasks are claimed with FOR UPDATE SKIP LOCKED, so any number of
+    workers can share the table. Per-queue limits hold across workers:
+    a thread runs a task only while it holds one of the queue's slots, a
+    session advisory lock that Postgres releases if the worker dies.
+    Leases are renewed while tasks run; tasks of a worker that vanished
+    are requeued once their lease expires.
+    """
+
+    def __init__(self, queues: Optional[Iterable[str]] = None, concurrency: int = 4, name: Optional[str] = None):
+        self.queues = set(queues) if queues else None
+        self.concurrency = concurrency
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self._wake = threading.Event()
+
+    def _acquire_slot(self, conn: Connection, queue: str) -> Optional[int]:
+        for slot in range(queue_limit(queue)):
+            if conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:key), :slot)"), {"key": f"tasks:{queue}", "slot": slot}).scalar():
+                return slot
+        return None
+
+    def _release_slot(self, conn: Connection, queue: str, slot: int):
+        conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key), :slot)"), {"key": f"tasks:{queue}", "slot": slot})
+
+    def run_one(self, conn: Connection) -> bool:
+        """Claim and run one due task; conn is this thread's autocommit connection holding slot locks"""
+        now = datetime.utcnow()
+        for queue in ready_queues(conn, self.queues, now):
+            slot = self._acquire_slot(conn, queue)
+            if slot is None:
+                continue
+            try:
+                claimed = conn.execute(CLAIM_SQL, {
+                    "now": now,
+                    "locked_until": now + timedelta(seconds=TASK_LEASE_SECONDS),
+                    "worker": self.name,
+                    "queue": queue,
+                }).mappings().first()
+                if claimed is None:
+                    continue
+                self.execute(conn, dict(claimed))
+            finally:
+                self._release_slot(conn, queue, slot)
+            # 釋出的名額可能正有到期任務在等
+            self._wake.set()
+            return True
+        return False
+
+    def execute(self, conn: Connection, claimed: dict):
+        spec = TASKS.get(claimed["name"])
+        started = datetime.utcnow()
+        try:
+            if spec is None:
+                raise LookupError(f"No handler registered for task '{claimed['name']}'")
+            spec.handler(**claimed["payload"])
+        except Exception:
+            error = traceback.format_exc()[-4000:]
+            failed = claimed["attempts"] >= claimed["max_attempts"]
+            retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(claimed["attempts"]))
+            conn.execute(
+                text(
+                    "UPDATE tasks SET status = :status, run_at = :run_at, finished_at = :finished_at, last_error = :error, "
+                    "locked_by = NULL, locked_until = NULL WHERE id = :id AND locked_by = :worker"
+                ),
+                {
+                    "status": "failed" if failed else "queued",
+                    "run_at": started if failed else retry_at,
+                    "finished_at": datetime.utcnow() if failed else None,
+                    "error": error,
+                    "id": claimed["id"],
+                    "worker": self.name,
+                },
+            )
+            logger.warning("task %s #%d attempt %d failed%s", claimed["name"], claimed["id"], claimed["attempts"], "; giving up" if failed else "")
+            return
+        conn.execute(
+            text(
+                "UPDATE tasks SET status = 'done', finished_at = :now, locked_by = NULL, locked_until = NULL "
+                "WHERE id = :id AND locked_by = :worker"
+            ),
+            {"now": datetime.utcnow(), "id": claimed["id"], "worker": self.name},
+        )
+
+    def _thread(self):
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            while not self.stopping.is_set():
+                try:
+                    if self.run_one(conn):
+                        continue
+                except Exception:
+                    logger.exception("task worker thread error")
+                self._wake.wait(self._idle_seconds(conn))
+                self._wake.clear()
+
+    def _idle_seconds(self, conn: Connection) -> float:
+        # 延遲或重試中的任務到期時自行醒來，不必等下一次輪詢；只看本 worker 處理的佇列
+        try:
+            rows = conn.execute(
+                text("SELECT queue, min(run_at) FROM tasks WHERE status = 'queued' GROUP BY queue")
+            ).all()
+        except Exception:
+            return TASK_POLL_SECONDS
+        next_runs = {queue: run_at for queue, run_at in rows if self.queues is None or queue in self.queues}
+        return next_wait(next_runs, datetime.utcnow())
+
+    def housekeeping(self, now: Optional[datetime] = None):
+        """Renew this worker's leases, requeue tasks whose lease expired and enqueue due periodic tasks"""
+        now = now or datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(
+                text("UPDATE tasks SET locked_until = :until WHERE status = 'running' AND locked_by = :worker"),
+                {"until": now + timedelta(seconds=TASK_LEASE_SECONDS), "worker": self.name},
+            )
+            lost = conn.execute(
+                text(
+                    "UPDATE tasks SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                    "finished_at = CASE WHEN attempts >= max_attempts THEN CAST(:now AS timestamp) END, "
+                    "run_at = :now, last_error = 'lease expired on ' || locked_by, locked_by = NULL, locked_until = NULL "
+                    "WHERE status = 'running' AND locked_until < :now"
+                ),
+                {"now": now},
+            ).rowcount
+        if lost:
+            logger.warning("requeued %d tasks whose worker stopped renewing them", lost)
+        for spec in TASKS.values():
+            if spec.every and (self.queues is None or spec.queue in self.queues):
+                # 同一時段的鍵相同，多個 worker 只會排入一次
+                period = current_period(now, spec.every)
+                enqueue(spec.name, unique_key=f"{spec.name}@{period}", run_at=datetime.utcfromtimestamp(period * spec.every))
+
+    def run(self):
+        threads = [threading.Thread(target=self._thread, name=f"task-worker-{i}", daemon=True) for i in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        listener = psycopg2.connect(make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False))
+        listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        listener.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+        try:
+            while not self.stopping.is_set():
+                try:
+                    self.housekeeping()
+                except Exception:
+                    logger.exception("task housekeeping failed")
+                if select.select([listener], [], [], TASK_POLL_SECONDS) != ([], [], []):
+                    listener.poll()
+                    queues = {notify.payload for notify in listener.notifies}
+                    listener.notifies.clear()
+                    if self.queues is None or queues & self.queues:
+                        self._wake.set()
+        finally:
+            listener.close()
+            self._wake.set()
+            for thread in threads:
+                thread.join()
+
+    def stop(self, *_):
+        self.stopping.set()
+        self._wake.set()
+
+
+def purge_tasks(now: Optional[datetime] = None, days: int = TASK_RETENTION_DAYS) -> int:
+    """Delete finished tasks older than days; failed ones are kept four times as long for inspection"""
+    now = now or datetime.utcnow()
+    with engine.begin() as conn:
+        return conn.execute(
+            text(
+                "DELETE FROM tasks WHERE (status = 'done' AND finished_at < :done_cutoff) "
+                "OR (status = 'failed' AND finished_at < :failed_cutoff)"
+            ),
+            {"done_cutoff": now - timedelta(days=days), "failed_cutoff": now - timedelta(days=days * 4)},
+        ).rowcount
+
+
+def list_tasks(status: Optional[str] = None, queue: Optional[str] = None, limit: int = 100) -> List[dict]:
+    conditions, params = [], {"limit": limit}
+    if status:
+        conditions.append("status = :status")
+        params["status"] = status
+    if queue:
+        conditions.append("queue = :queue")
+        params["queue"] = queue
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"SELECT * FROM tasks {where} ORDER BY id DESC LIMIT :limit"), params).mappings()
+        return [dict(row) for row in rows]
+
+
+def retry_task(task_id: int) -> bool:
+    """Queue a failed task again with a fresh set of attempts"""
+    with engine.begin() as conn:
+        queue = conn.execute(
+            text(
+                "UPDATE tasks SET status = 'queued', attempts = 0, run_at = :now, finished_at = NULL "
+                "WHERE id = :id AND status = 'failed' RETURNING queue"
+            ),
+            {"id": task_id, "now": datetime.utcnow()},
+        ).scalar()
+        if queue is not None:
+            conn.execute(text("SELECT pg_notify(:channel, :queue)"), {"channel": NOTIFY_CHANNEL, "queue": queue})
+    return queue is not None
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ORM read path vs. column rows for 1k-row news and job pages
+
+    cd backend && python benchmarks/bench_read_path.py [--rows 1000] [--repeat 20]
+
+The ORM path is what list endpoints did before: load model instances,
+validate each through the pydantic schema (from_attributes) and encode
+with jsonable_encoder. The rows path selects the schema's columns as
+tuples and serializes the dicts directly. Rows are inserted in a
+transaction that is rolled back at the end, so the database is unchanged.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from app.cache import dump_json
+from app.database import engine
+from app.fields import fetch_projection, full_fields
+from app.models import Job, News
+from app.schemas import Job as JobSchema, News as NewsSchema
+
+
+def seed(db: Session, rows: int):
+    now = datetime.utcnow()
+    db.add_all(
+        News(
+            title=f"Benchmark news {i}",
+            content="Lorem ipsum dolor sit amet. " * 40,
+            category="Benchmark",
+            published_date=now,
+            is_published=True,
+            images=[f"/uploads/bench-{i}.jpg"],
+        )
+        for i in range(rows)
+    )
+    db.add_all(
+        Job(
+            title=f"Benchmark job {i}",
+            department="Engineering",
+            location="Taipei",
+            type="Full-time",
+            salary="negotiable",
+            description="Build and run detection pipelines. " * 20,
+            requirements=["Python", "PostgreSQL", "Threat modelling"],
+            benefits=["Remote", "Training budget"],
+            tags=["python", "security"],
+            is_active=True,
+        )
+        for i in range(rows)
+    )
+    db.flush()
+    db.expunge_all()
+
+
+def orm_path(db: Session, model, schema, live, rows: int) -> bytes:
+    items = [schema.model_validate(item) for item in db.query(model).filter(live == True).limit(rows).all()]
+    return json.dumps(jsonable_encoder(items), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def rows_path(db: Session, model, schema, live, rows: int) -> bytes:
+    query = db.query(model).filter(live == True).limit(rows)
+    return dump_json(fetch_projection(query, model, full_fields(model, schema)))
+
+
+def measure(path, db: Session, args, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        path(db, *args)
+        timings.append(time.perf_counter() - start)
+        # 每個請求都是新的 session，不讓 identity map 的命中影響結果
+        db.expunge_all()
+    tracemalloc.start()
+    path(db, *args)
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+    db.expunge_all()
+    return {
+        "median_ms": statistics.median(timings) * 1000,
+        "p95_ms": sorted(timings)[int(len(timings) * 0.95) - 1] * 1000,
+        "peak_kib": peak / 1024,
+        "retained_blocks": blocks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ORM and row read paths")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = Session(bind=connection)
+    try:
+        seed(db, args.rows)
+        print(f"{'page':<8}{'path':<6}{'median ms':>11}{'p95 ms':>9}{'peak KiB':>10}{'retained':>10}")
+        for name, model, schema, live in (
+            ("news", News, NewsSchema, News.is_published),
+            ("jobs", Job, JobSchema, Job.is_active),
+        ):
+            orm_body = orm_path(db, model, schema, live, args.rows)
+            assert orm_body == rows_path(db, model, schema, live, args.rows), "paths disagree"
+            db.expunge_all()
+            for label, path in (("orm", orm_path), ("rows", rows_path)):
+                result = measure(path, db, (model, schema, live, args.rows), args.repeat)
+                print(
+                    f"{name:<8}{label:<6}{result['median_ms']:>11.1f}{result['p95_ms']:>9.1f}"
+                    f"{result['peak_kib']:>10.0f}{result['retained_blocks']:>10}"
+                )
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Related content job: rebuild the related_items table from TF-IDF similarity of every live job, news item and case
+
+    python build_related.py
+
+Writes keep the table current incrementally while the API runs; run this
+nightly (e.g. from cron) so term weights follow the content and writes
+made on other workers are folded in.
+"""
+from app.related import RELATED_MIN_SCORE, RELATED_TOP_K, rebuild_related
+
+
+def main():
+    print(f"🔄 Rebuilding related items (top {RELATED_TOP_K}, min score {RELATED_MIN_SCORE})...")
+    _, stats = rebuild_related()
+    print(f"✅ {stats['items']} items, {stats['pairs']} related pairs ({stats['elapsed']}s)")
+
+
+if __name__ == "__main__":
+    main()
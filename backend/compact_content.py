@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Compaction job: move content rows soft-deleted longer than the retention window into <table>_archive
+
+    python compact_content.py                   # all content tables, COMPACTION_RETENTION_DAYS
+    python compact_content.py jobs news --days 90
+
+Run daily (e.g. from cron). Archived rows can be listed and restored through
+GET /api/admin/archive/{table} and POST /api/admin/archive/{table}/{id}/restore.
+"""
+import argparse
+
+from app.compaction import COMPACTION_RETENTION_DAYS, compact_all
+from app.sync import SYNC_RESOURCES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive long soft-deleted content rows")
+    parser.add_argument("tables", nargs="*", choices=sorted(SYNC_RESOURCES), help="defaults to every content table")
+    parser.add_argument("--days", type=int, default=COMPACTION_RETENTION_DAYS, help="retention window in days")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip VACUUM after moving rows")
+    args = parser.parse_args()
+
+    print(f"🔄 Compacting rows soft-deleted more than {args.days} days ago...")
+    for stats in compact_all(args.tables, retention_days=args.days, vacuum=not args.no_vacuum):
+        print(f"✅ {stats.table}: {stats.moved} rows archived in {stats.batches} batches ({stats.elapsed}s)")
+
+
+if __name__ == "__main__":
+    main()
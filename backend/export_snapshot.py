@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Export the public content tables to a read-only SQLite snapshot for edge nodes
+
+    python export_snapshot.py snapshot.db             # export once
+    python export_snapshot.py snapshot.db --watch     # re-export whenever content changes
+
+Edge nodes run the backend with SNAPSHOT_PATH=<file>; they need no Postgres
+connection and pick up a new file within SNAPSHOT_CHECK_SECONDS. Copy the
+file to remote nodes under a temporary name and rename it into place
+(e.g. rsync --delay-updates) so they never see a partial file.
+"""
+import argparse
+import json
+import select
+import time
+import psycopg2
+from sqlalchemy.engine import make_url
+
+from app.changefeed import NOTIFY_CHANNEL
+from app.database import DATABASE_URL, engine
+from app.snapshot import SNAPSHOT_TABLES
+from app.snapshot_export import export_snapshot
+
+
+def export(path: str):
+    result = export_snapshot(engine, path)
+    rows = ", ".join(f"{name} {count}" for name, count in result["rows"].items())
+    print(f"✅ Snapshot {result['exported_at']} written to {result['path']} ({rows})")
+
+
+def watch(path: str, debounce: float, interval: float):
+    """Re-export after content changes settle for debounce seconds, and at least every interval seconds"""
+    conn = psycopg2.connect(make_url(DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False))
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+    export(path)
+    exported, pending_since = time.monotonic(), None
+    print(f"🔄 Watching for content changes (debounce {debounce}s)...")
+    while True:
+        if select.select([conn], [], [], 1) != ([], [], []):
+            conn.poll()
+            while conn.notifies:
+                change = json.loads(conn.notifies.pop(0).payload)
+                if change.get("table") in SNAPSHOT_TABLES and pending_since is None:
+                    pending_since = time.monotonic()
+        now = time.monotonic()
+        if (pending_since is not None and now - pending_since >= debounce) or now - exported >= interval:
+            export(path)
+            exported, pending_since = now, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a read-only SQLite snapshot of public content")
+    parser.add_argument("path", help="snapshot file to write (replaced atomically)")
+    parser.add_argument("--watch", action="store_true", help="keep running and re-export on content changes")
+    parser.add_argument("--debounce", type=float, default=5.0, help="seconds to wait for more changes before exporting")
+    parser.add_argument("--interval", type=float, default=3600.0, help="export at least this often in watch mode")
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(args.path, args.debounce, args.interval)
+    else:
+        export(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from dotenv import load_dotenv
 
 from app.database import engine, get_db
 from app.models import Base
+from app.partitions import ensure_partitions
 from app.routers import auth, products, cases, techniques, contact
 from app.schemas import ContactCreate
 
@@ -16,6 +17,8 @@ load_dotenv()
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+# 建立 contacts 本月與接下來幾個月的分區
+ensure_partitions()
 
 app = FastAPI(
     title="Avocado.ai API",
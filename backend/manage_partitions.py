@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Partition maintenance for time-partitioned tables (contacts)
+
+    python manage_partitions.py ensure                # create upcoming monthly partitions
+    python manage_partitions.py retain --months 24    # archive and drop partitions older than 24 months
+
+Run both monthly (e.g. from cron); the app also creates upcoming partitions on startup.
+"""
+import argparse
+
+from app.partitions import (
+    ARCHIVE_DIR,
+    CONTACT_RETENTION_MONTHS,
+    PARTITION_PREMAKE_MONTHS,
+    PARTITIONED_TABLES,
+    apply_retention,
+    ensure_partitions,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create, archive and drop monthly partitions")
+    parser.add_argument("command", choices=["ensure", "retain"])
+    parser.add_argument("--table", choices=sorted(PARTITIONED_TABLES), default="contacts")
+    parser.add_argument("--ahead", type=int, default=PARTITION_PREMAKE_MONTHS, help="months of partitions to create ahead")
+    parser.add_argument("--months", type=int, default=CONTACT_RETENTION_MONTHS, help="months of data to keep")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    created = ensure_partitions(args.table, months_ahead=args.ahead)
+    for name in created:
+        print(f"✅ Created partition {name}")
+    if args.command == "retain":
+        print(f"🔄 Archiving {args.table} partitions older than {args.months} months...")
+        for archived in apply_retention(args.table, months=args.months, archive_dir=args.archive_dir):
+            print(f"✅ Archived {archived['partition']}: {archived['rows']} rows -> {archived['path']}")
+    print("✅ Partition maintenance completed")
+
+
+if __name__ == "__main__":
+    main()
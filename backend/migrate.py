@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Apply the versioned schema migrations in migrations/ that this database has not run yet
+
+    python migrate.py                # apply everything pending
+    python migrate.py --dry-run      # list pending steps with the lock each takes
+    python migrate.py --target 0005  # stop after version 0005
+    python migrate.py status
+
+Each migration is a migrations/NNNN_name.py file whose up(op) declares
+steps through app.migrations.Operations: DDL waits at most
+MIGRATION_LOCK_TIMEOUT for its lock and is retried with backoff, backfills
+run in short batches, constraints are added NOT VALID and validated
+separately, and indexes are built CONCURRENTLY. Applied versions are
+recorded in schema_migrations.
+"""
+import argparse
+import sys
+
+from app.database import engine
+from app.migrations import applied_versions, load_migrations, migrate
+
+
+def status():
+    with engine.connect() as conn:
+        applied = applied_versions(conn)
+    for migration in load_migrations():
+        applied_at = applied.get(migration.version)
+        mark = f"✅ {applied_at:%Y-%m-%d %H:%M}" if applied_at else "⏳ pending         "
+        print(f"{mark}  {migration.version}: {migration.description}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.add_argument("command", nargs="?", choices=["up", "status"], default="up")
+    parser.add_argument("--dry-run", action="store_true", help="print the pending steps and their locks without running them")
+    parser.add_argument("--target", help="apply versions up to and including this one")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        status()
+        return
+    try:
+        pending = migrate(target=args.target, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Error during migration: {e}")
+        sys.exit(1)
+    if not pending:
+        print("✅ Database is up to date")
+    elif not args.dry_run:
+        print(f"✅ Applied {len(pending)} migrations")
+
+
+if __name__ == "__main__":
+    main()
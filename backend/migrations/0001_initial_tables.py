@@ -0,0 +1,10 @@
+"""Create every table in app.models that does not exist yet
+
+A fresh database gets the whole current schema here and the later
+migrations find nothing left to do; on an existing database only tables
+added since it was set up are created.
+"""
+
+
+def up(op):
+    op.create_tables()
@@ -0,0 +1,6 @@
+"""Add jobs.tags"""
+
+
+def up(op):
+    # 常數預設值只寫入目錄，不重寫整張表
+    op.add_column("jobs", "tags", "VARCHAR[] DEFAULT '{}'")
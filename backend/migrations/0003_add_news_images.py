@@ -0,0 +1,5 @@
+"""Add news.images"""
+
+
+def up(op):
+    op.add_column("news", "images", "VARCHAR[] DEFAULT '{}'")
@@ -0,0 +1,9 @@
+"""Replace techniques.methodology and applications with a required features column"""
+
+
+def up(op):
+    op.add_column("techniques", "features", "VARCHAR[]")
+    op.backfill("techniques", "features = ARRAY['Feature 1', 'Feature 2', 'Feature 3']", "features IS NULL")
+    op.set_not_null("techniques", "features")
+    op.drop_column("techniques", "methodology")
+    op.drop_column("techniques", "applications")
@@ -0,0 +1,27 @@
+"""Add the indexes used by list filters, sorts and delta sync"""
+
+# 必須與 app/models.py 宣告的索引一致
+INDEXES = [
+    ("ix_jobs_department", "jobs", "department", None),
+    ("ix_jobs_location", "jobs", "location", None),
+    ("ix_jobs_type", "jobs", "type", None),
+    ("ix_jobs_posted_date", "jobs", "posted_date", None),
+    ("ix_jobs_tags", "jobs", "tags", "gin"),
+    ("ix_news_published_date", "news", "published_date", None),
+    ("ix_news_category_published_date", "news", "category, published_date", None),
+    ("ix_cases_industry", "cases", "industry", None),
+    ("ix_products_category", "products", "category", None),
+    ("ix_techniques_category", "techniques", "category", None),
+    ("ix_contacts_interest", "contacts", "interest", None),
+    ("ix_contacts_created_at", "contacts", "created_at", None),
+    ("ix_jobs_updated_at_id", "jobs", "updated_at, id", None),
+    ("ix_news_updated_at_id", "news", "updated_at, id", None),
+    ("ix_cases_updated_at_id", "cases", "updated_at, id", None),
+    ("ix_products_updated_at_id", "products", "updated_at, id", None),
+    ("ix_techniques_updated_at_id", "techniques", "updated_at, id", None),
+]
+
+
+def up(op):
+    for name, table, columns, using in INDEXES:
+        op.create_index(name, table, columns, using=using)
@@ -0,0 +1,7 @@
+"""Add the content hash used for contact duplicate suppression"""
+
+
+def up(op):
+    # 可為空且無預設值：只改目錄資料
+    op.add_column("contacts", "content_hash", "VARCHAR(64)")
+    op.create_index("ix_contacts_content_hash_created_at", "contacts", "content_hash, created_at")
@@ -0,0 +1,109 @@
+"""Convert contacts into a table range-partitioned by month on created_at
+
+The rows are copied in batches into contacts_partitioned while contacts
+stays live, and a trigger mirrors every write made meanwhile, so nothing
+is left to catch up at the end. Only the last step takes ACCESS
+EXCLUSIVE, to swap the names and drop the old table.
+"""
+from datetime import datetime
+from sqlalchemy import MetaData, text
+
+from app.migrations import MIGRATION_BATCH_ROWS
+from app.models import Contact
+from app.partitions import PARTITION_PREMAKE_MONTHS, add_months, create_partitions, month_start
+
+SHADOW = "contacts_partitioned"
+LEGACY_INDEXES = [
+    "contacts_pkey",
+    "ix_contacts_id",
+    "ix_contacts_interest",
+    "ix_contacts_created_at",
+    "ix_contacts_content_hash_created_at",
+]
+COLUMNS = [column.name for column in Contact.__table__.columns]
+
+
+def row_values(row: str) -> str:
+    # created_at 是新表的分區鍵，舊資料可能沒有
+    return ", ".join(
+        f"COALESCE({row}.created_at, now() AT TIME ZONE 'utc')" if name == "created_at" else f"{row}.{name}" for name in COLUMNS
+    )
+
+
+MIRROR_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION contacts_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM {SHADOW} WHERE id = OLD.id;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO {SHADOW} ({", ".join(COLUMNS)}) VALUES ({row_values("NEW")}) ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# 來源列加共享鎖：複製中的列被修改或刪除時，等這批提交後再由觸發器同步
+COPY_BATCH = text(
+    f"WITH batch AS (SELECT * FROM contacts WHERE id > :after ORDER BY id LIMIT :batch FOR SHARE), "
+    f"copied AS (INSERT INTO {SHADOW} ({', '.join(COLUMNS)}) SELECT {row_values('batch')} FROM batch ON CONFLICT DO NOTHING) "
+    f"SELECT id FROM batch"
+)
+
+
+def is_partitioned(conn) -> bool:
+    return conn.execute(text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('contacts')")).scalar()
+
+
+def take_final_names(conn):
+    """Rename the partitions and indexes of the new table to what they will be called after the swap"""
+    # 月分區名稱給 manage_partitions 辨認；舊表的索引已改名，不會衝突
+    rows = conn.execute(
+        text("SELECT relname, relkind FROM pg_class WHERE relname LIKE :shadow AND relkind IN ('r', 'i', 'I')"),
+        {"shadow": f"%{SHADOW}%"},
+    ).all()
+    for name, kind in rows:
+        conn.execute(text(f"ALTER {'TABLE' if kind == 'r' else 'INDEX'} {name} RENAME TO {name.replace(SHADOW, 'contacts')}"))
+
+
+def prepare(conn):
+    if is_partitioned(conn):
+        return
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": SHADOW}).scalar() is None:
+        for index in LEGACY_INDEXES:
+            # 索引名稱在 schema 內唯一，先讓給新表
+            conn.execute(text(f"ALTER INDEX IF EXISTS {index} RENAME TO {index.replace('contacts', 'contacts_legacy', 1)}"))
+        Contact.__table__.to_metadata(MetaData(), name=SHADOW).create(conn)
+        first = conn.execute(text("SELECT min(created_at) FROM contacts")).scalar() or datetime.utcnow()
+        create_partitions(conn, SHADOW, first, add_months(month_start(datetime.utcnow()), PARTITION_PREMAKE_MONTHS), "created_at")
+        take_final_names(conn)
+    conn.execute(text(MIRROR_FUNCTION))
+    conn.execute(text("DROP TRIGGER IF EXISTS contacts_mirror ON contacts"))
+    conn.execute(text("CREATE TRIGGER contacts_mirror AFTER INSERT OR UPDATE OR DELETE ON contacts FOR EACH ROW EXECUTE FUNCTION contacts_mirror()"))
+
+
+def copy_batch(conn, after: int) -> list:
+    if is_partitioned(conn):
+        return []
+    return conn.execute(COPY_BATCH, {"after": after, "batch": MIGRATION_BATCH_ROWS}).scalars().all()
+
+
+def swap(conn):
+    if is_partitioned(conn):
+        return
+    conn.execute(text("LOCK TABLE contacts IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("DROP TRIGGER contacts_mirror ON contacts"))
+    conn.execute(text("DROP FUNCTION contacts_mirror()"))
+    conn.execute(text("ALTER TABLE contacts RENAME TO contacts_legacy"))
+    conn.execute(text("ALTER SEQUENCE contacts_id_seq RENAME TO contacts_legacy_id_seq"))
+    conn.execute(text(f"SELECT setval('{SHADOW}_id_seq', (SELECT last_value FROM contacts_legacy_id_seq))"))
+    conn.execute(text(f"ALTER SEQUENCE {SHADOW}_id_seq RENAME TO contacts_id_seq"))
+    conn.execute(text(f"ALTER TABLE {SHADOW} RENAME TO contacts"))
+    conn.execute(text("DROP TABLE contacts_legacy"))
+
+
+def up(op):
+    op.run(f"create {SHADOW} with monthly partitions and mirror writes on contacts into it", prepare, "SHARE ROW EXCLUSIVE", "contacts", True)
+    op.run_batches(f"copy contacts into {SHADOW} (batches of {MIGRATION_BATCH_ROWS})", copy_batch, "ROW EXCLUSIVE", "contacts")
+    op.run("swap the partitioned table in for contacts and drop the old one", swap, "ACCESS EXCLUSIVE", "contacts", True)
@@ -0,0 +1,5 @@
+"""Add the related_items table filled by build_related.py"""
+
+
+def up(op):
+    op.create_tables("related_items")
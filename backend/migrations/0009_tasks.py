@@ -0,0 +1,5 @@
+"""Add the tasks table used by the background worker"""
+
+
+def up(op):
+    op.create_tables("tasks")
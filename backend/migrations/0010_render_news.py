@@ -0,0 +1,14 @@
+"""Add pre-rendered news HTML, excerpt and reading time, and render existing rows"""
+from app.rendering import RENDER_BATCH_ROWS, render_batch
+
+
+def up(op):
+    op.add_column("news", "content_html", "TEXT")
+    op.add_column("news", "excerpt", "VARCHAR")
+    op.add_column("news", "reading_time", "INTEGER")
+    op.run_batches(
+        f"render content_html, excerpt and reading_time of news rows without them (batches of {RENDER_BATCH_ROWS})",
+        lambda conn, after: render_batch(conn, after, only_missing=True),
+        "ROW EXCLUSIVE",
+        "news",
+    )
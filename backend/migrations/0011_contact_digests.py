@@ -0,0 +1,5 @@
+"""Add the unique contact digest table that enforces duplicate suppression"""
+
+
+def up(op):
+    op.create_tables("contact_digests")
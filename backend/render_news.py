@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""
+News rendering job: re-render content_html, excerpt and reading_time from the Markdown content
+
+    python render_news.py              # every news item
+    python render_news.py --missing    # only rows never rendered
+
+Writes render on the way in; run this after changing the Markdown
+extensions or the allowed tags in app/rendering.py.
+"""
+import argparse
+
+from app.rendering import rerender_news
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-render news content")
+    parser.add_argument("--missing", action="store_true", help="only rows without content_html")
+    args = parser.parse_args()
+    print("🔄 Rendering news content...")
+    stats = rerender_news(only_missing=args.missing)
+    print(f"✅ {stats['rendered']} news items rendered ({stats['elapsed']}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import time
+import psycopg2
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+
+from app.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitBreakerMiddleware, LastKnownGoodStore, is_outage
+
+
+class QueryCanceled(psycopg2.OperationalError):
+    pgcode = "57014"
+
+
+def connection_refused() -> OperationalError:
+    return OperationalError("SELECT 1", {}, psycopg2.OperationalError("connection refused"))
+
+
+def wait_for(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert predicate()
+
+
+class TestOutageErrors:
+    """測試哪些錯誤代表資料庫無法連線"""
+
+    def test_connection_refused(self):
+        assert is_outage(connection_refused())
+
+    def test_statement_timeout_is_not_an_outage(self):
+        assert not is_outage(OperationalError("SELECT 1", {}, QueryCanceled("canceled")))
+
+    def test_other_errors(self):
+        assert not is_outage(ValueError("bad input"))
+
+
+class TestCircuitBreaker:
+    """測試斷路器狀態轉換"""
+
+    def test_opens_after_threshold_within_window(self):
+        breaker = CircuitBreaker(probe=lambda: None, threshold=3, window=10)
+        breaker.record_failure(now=100)
+        breaker.record_failure(now=115)
+        breaker.record_failure(now=116)
+        assert breaker.state == CLOSED
+        breaker.record_failure(now=117)
+        assert breaker.state == OPEN
+        assert not breaker.allow(now=118)
+
+    def test_successful_probe_closes(self):
+        breaker = CircuitBreaker(probe=lambda: None, threshold=1, open_seconds=5)
+        breaker.record_failure(now=100)
+        assert not breaker.allow(now=106)
+        wait_for(lambda: breaker.state == CLOSED)
+        assert breaker.allow()
+
+    def test_failed_probe_reopens(self):
+        def probe():
+            raise connection_refused()
+
+        breaker = CircuitBreaker(probe=probe, threshold=1, open_seconds=5)
+        breaker.record_failure(now=100)
+        breaker.allow(now=106)
+        wait_for(lambda: breaker.state != HALF_OPEN)
+        assert breaker.state == OPEN
+        assert breaker.trips == 2
+
+
+def make_client(tmp_path, breaker):
+    store = LastKnownGoodStore(str(tmp_path / "lkg.db"))
+    app = FastAPI()
+    app.add_middleware(CircuitBreakerMiddleware, breaker=breaker, store=store)
+    state = {"down": False}
+
+    @app.get("/api/jobs/")
+    def jobs(response: Response):
+        if state["down"]:
+            raise connection_refused()
+        response.headers["X-Total-Count"] = "1"
+        response.headers["Cache-Control"] = "public, max-age=0, s-maxage=60"
+        return [{"id": 1}]
+
+    # 沒有公開快取標頭的讀取：聯絡表單與草稿
+    @app.get("/api/contact/")
+    def contacts():
+        return [{"email": "someone@example.com"}]
+
+    @app.get("/api/news/admin/all")
+    def drafts():
+        return [{"title": "draft"}]
+
+    @app.post("/api/contact/")
+    def contact():
+        return {"ok": True}
+
+    return TestClient(app, raise_server_exceptions=False), store, state
+
+
+def test_serves_last_known_good_while_open(tmp_path):
+    breaker = CircuitBreaker(probe=connection_refused, threshold=1, open_seconds=60)
+    client, store, state = make_client(tmp_path, breaker)
+    assert client.get("/api/jobs/").status_code == 200
+    store.queue.join()
+
+    state["down"] = True
+    response = client.get("/api/jobs/")
+    assert breaker.state == OPEN
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1}]
+    assert response.headers["x-total-count"] == "1"
+    assert response.headers["warning"].startswith("111")
+    assert "age" in response.headers
+
+    assert client.get("/api/jobs/?page=2").status_code == 503
+    write = client.post("/api/contact/")
+    assert write.status_code == 503
+    assert "retry-after" in write.headers
+
+
+def test_private_reads_are_never_stored(tmp_path):
+    """沒有公開 Cache-Control 的回應不寫入磁碟，斷路時也不回放"""
+    breaker = CircuitBreaker(probe=connection_refused, threshold=1, open_seconds=60)
+    client, store, state = make_client(tmp_path, breaker)
+    for path in ("/api/contact/", "/api/news/admin/all", "/api/jobs/"):
+        assert client.get(path).status_code == 200
+    store.queue.join()
+    assert store.load("/api/contact/?") is None
+    assert store.load("/api/news/admin/all?") is None
+    assert store.load("/api/jobs/?") is not None
+
+    breaker.record_failure()
+    assert client.get("/api/contact/").status_code == 503
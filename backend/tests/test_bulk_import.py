@@ -0,0 +1,60 @@
+import io
+from datetime import datetime, timezone
+
+from app.bulk_import import (
+    IMPORT_SPECS,
+    CopyStream,
+    ImportStats,
+    copy_value,
+    merge_sql,
+    read_records,
+    validated_rows,
+)
+from app.schemas import JobCreate
+
+
+class TestCopyEncoding:
+    """測試 COPY 文字格式的編碼"""
+
+    def test_escapes_and_nulls(self):
+        assert copy_value("a\tb\nc\\d") == "a\\tb\\nc\\\\d"
+        assert copy_value(None) == "\\N"
+        assert copy_value(False) == "f"
+
+    def test_arrays_and_timestamps(self):
+        assert copy_value(['say "hi"', "x"]) == '{"say \\\\"hi\\\\"","x"}'
+        assert copy_value(datetime(2024, 1, 1, 8, tzinfo=timezone.utc)) == "2024-01-01T08:00:00"
+
+    def test_stream_reads_in_chunks(self):
+        stream = CopyStream(("row", i) for i in range(1000))
+        chunks = iter(lambda: stream.read(100), "")
+        assert "".join(chunks).count("\n") == 1000
+        assert stream.count == 1000
+
+
+class TestRecords:
+    """測試讀取與驗證"""
+
+    def test_csv_list_columns(self):
+        """CSV 的陣列欄位接受 JSON 陣列或 | 分隔"""
+        csv_text = 'title,requirements,tags\nEngineer,"[""a"", ""b""]",py|ai\n'
+        record = next(read_records(io.StringIO(csv_text), "csv", JobCreate))
+        assert record["requirements"] == ["a", "b"]
+        assert record["tags"] == ["py", "ai"]
+
+    def test_invalid_rows_counted_and_skipped(self):
+        spec = IMPORT_SPECS["contacts"]
+        stats = ImportStats("contacts")
+        records = [
+            {"name": "a", "email": "a@b.c", "message": "hi", "interest": "AI"},
+            {"name": "missing fields"},
+        ]
+        rows = list(validated_rows(records, spec, ["name", "email"], stats))
+        assert rows == [("a", "a@b.c")]
+        assert (stats.read, stats.invalid, stats.errors[0]["row"]) == (2, 1, 2)
+
+
+def test_merge_updates_only_changed_rows():
+    update, insert = merge_sql("products", ["name", "price"], ["name"], {"created_at": None, "updated_at": None})
+    assert "IS DISTINCT FROM" in update and "updated_at = %(now)s" in update
+    assert "WHERE NOT EXISTS" in insert and "created_at, updated_at" in insert
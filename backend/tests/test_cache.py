@@ -0,0 +1,85 @@
+import os
+import time
+import pytest
+
+from app.cache import ResponseCache, redis
+
+# 本地 Redis 服務器 (沒有時跳過 L2 測試)
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+
+def redis_available():
+    if redis is None:
+        return False
+    try:
+        return redis.Redis.from_url(TEST_REDIS_URL).ping()
+    except redis.RedisError:
+        return False
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestLocalTier:
+    """測試單一進程內的快取"""
+
+    def test_hit_skips_producer(self):
+        """命中時不再執行查詢"""
+        cache = ResponseCache(ttl=60, redis_url="")
+        calls = []
+        producer = lambda: calls.append(1) or b"[]"
+        assert cache.get_or_set("/api/news/?", ["news"], producer) == b"[]"
+        assert cache.get_or_set("/api/news/?", ["news"], producer) == b"[]"
+        assert len(calls) == 1
+
+    def test_invalidate_bumps_table_version(self):
+        """寫入後同一資料表的條目失效，其他資料表不受影響"""
+        cache = ResponseCache(ttl=60, redis_url="")
+        cache.get_or_set("news", ["news"], lambda: b"old")
+        cache.get_or_set("jobs", ["jobs"], lambda: b"jobs")
+        cache.invalidate("news")
+        assert cache.get_or_set("news", ["news"], lambda: b"new") == b"new"
+        assert cache.get_or_set("jobs", ["jobs"], lambda: b"other") == b"jobs"
+
+    def test_records_invalidation_time(self):
+        """記錄最近一次失效，供讀取暫時改走主庫"""
+        cache = ResponseCache(ttl=60, redis_url="")
+        assert not cache.invalidated_within(5)
+        cache.invalidate("news")
+        assert cache.invalidated_within(5)
+
+    def test_disabled(self):
+        """TTL 為 0 時不快取"""
+        cache = ResponseCache(ttl=0, redis_url="")
+        cache.get_or_set("news", ["news"], lambda: b"old")
+        assert cache.get_or_set("news", ["news"], lambda: b"new") == b"new"
+
+
+@pytest.mark.skipif(not redis_available(), reason="local Redis server is not available")
+class TestSharedTier:
+    """測試多個 worker 共用的 Redis 快取"""
+
+    @pytest.fixture(autouse=True)
+    def clean_redis(self):
+        redis.Redis.from_url(TEST_REDIS_URL).flushdb()
+
+    def test_entry_shared_between_workers(self):
+        """一個 worker 的結果可被另一個 worker 讀取"""
+        first, second = ResponseCache(60, TEST_REDIS_URL), ResponseCache(60, TEST_REDIS_URL)
+        first.get_or_set("news", ["news"], lambda: b"shared")
+        assert second.get_or_set("news", ["news"], lambda: b"recomputed") == b"shared"
+
+    def test_invalidation_broadcast(self):
+        """另一個 worker 的寫入會讓本地 L1 條目失效"""
+        first, second = ResponseCache(60, TEST_REDIS_URL), ResponseCache(60, TEST_REDIS_URL)
+        first.get_or_set("news", ["news"], lambda: b"old")
+        assert wait_for(first._subscribed.is_set)
+        second.invalidate("news")
+        assert wait_for(lambda: first.versions.get("news") == second.versions["news"])
+        assert first.get_or_set("news", ["news"], lambda: b"new") == b"new"
@@ -0,0 +1,74 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.changefeed import Subscriber, format_sse
+from app.database import get_db
+from app.routers import changes
+
+
+def no_db():
+    yield None
+
+
+def change(table: str, id: int = 1, operation: str = "update", live: bool = True) -> dict:
+    return {"type": "change", "data": {"table": table, "id": id, "operation": operation, "updated_at": None, "live": live}}
+
+
+class TestSubscriber:
+    """測試變更推播的訂閱者"""
+
+    def test_table_filter(self):
+        """只收到訂閱的資料表，控制事件一律送達"""
+        subscriber = Subscriber(asyncio.new_event_loop(), ["news"])
+        assert subscriber.wants(change("news"))
+        assert not subscriber.wants(change("jobs"))
+        assert subscriber.wants({"type": "reset", "data": {}})
+
+    def test_anonymous_subscribers_see_public_writes_only(self):
+        """匿名訂閱者收不到聯絡表單與草稿，下架仍會收到"""
+        subscriber = Subscriber(asyncio.new_event_loop())
+        assert subscriber.wants(change("news"))
+        assert not subscriber.wants(change("contacts"))
+        assert not subscriber.wants(change("news", operation="create", live=False))
+        assert subscriber.wants(change("news", operation="delete", live=False))
+
+    def test_signed_in_subscribers_see_everything(self):
+        subscriber = Subscriber(asyncio.new_event_loop(), private=True)
+        assert subscriber.wants(change("contacts"))
+        assert subscriber.wants(change("news", operation="create", live=False))
+
+    def test_overflow_drops_slow_client(self, monkeypatch):
+        """佇列滿時改送 overflow 並停止投遞"""
+        monkeypatch.setattr("app.changefeed.SUBSCRIBER_QUEUE_SIZE", 2)
+        subscriber = Subscriber(asyncio.new_event_loop())
+        for i in range(5):
+            subscriber.deliver(change("news", i))
+        events = [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+        assert [event["type"] for event in events] == ["change", "overflow"]
+
+
+def test_format_sse():
+    assert format_sse(change("news", 3)).startswith('event: change\ndata: {"table": "news", "id": 3')
+    assert format_sse(change("news")).endswith("\n\n")
+
+
+class TestStreamAccess:
+    """測試私有資料表需要登入"""
+
+    app = FastAPI()
+    app.include_router(changes.router, prefix="/api/changes")
+    app.dependency_overrides[get_db] = no_db
+    client = TestClient(app)
+
+    def test_private_tables_need_a_token(self):
+        response = self.client.get("/api/changes/stream", params={"tables": "news,contacts"})
+        assert response.status_code == 401
+
+    def test_invalid_token_is_rejected(self):
+        """帶了無效憑證就不會退回公開串流"""
+        response = self.client.get("/api/changes/stream", headers={"Authorization": "Bearer forged"})
+        assert response.status_code == 401
+
+    def test_unknown_tables(self):
+        assert self.client.get("/api/changes/stream", params={"tables": "users"}).status_code == 400
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+
+from app.compaction import move_sql, restore_sql
+from app.main import app
+from app.routers.auth import get_current_user
+
+
+class TestCompactionSql:
+    """測試搬移與還原的 SQL"""
+
+    def test_move_takes_one_batch_of_expired_tombstones(self):
+        sql = move_sql("jobs", ["id", "title", "is_active", "updated_at"], "is_active")
+        assert "is_active = false AND updated_at < :cutoff" in sql
+        assert "LIMIT :batch FOR UPDATE SKIP LOCKED" in sql
+        assert sql.endswith("INSERT INTO jobs_archive (id, title, is_active, updated_at) SELECT id, title, is_active, updated_at FROM moved")
+
+    def test_restore_revives_and_stamps_row(self):
+        sql = restore_sql("news", ["id", "title", "is_published", "updated_at"], "is_published")
+        assert "DELETE FROM news_archive WHERE id = :id" in sql
+        assert "INSERT INTO news (id, title, is_published, updated_at) SELECT id, title, true, :now" in sql
+
+
+def test_archive_rejects_tables_without_one():
+    app.dependency_overrides[get_current_user] = lambda: {"username": "admin"}
+    try:
+        response = TestClient(app).post("/api/admin/archive/users/1/restore")
+    finally:
+        app.dependency_overrides.pop(get_current_user)
+    assert response.status_code == 404
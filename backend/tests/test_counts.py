@@ -0,0 +1,105 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app import counts
+from app.cache import response_cache
+from app.counts import CountResult, RowCounters, bounded_count, count_total, estimate_rows, total_count_headers
+from app.events import emit_change
+from app.models import Base, Job
+
+JOB = {
+    "location": "Taipei", "type": "Full-time", "salary": "n/a", "description": "", "requirements": [],
+    "benefits": [], "tags": [], "is_active": True, "posted_date": datetime(2024, 1, 1),
+}
+
+
+def jobs_session(departments) -> Session:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Job.__table__])
+    with engine.begin() as conn:
+        conn.execute(insert(Job.__table__), [
+            {**JOB, "id": id, "title": f"Job {id}", "department": department} for id, department in enumerate(departments, 1)
+        ])
+    return Session(engine)
+
+
+def make_request(query: str = "") -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/api/jobs/", "query_string": query.encode(), "headers": []})
+
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    """精確計數上限設為 5，並使用新的計數器與回應快取版本"""
+    monkeypatch.setattr(counts, "EXACT_COUNT_LIMIT", 5)
+    monkeypatch.setattr(counts, "row_counters", RowCounters(refresh_seconds=60))
+    response_cache.invalidate("jobs")
+
+
+class TestRowCounters:
+    """測試由寫入路徑增量維護的計數器"""
+
+    def test_seeded_once_then_cached(self):
+        counters = RowCounters(refresh_seconds=60)
+        seeds = []
+        assert counters.get("contacts", lambda: seeds.append(1) or 5000) == 5000
+        assert counters.get("contacts", lambda: seeds.append(1) or 0) == 5000
+        assert len(seeds) == 1
+
+    def test_write_events_adjust_counters(self, monkeypatch):
+        """新增加一、刪除減一、整表變更重新取樣"""
+        counters = RowCounters(refresh_seconds=60)
+        monkeypatch.setattr(counts, "row_counters", counters)
+        counters.get("contacts", lambda: 5000)
+        emit_change("contacts", 1, "create")
+        emit_change("contacts", 2, "create")
+        emit_change("contacts", 1, "delete")
+        assert counters.get("contacts", lambda: 0) == 5001
+        emit_change("contacts")
+        assert counters.get("contacts", lambda: 42) == 42
+
+
+class TestCounting:
+    """測試精確與估算總數的選擇"""
+
+    def test_bounded_count_stops_after_limit(self):
+        """超過上限時只數到上限加一，表示還有更多"""
+        db = jobs_session(["R&D"] * 7)
+        query = db.query(Job)
+        assert bounded_count(db, query, Job, 5) == 6
+        assert bounded_count(db, query, Job, 10) == 7
+        assert bounded_count(db, query.filter(Job.department == "Sales"), Job, 5) == 0
+
+    def test_estimate_falls_back_to_count_without_statistics(self):
+        """快照 (SQLite) 沒有統計資訊時直接計數"""
+        db = jobs_session(["R&D"] * 3 + ["Sales"] * 2)
+        assert estimate_rows(db, db.query(Job)) == 5
+        assert estimate_rows(db, db.query(Job).filter(Job.department == "Sales")) == 2
+
+    def test_small_results_are_exact(self, small_limit):
+        db = jobs_session(["R&D"] * 4)
+        assert count_total(db, db.query(Job), Job, unfiltered=False) == CountResult(4, True)
+
+    def test_large_results_are_estimated(self, small_limit):
+        """超過上限改用估算，且不小於已數到的筆數"""
+        db = jobs_session(["R&D"] * 8)
+        assert count_total(db, db.query(Job), Job, unfiltered=False) == CountResult(8, False)
+
+    def test_unfiltered_uses_counter_only_when_large(self, small_limit):
+        """未篩選時計數器夠大就直接使用，否則仍精確計數"""
+        db = jobs_session(["R&D"] * 3)
+        counts.row_counters.get("jobs", lambda: 5000)
+        assert count_total(db, db.query(Job), Job, unfiltered=True) == CountResult(5000, False)
+        assert count_total(db, db.query(Job), Job, unfiltered=True, use_counter=False) == CountResult(3, True)
+        counts.row_counters.reset("jobs")
+        counts.row_counters.get("jobs", lambda: 2)
+        assert count_total(db, db.query(Job), Job, unfiltered=True) == CountResult(3, True)
+
+    def test_headers_mark_exact_and_estimated_totals(self, small_limit):
+        db = jobs_session(["R&D"] * 7 + ["Sales"] * 2)
+        headers = total_count_headers(make_request("department=Sales"), db, db.query(Job).filter(Job.department == "Sales"), Job)
+        assert headers == {"X-Total-Count": "2", "X-Total-Count-Exact": "true"}
+        headers = total_count_headers(make_request(), db, db.query(Job), Job, use_counter=False)
+        assert headers == {"X-Total-Count": "9", "X-Total-Count-Exact": "false"}
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app import deadlines
+from app.deadlines import DeadlineExceeded, apply_statement_timeout, budget_for, check_deadline, deadline_middleware, request_deadline
+from app.limiter import ConcurrencyLimitMiddleware, ConcurrencyLimiter, GradientLimit
+
+
+def make_request(path: str, method: str = "GET", headers=None) -> Request:
+    return Request({
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": b"",
+        "headers": [(name.encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+class FakeConnection:
+    def __init__(self, dialect: str = "postgresql"):
+        self.dialect = SimpleNamespace(name=dialect)
+        self.statements = []
+
+    def exec_driver_sql(self, statement: str):
+        self.statements.append(statement)
+
+
+class TestBudgets:
+    """測試各路由的時間預算"""
+
+    def test_classes(self):
+        assert budget_for(make_request("/api/jobs/")) == ("public", deadlines.DEADLINE_BUDGETS["public"])
+        assert budget_for(make_request("/api/admin/tasks"))[0] == "admin"
+        assert budget_for(make_request("/api/admin/import/jobs", "POST"))[0] == "bulk"
+
+    def test_streams_have_no_deadline(self):
+        assert budget_for(make_request("/api/changes/stream")) == ("/api/changes/stream", None)
+
+
+class TestStatementTimeout:
+    """測試剩餘時間轉成 statement_timeout"""
+
+    def test_sets_remaining_budget(self, monkeypatch):
+        monkeypatch.setattr(deadlines.time, "monotonic", lambda: 100.0)
+        token = request_deadline.set(101.5)
+        try:
+            conn = FakeConnection()
+            apply_statement_timeout(None, None, conn)
+        finally:
+            request_deadline.reset(token)
+        assert conn.statements == ["SET LOCAL statement_timeout = 1500"]
+
+    def test_outside_requests_untouched(self):
+        conn = FakeConnection()
+        apply_statement_timeout(None, None, conn)
+        assert conn.statements == []
+
+    def test_sqlite_snapshot_untouched(self):
+        token = request_deadline.set(deadlines.time.monotonic() + 5)
+        try:
+            conn = FakeConnection("sqlite")
+            apply_statement_timeout(None, None, conn)
+        finally:
+            request_deadline.reset(token)
+        assert conn.statements == []
+
+    def test_spent_budget_refuses_new_transactions(self):
+        token = request_deadline.set(deadlines.time.monotonic() - 1)
+        try:
+            with pytest.raises(DeadlineExceeded):
+                apply_statement_timeout(None, None, FakeConnection())
+        finally:
+            request_deadline.reset(token)
+
+    def test_spent_budget_refuses_new_statements(self):
+        """同一交易內的下一個查詢也不再執行"""
+        token = request_deadline.set(deadlines.time.monotonic() - 1)
+        try:
+            with pytest.raises(DeadlineExceeded):
+                check_deadline(None, None, "SELECT 1", {}, None, False)
+        finally:
+            request_deadline.reset(token)
+
+
+def test_slow_request_gets_504(monkeypatch):
+    monkeypatch.setitem(deadlines.DEADLINE_BUDGETS, "public", 0.1)
+    monkeypatch.setattr(deadlines, "DEADLINE_GRACE_SECONDS", 0.05)
+    app = FastAPI()
+    app.middleware("http")(deadline_middleware)
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(1)
+        return {}
+
+    @app.get("/fast")
+    async def fast():
+        return {"left": deadlines.remaining() > 0}
+
+    client = TestClient(app)
+    assert client.get("/fast").json() == {"left": True}
+    response = client.get("/slow")
+    assert response.status_code == 504
+    assert deadlines.deadline_stats.routes["GET /slow"] >= 1
+
+
+def test_timed_out_sync_handler_keeps_its_slot(monkeypatch):
+    """504 之後同步處理函式的執行緒仍在跑，名額要等它結束才歸還"""
+    monkeypatch.setitem(deadlines.DEADLINE_BUDGETS, "public", 0.1)
+    monkeypatch.setattr(deadlines, "DEADLINE_GRACE_SECONDS", 0.05)
+    limiter = ConcurrencyLimiter(GradientLimit(initial=10))
+    finished = threading.Event()
+    app = FastAPI()
+    app.middleware("http")(deadline_middleware)
+    app.add_middleware(ConcurrencyLimitMiddleware, limiter=limiter)
+
+    @app.get("/api/busy")
+    def busy():
+        time.sleep(0.5)
+        finished.set()
+        return {}
+
+    samples = []
+
+    def sample():
+        for _ in range(8):
+            samples.append((finished.is_set(), limiter.inflight))
+            time.sleep(0.05)
+
+    sampler = threading.Thread(target=sample)
+    sampler.start()
+    assert TestClient(app).get("/api/busy").status_code == 504
+    sampler.join()
+    assert all(inflight == 1 for done, inflight in samples[1:] if not done)
+    assert limiter.inflight == 0
@@ -0,0 +1,91 @@
+from datetime import datetime
+from xml.dom.minidom import parseString
+
+from sqlalchemy import create_engine, insert, update
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app.cache import response_cache
+from app.feeds import AtomFeed, Document, document_response, http_date, jobs_feed, not_modified
+from app.models import Base, Job
+
+JOB = {
+    "department": "R&D", "location": "Taipei", "type": "Full-time", "salary": "n/a",
+    "description": "Build <things> & ship", "requirements": [], "benefits": [], "tags": [], "is_active": True,
+}
+
+
+def make_request(headers=None) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/api/jobs/feed.xml",
+        "query_string": b"",
+        "headers": [(name.encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def jobs_session(count: int) -> Session:
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[Job.__table__])
+    with engine.begin() as conn:
+        conn.execute(insert(Job.__table__), [
+            {**JOB, "id": id, "title": f"Job {id}", "posted_date": datetime(2024, 1, id), "updated_at": datetime(2024, 1, id)}
+            for id in range(1, count + 1)
+        ])
+    return Session(engine)
+
+
+class TestConditionalRequests:
+    """測試 ETag 與 Last-Modified 條件請求"""
+
+    document = Document.build(b"<feed/>", datetime(2024, 5, 1, 8, 0, 0, 500))
+
+    def test_matching_etag(self):
+        assert not_modified(make_request({"if-none-match": f'W/{self.document.etag}, "other"'}), self.document)
+        assert not not_modified(make_request({"if-none-match": '"other"'}), self.document)
+
+    def test_if_modified_since(self):
+        assert not_modified(make_request({"if-modified-since": http_date(datetime(2024, 5, 1, 8))}), self.document)
+        assert not not_modified(make_request({"if-modified-since": http_date(datetime(2024, 5, 1, 7))}), self.document)
+        assert not not_modified(make_request({"if-modified-since": "yesterday"}), self.document)
+
+    def test_etag_takes_precedence(self):
+        headers = {"if-none-match": '"other"', "if-modified-since": http_date(datetime(2030, 1, 1))}
+        assert not not_modified(make_request(headers), self.document)
+
+    def test_gzip_and_304_responses(self):
+        response = document_response(make_request({"accept-encoding": "gzip, br"}), self.document, "application/xml", ["jobs"])
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.body == self.document.gzipped
+        assert response.headers["vary"] == "Accept-Encoding"
+        response = document_response(make_request({"if-none-match": self.document.etag}), self.document, "application/xml", ["jobs"])
+        assert response.status_code == 304
+        assert response.body == b""
+
+
+class TestAtomFeed:
+    """測試 Atom feed 的增量產生"""
+
+    def test_latest_entries_escaped(self):
+        feed = AtomFeed(jobs_feed.spec, entries=2)
+        with jobs_session(3) as db:
+            document = feed.get(db)
+        root = parseString(document.body).documentElement
+        titles = [node.firstChild.data for node in root.getElementsByTagName("title")]
+        assert titles == ["酪梨智慧 Careers", "Job 3", "Job 2"]
+        assert "Build &lt;things&gt; &amp; ship" in document.body.decode()
+        assert document.last_modified == datetime(2024, 1, 3)
+
+    def test_only_changed_entries_rerendered(self):
+        feed = AtomFeed(jobs_feed.spec)
+        with jobs_session(3) as db:
+            first = feed.get(db)
+            assert feed.get(db) is first
+            assert feed.rendered == 3
+            db.execute(update(Job.__table__).where(Job.id == 2).values(title="Job 2b", updated_at=datetime(2024, 2, 1)))
+            response_cache.invalidate("jobs")
+            second = feed.get(db)
+        assert feed.rendered == 4
+        assert second.etag != first.etag
+        assert b"Job 2b" in second.body
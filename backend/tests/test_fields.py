@@ -0,0 +1,73 @@
+import pytest
+from fastapi import HTTPException
+
+from datetime import datetime
+
+from app.cache import dump_json
+from app.fields import EXCERPT_LENGTH, SUMMARY_FIELDS, full_fields, make_excerpt, select_fields
+from app.models import News
+from app.schemas import News as NewsSchema
+
+
+class TestSelectFields:
+    """測試 fields / view 參數解析"""
+
+    def test_full_by_default(self):
+        """沒有參數時回傳完整欄位"""
+        assert select_fields(News, NewsSchema) is None
+        assert select_fields(News, NewsSchema, view="full") is None
+
+    def test_summary_view(self):
+        """summary 不含大型文字欄位"""
+        selected = select_fields(News, NewsSchema, view="summary")
+        assert selected == SUMMARY_FIELDS[News]
+        assert "content" not in selected
+
+    def test_explicit_fields(self):
+        """明確欄位保持順序並去重"""
+        assert select_fields(News, NewsSchema, fields="title, id,title,excerpt") == ["title", "id", "excerpt"]
+
+    def test_unknown_field_rejected(self):
+        """未知欄位回傳 400"""
+        with pytest.raises(HTTPException) as exc_info:
+            select_fields(News, NewsSchema, fields="title,secret")
+        assert exc_info.value.status_code == 400
+
+    def test_unknown_view_rejected(self):
+        """未知 view 回傳 400"""
+        with pytest.raises(HTTPException):
+            select_fields(News, NewsSchema, view="compact")
+
+
+class TestExcerpt:
+    """測試摘要"""
+
+    def test_short_text_unchanged(self):
+        assert make_excerpt("Short\n text") == "Short text"
+
+    def test_english_cut_at_word_boundary(self):
+        excerpt = make_excerpt("word " * 100)
+        assert excerpt.endswith("word…")
+        assert len(excerpt) <= EXCERPT_LENGTH + 1
+
+    def test_chinese_cut_at_length(self):
+        assert make_excerpt("酪" * (EXCERPT_LENGTH + 1)) == "酪" * EXCERPT_LENGTH + "…"
+
+
+class TestRowReadPath:
+    """測試不經 ORM 實例的讀取路徑"""
+
+    def test_full_fields_follow_schema_order(self):
+        """完整欄位依 schema 順序，輸出的 JSON 與 pydantic 相同"""
+        fields = full_fields(News, NewsSchema)
+        assert fields == list(NewsSchema.model_fields)
+
+    def test_dump_matches_schema_serialization(self):
+        row = {
+            "title": "t", "content": "c", "category": "AI", "id": 1,
+            "published_date": datetime(2024, 5, 1, 8, 30, 0, 250), "is_published": True,
+            "images": ["/a.jpg"], "excerpt": "c", "reading_time": 1,
+            "created_at": datetime(2024, 5, 1), "updated_at": datetime(2024, 5, 1),
+        }
+        assert dump_json([row]) == dump_json([NewsSchema.model_validate(row)])
+
@@ -0,0 +1,59 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app.filters import apply_filters
+from app.models import Contact, Job, News
+
+
+def make_request(query_string: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": query_string.encode()})
+
+
+def compile_sql(model, query_string: str) -> str:
+    query = apply_filters(Session().query(model), model, make_request(query_string))
+    return str(query.statement.compile(dialect=postgresql.dialect()))
+
+
+class TestFilters:
+    """測試白名單篩選"""
+
+    def test_equality_and_in(self):
+        """單值用等號，重複參數用 IN"""
+        assert "jobs.department = " in compile_sql(Job, "department=Engineering")
+        assert "jobs.location IN " in compile_sql(Job, "location=Remote&location=Taipei")
+
+    def test_tags_use_array_operators(self):
+        """標籤篩選使用可走 GIN 索引的陣列運算子"""
+        assert "jobs.tags @> " in compile_sql(Job, "tag=python")
+        assert "jobs.tags && " in compile_sql(Job, "tag=python&tag=ai")
+
+    def test_date_range(self):
+        """日期範圍轉成範圍條件"""
+        sql = compile_sql(News, "published_from=2024-01-01&published_to=2024-12-31T23:59:59Z")
+        assert "news.published_date >= " in sql
+        assert "news.published_date <= " in sql
+
+    def test_unknown_filter_rejected(self):
+        """未宣告的篩選一律拒絕"""
+        with pytest.raises(HTTPException) as exc_info:
+            compile_sql(Contact, "email=a@b.c")
+        assert exc_info.value.status_code == 400
+
+    def test_invalid_date_rejected(self):
+        with pytest.raises(HTTPException):
+            compile_sql(Contact, "created_from=yesterday")
+
+
+class TestSorts:
+    """測試白名單排序"""
+
+    def test_sort_with_stable_tiebreaker(self):
+        """排序附帶 id 以確保分頁穩定"""
+        assert "ORDER BY news.published_date DESC, news.id DESC" in compile_sql(News, "sort=-published_date")
+
+    def test_unsortable_column_rejected(self):
+        with pytest.raises(HTTPException):
+            compile_sql(Job, "sort=salary")
@@ -0,0 +1,151 @@
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app import http_cache
+from app.events import emit_change
+from app.http_cache import PUBLIC_DETAIL, CachePolicy, SurrogateRegistry, cached_json
+
+app = FastAPI()
+
+
+@app.get("/api/items/")
+def list_items(request: Request):
+    return cached_json(request, ["items"], lambda: [{"id": 1}])
+
+
+@app.get("/api/items/{item_id}")
+def get_item(request: Request, item_id: int):
+    def load():
+        if item_id != 1:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return {"id": 1}
+    return cached_json(request, ["items"], load, PUBLIC_DETAIL, [f"items:{item_id}"])
+
+
+client = TestClient(app)
+
+
+class FakeRedis:
+    """只記錄登記的 Redis 替身"""
+
+    def __init__(self):
+        self.added = []
+        self.results = []
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def zadd(self, name, mapping, nx=False):
+        self.added.extend((name.removeprefix(http_cache.SURROGATE_PREFIX), url) for url in mapping)
+        self.results.append(len(mapping))
+
+    def zrange(self, name, start, end):
+        self.results.append([])
+
+    def zrem(self, name, *members):
+        self.results.append(len(members))
+
+    def scan_iter(self, match):
+        return iter(())
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+@pytest.fixture(autouse=True)
+def local_registry(monkeypatch):
+    registry = SurrogateRegistry()
+    monkeypatch.setattr(http_cache, "surrogate_registry", registry)
+    return registry
+
+
+class TestCacheHeaders:
+    """測試共享快取標頭"""
+
+    def test_policy_header(self):
+        """Cache-Control 包含 s-maxage 與 stale 指令"""
+        policy = CachePolicy(s_maxage=60, stale_while_revalidate=300, stale_if_error=86400)
+        assert policy.header() == "public, max-age=0, s-maxage=60, stale-while-revalidate=300, stale-if-error=86400"
+
+    def test_list_and_detail_keys(self):
+        """列表帶資料表鍵，詳情帶單筆鍵"""
+        response = client.get("/api/items/")
+        assert response.headers["surrogate-key"] == "items"
+        assert "s-maxage=60" in response.headers["cache-control"]
+        response = client.get("/api/items/1")
+        assert response.headers["surrogate-key"] == "items:1"
+
+    def test_not_found_is_cacheable(self):
+        """404 也帶快取標頭"""
+        response = client.get("/api/items/2")
+        assert response.status_code == 404
+        assert response.headers["surrogate-key"] == "items:2"
+
+    def test_authorized_requests_are_private(self):
+        """帶憑證的請求不進共享快取"""
+        response = client.get("/api/items/", headers={"Authorization": "Bearer token"})
+        assert response.headers["cache-control"] == "private, no-cache"
+        assert "surrogate-key" not in response.headers
+
+
+class TestPurge:
+    """測試寫入後的精準刷新"""
+
+    def test_write_purges_list_and_item_only(self, monkeypatch, local_registry):
+        """更新單筆只刷新列表與該筆詳情"""
+        purged = []
+        monkeypatch.setattr(http_cache.nginx_purger, "purge", lambda urls: purged.extend(urls))
+        client.get("/api/items/")
+        client.get("/api/items/?skip=10")
+        client.get("/api/items/1")
+        client.get("/api/items/2")
+        emit_change("items", 1, "update")
+        assert sorted(purged) == ["/api/items/", "/api/items/1", "/api/items/?skip=10"]
+
+    def test_related_change_purges_item_only(self, monkeypatch, local_registry):
+        """相關清單變更只刷新該筆詳情，列表不動"""
+        purged = []
+        monkeypatch.setattr(http_cache.nginx_purger, "purge", lambda urls: purged.extend(urls))
+        client.get("/api/items/")
+        client.get("/api/items/1")
+        emit_change("items", 1, "related")
+        assert purged == ["/api/items/1"]
+
+    def test_registration_survives_purge_on_another_worker(self, local_registry):
+        """其他 worker 清掉 key 後，同一網址再次請求仍會重新登記"""
+        local_registry.register(["items"], "/api/items/")
+        assert local_registry.pop_urls(["items"]) == {"/api/items/"}
+        local_registry.register(["items"], "/api/items/")
+        assert local_registry.pop_urls(["items"]) == {"/api/items/"}
+
+    def test_urls_per_key_are_capped(self, local_registry):
+        """每個 key 只刷新前幾個網址，其餘保留登記並在下次優先刷新"""
+        for skip in range(5):
+            local_registry.register(["items"], f"/api/items/?skip={skip}")
+        local_registry.register(["items"], "/api/items/")
+        assert local_registry.pop_urls(["items"], per_key=2) == {"/api/items/", "/api/items/?skip=0"}
+        # 刷新後重新登記的網址排到最後
+        local_registry.register(["items"], "/api/items/?skip=0")
+        local_registry.register(["items"], "/api/items/")
+        assert local_registry.pop_urls(["items"], per_key=2) == {"/api/items/", "/api/items/?skip=1"}
+        assert local_registry.pop_urls(["items"]) == {f"/api/items/?skip={skip}" for skip in (2, 3, 4, 0)}
+
+    def test_repeat_requests_register_once_per_version(self, monkeypatch):
+        """同一網址在快取版本不變時只登記一次，寫入後再次登記"""
+        registry = SurrogateRegistry(FakeRedis())
+        monkeypatch.setattr(http_cache, "surrogate_registry", registry)
+        client.get("/api/items/")
+        client.get("/api/items/")
+        assert registry.redis.added == [("items", "/api/items/")]
+        emit_change("items", 1, "update")
+        client.get("/api/items/")
+        assert registry.redis.added == [("items", "/api/items/")] * 2
+
+    def test_table_wide_change_purges_everything(self, local_registry):
+        """整表變更刷新該表所有條目"""
+        local_registry.register(["items"], "/api/items/")
+        local_registry.register(["items:1"], "/api/items/1")
+        local_registry.register(["other"], "/api/other/")
+        assert local_registry.pop_urls(["items"], prefix="items:") == {"/api/items/", "/api/items/1"}
@@ -0,0 +1,67 @@
+import itertools
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.dedupe import RecentDigests, contact_digest
+from app.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, store=IdempotencyStore())
+    counter = itertools.count(1)
+
+    @app.post("/items")
+    def create_item(item: dict):
+        return {"id": next(counter), **item}
+
+    return TestClient(app)
+
+
+class TestIdempotencyKey:
+    """測試 Idempotency-Key 回放"""
+
+    def test_retry_replays_first_response(self):
+        client = make_client()
+        headers = {"Idempotency-Key": "order-1"}
+        first = client.post("/items", json={"name": "a"}, headers=headers)
+        retry = client.post("/items", json={"name": "a"}, headers=headers)
+        assert retry.json() == first.json() == {"id": 1, "name": "a"}
+        assert retry.headers["idempotent-replayed"] == "true"
+
+    def test_without_key_every_post_runs(self):
+        client = make_client()
+        assert client.post("/items", json={}).json()["id"] == 1
+        assert client.post("/items", json={}).json()["id"] == 2
+
+    def test_key_reused_with_different_body(self):
+        """同一個 key 搭配不同內容視為用戶端錯誤"""
+        client = make_client()
+        client.post("/items", json={"name": "a"}, headers={"Idempotency-Key": "k"})
+        assert client.post("/items", json={"name": "b"}, headers={"Idempotency-Key": "k"}).status_code == 422
+
+    def test_pending_key_conflicts(self):
+        store = IdempotencyStore()
+        assert store.reserve("public|/items|k", "abc") is None
+        assert store.reserve("public|/items|k", "abc")["state"] == "pending"
+        store.release("public|/items|k")
+        assert store.reserve("public|/items|k", "abc") is None
+
+
+class TestContactDedupe:
+    """測試聯絡表單的重複送出過濾"""
+
+    def test_digest_ignores_case_and_spacing(self):
+        assert contact_digest("A@B.com ", "Hello   world") == contact_digest("a@b.com", "hello world")
+        assert contact_digest("a@b.com", "hello") != contact_digest("a@b.com", "hello!")
+
+    def test_filter_window_expiry(self):
+        """只記得目前與前一個時間窗"""
+        digests = RecentDigests("test", window=600)
+        digest = contact_digest("a@b.com", "hello")
+        assert not digests.might_contain(digest, now=1000)
+        digests.add(digest, now=1000)
+        assert digests.might_contain(digest, now=1000)
+        assert digests.might_contain(digest, now=1500)
+        assert not digests.might_contain(digest, now=2500)
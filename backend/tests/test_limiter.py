@@ -0,0 +1,123 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.limiter import ADMIN, BULK, PUBLIC, ConcurrencyLimitMiddleware, ConcurrencyLimiter, GradientLimit, classify
+
+
+def make_request(method, path, headers=None):
+    raw = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": method, "path": path, "query_string": b"", "headers": raw})
+
+
+class TestGradientLimit:
+    """測試依延遲調整的併發上限"""
+
+    def test_grows_while_latency_is_flat(self):
+        limit = GradientLimit(initial=10, min_limit=2, max_limit=100)
+        for _ in range(50):
+            limit.update(0.01, inflight=int(limit.limit))
+        assert limit.limit > 10
+
+    def test_shrinks_when_latency_rises(self):
+        limit = GradientLimit(initial=50, min_limit=2, max_limit=100)
+        for _ in range(100):
+            limit.update(0.01, inflight=50)
+        grown = limit.limit
+        for _ in range(50):
+            limit.update(0.2, inflight=50)
+        assert limit.limit < grown
+
+    def test_overload_cuts_limit(self):
+        limit = GradientLimit(initial=20, min_limit=4)
+        limit.update(0.01, inflight=20, dropped=True)
+        assert limit.limit == 18
+
+
+class TestConcurrencyLimiter:
+    """測試優先級排隊與卸載"""
+
+    def test_bulk_shed_before_public(self):
+        """上限用到一半時大量匯出直接被拒，公開讀取仍可進入"""
+        async def scenario():
+            limiter = ConcurrencyLimiter(GradientLimit(initial=4, min_limit=1))
+            assert await limiter.acquire(PUBLIC)
+            assert await limiter.acquire(PUBLIC)
+            assert not await limiter.acquire(BULK)
+            assert await limiter.acquire(PUBLIC)
+            return limiter.shed
+        assert asyncio.run(scenario()) == 1
+
+    def test_admin_woken_first(self):
+        """名額釋放時先給管理操作"""
+        async def scenario():
+            limiter = ConcurrencyLimiter(GradientLimit(initial=1, min_limit=1))
+            assert await limiter.acquire(ADMIN)
+            order = []
+
+            async def wait(cls):
+                await limiter.acquire(cls)
+                order.append(cls.name)
+                limiter.release()
+
+            tasks = [asyncio.create_task(wait(PUBLIC)), asyncio.create_task(wait(ADMIN))]
+            await asyncio.sleep(0)
+            limiter.release()
+            await asyncio.gather(*tasks)
+            return order, limiter.inflight
+        assert asyncio.run(scenario()) == (["admin", "public"], 0)
+
+    def test_waiter_times_out(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter(GradientLimit(initial=1, min_limit=1))
+            await limiter.acquire(ADMIN)
+            return await limiter.acquire(PUBLIC._replace(max_wait=0.01))
+        assert asyncio.run(scenario()) is False
+
+
+class TestClassify:
+    """測試請求分級"""
+
+    def test_admin_routes(self):
+        assert classify(make_request("GET", "/api/admin/metrics")) is ADMIN
+
+    def test_admin_reads_outside_admin_prefix(self):
+        """後台讀取的路由不一定在 /api/admin/ 下"""
+        assert classify(make_request("GET", "/api/news/admin/all")) is ADMIN
+        assert classify(make_request("GET", "/api/contact/")) is ADMIN
+        assert classify(make_request("GET", "/api/contact/12")) is ADMIN
+        assert classify(make_request("GET", "/api/auth/me")) is ADMIN
+        assert classify(make_request("GET", "/api/news/12")) is PUBLIC
+
+    def test_authorization_header_alone_is_not_admin(self):
+        """任何人都能送 Authorization 標頭，不可藉此插隊"""
+        assert classify(make_request("GET", "/api/news/", {"Authorization": "Bearer forged"})) is PUBLIC
+
+    def test_bulk_and_writes(self):
+        assert classify(make_request("POST", "/api/jobs/import")) is BULK
+        assert classify(make_request("POST", "/api/jobs/")) is ADMIN
+        assert classify(make_request("POST", "/api/contact/")) is PUBLIC
+
+
+class TestMiddleware:
+    """測試名額持有到回應送完"""
+
+    def test_streamed_body_holds_slot(self):
+        limiter = ConcurrencyLimiter(GradientLimit(initial=10))
+        inflight = []
+        app = FastAPI()
+        app.add_middleware(ConcurrencyLimitMiddleware, limiter=limiter)
+
+        @app.get("/api/jobs/export")
+        def export():
+            def rows():
+                for row in range(3):
+                    inflight.append(limiter.inflight)
+                    yield f"{row}\n"
+            return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+        assert TestClient(app).get("/api/jobs/export").text == "0\n1\n2\n"
+        assert inflight == [1, 1, 1]
+        assert limiter.inflight == 0
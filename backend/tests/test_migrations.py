@@ -0,0 +1,87 @@
+import pytest
+
+from app.migrations import Operations, load_migrations
+
+
+def plan(declare) -> list:
+    op = Operations()
+    declare(op)
+    return [(step.description, step.lock, step.brief) for step in op.steps]
+
+
+class TestOperations:
+    """測試遷移步驟與各步驟的鎖"""
+
+    def test_add_column_is_catalog_only(self):
+        steps = plan(lambda op: op.add_column("jobs", "tags", "VARCHAR[] DEFAULT '{}'"))
+        assert steps == [("ALTER TABLE jobs ADD COLUMN IF NOT EXISTS tags VARCHAR[] DEFAULT '{}'", "ACCESS EXCLUSIVE", True)]
+
+    def test_index_is_built_concurrently(self):
+        [(statement, lock, brief)] = plan(lambda op: op.create_index("ix_jobs_tags", "jobs", "tags", using="gin"))
+        assert statement == "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_jobs_tags ON jobs USING gin (tags)"
+        assert lock == "SHARE UPDATE EXCLUSIVE"
+
+    def test_set_not_null_validates_a_check_first(self):
+        steps = plan(lambda op: op.set_not_null("techniques", "features"))
+        assert [lock for _, lock, _ in steps] == [
+            "ACCESS EXCLUSIVE",
+            "SHARE UPDATE EXCLUSIVE",
+            "ACCESS EXCLUSIVE",
+            "ACCESS EXCLUSIVE",
+        ]
+        assert steps[0][0].endswith("CHECK (features IS NOT NULL) NOT VALID")
+        assert steps[1][0] == "ALTER TABLE techniques VALIDATE CONSTRAINT techniques_features_not_null"
+        # 只有驗證需要掃描整張表，且不擋讀寫
+        assert [brief for _, lock, brief in steps if lock == "ACCESS EXCLUSIVE"] == [True, True, True]
+
+    def test_backfill_runs_in_batches(self):
+        [(description, lock, brief)] = plan(lambda op: op.backfill("techniques", "features = '{}'", "features IS NULL", batch_rows=500))
+        assert description == "UPDATE techniques SET features = '{}' WHERE features IS NULL (batches of 500)"
+        assert lock == "ROW EXCLUSIVE" and not brief
+
+    def test_custom_batches_use_one_transaction_each(self):
+        """每批一個短交易，直到沒有資料"""
+        batches = [[1, 2], [5], []]
+        afters = []
+
+        class Engine:
+            def begin(self):
+                return Connection()
+
+        class Connection:
+            def __enter__(self):
+                return self
+            def __exit__(self, *exc):
+                return False
+            def execute(self, statement):
+                pass
+
+        op = Operations()
+        op.run_batches("render", lambda conn, after: afters.append(after) or batches.pop(0), "ROW EXCLUSIVE", "news", pause=0)
+        [step] = op.steps
+        assert step.run(Engine()) == 3
+        assert afters == [0, 2, 5]
+
+
+class TestLoadMigrations:
+    """測試版本檔載入"""
+
+    def test_versions_in_order(self, tmp_path):
+        (tmp_path / "0002_second.py").write_text('"""Second"""\ndef up(op):\n    op.drop_column("jobs", "old")\n')
+        (tmp_path / "0001_first.py").write_text("def up(op):\n    pass\n")
+        (tmp_path / "notes.py").write_text("")
+        migrations = load_migrations(str(tmp_path))
+        assert [(m.version, m.description) for m in migrations] == [("0001_first", "first"), ("0002_second", "Second")]
+        assert len(migrations[1].plan()) == 1
+
+    def test_duplicate_versions_rejected(self, tmp_path):
+        (tmp_path / "0001_a.py").write_text("def up(op):\n    pass\n")
+        (tmp_path / "0001_b.py").write_text("def up(op):\n    pass\n")
+        with pytest.raises(ValueError):
+            load_migrations(str(tmp_path))
+
+    def test_repository_migrations_plan(self):
+        migrations = load_migrations()
+        assert migrations[0].version == "0001_initial_tables"
+        for migration in migrations:
+            assert migration.plan()
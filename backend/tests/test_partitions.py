@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from app.partitions import _bounds, add_months, month_start, parse_partition, partition_name
+
+
+class TestMonths:
+    """測試月份計算"""
+
+    def test_add_months_crosses_years(self):
+        assert add_months(datetime(2024, 11, 1), 3) == datetime(2025, 2, 1)
+        assert add_months(datetime(2024, 1, 1), -1) == datetime(2023, 12, 1)
+        assert add_months(datetime(2024, 1, 1), -24) == datetime(2022, 1, 1)
+
+    def test_month_start_drops_day_and_time(self):
+        assert month_start(datetime(2024, 2, 29, 23, 59)) == datetime(2024, 2, 1)
+
+
+class TestPartitionNames:
+    """測試分區命名與邊界"""
+
+    def test_name_round_trip(self):
+        name = partition_name("contacts", datetime(2024, 3, 1))
+        assert name == "contacts_2024_03"
+        assert parse_partition(name) == ("contacts", datetime(2024, 3, 1))
+
+    def test_other_tables_are_not_partitions(self):
+        assert parse_partition("contacts_default") is None
+        assert parse_partition("contacts_legacy") is None
+
+    def test_bounds_cover_one_month(self):
+        assert _bounds(datetime(2024, 12, 1)) == "FROM ('2024-12-01 00:00:00') TO ('2025-01-01 00:00:00')"
@@ -0,0 +1,74 @@
+from app.related import RelatedModel, term_counts, tokenize
+
+
+ITEMS = {
+    ("jobs", 1): ("Security Engineer", {"title": "Security Engineer", "tags": ["Python", "SOC"], "description": "Threat hunting and incident response"}),
+    ("jobs", 2): ("Data Scientist", {"title": "Data Scientist", "tags": ["Python", "ML"], "description": "Machine learning models for fraud"}),
+    ("news", 3): ("New SOC platform", {"title": "New SOC platform", "category": "Product Launch", "content": "Incident response and threat hunting for every SOC"}),
+    ("cases", 4): ("Bank fraud detection", {"title": "Bank fraud detection", "industry": "Finance", "challenge": "Card fraud", "solution": "Machine learning models"}),
+}
+
+
+def build_model(top_k: int = 2) -> RelatedModel:
+    model = RelatedModel(top_k=top_k, min_score=0.05)
+    model.fit(
+        {key: term_counts(key[0], values) for key, (_, values) in ITEMS.items()},
+        {key: title for key, (title, _) in ITEMS.items()},
+    )
+    return model
+
+
+def targets(model: RelatedModel, key):
+    return [target for target, _ in model.neighbours[key]]
+
+
+class TestTokenize:
+    """測試分詞"""
+
+    def test_english_words_without_stopwords(self):
+        assert tokenize("The AI-Enhanced SOC for C++") == ["ai", "enhanced", "soc", "c++"]
+
+    def test_cjk_bigrams(self):
+        assert tokenize("資安威脅 AI") == ["資安", "安威", "威脅", "ai"]
+
+    def test_title_is_weighted(self):
+        counts = term_counts("jobs", {"title": "SOC Analyst", "tags": [], "description": "soc"})
+        assert counts["soc"] == 3 and counts["analyst"] == 2
+
+
+class TestRelatedModel:
+    """測試 TF-IDF 最近鄰與增量更新"""
+
+    def test_neighbours_across_tables(self):
+        model = build_model()
+        assert targets(model, ("jobs", 1))[0] == ("news", 3)
+        assert targets(model, ("cases", 4))[0] == ("jobs", 2)
+
+    def test_excludes_self_and_orders_by_score(self):
+        model = build_model(top_k=3)
+        for key, best in model.neighbours.items():
+            assert key not in [target for target, _ in best]
+            scores = [score for _, score in best]
+            assert scores == sorted(scores, reverse=True)
+            assert all(0.05 <= score <= 1.0 + 1e-9 for score in scores)
+
+    def test_upsert_reranks_items_it_enters(self):
+        model = build_model(top_k=1)
+        affected = model.upsert(("news", 5), term_counts("news", {"title": "Fraud models", "category": "", "content": "machine learning fraud models"}), "Fraud models")
+        assert ("news", 5) in affected and ("cases", 4) in affected
+        assert targets(model, ("cases", 4)) == [("news", 5)]
+        assert model.titles[("news", 5)] == "Fraud models"
+
+    def test_upsert_reranks_items_it_leaves(self):
+        model = build_model(top_k=1)
+        affected = model.upsert(("news", 3), term_counts("news", {"title": "Quarterly results", "category": "", "content": "finance"}), "Quarterly results")
+        assert ("jobs", 1) in affected
+        assert ("news", 3) not in targets(model, ("jobs", 1))
+
+    def test_remove(self):
+        model = build_model()
+        affected = model.remove(("news", 3))
+        assert ("jobs", 1) in affected and ("news", 3) in affected
+        assert ("news", 3) not in model.neighbours
+        assert all(("news", 3) not in targets(model, key) for key in model.neighbours)
+        assert model.remove(("news", 3)) == set()
@@ -0,0 +1,53 @@
+from app.bulk_import import IMPORT_SPECS, import_columns
+from app.fields import EXCERPT_LENGTH
+from app.rendering import RENDERED_COLUMNS, reading_minutes, render_markdown, render_news, render_news_values
+
+
+class TestMarkdown:
+    """測試 Markdown 轉成安全的 HTML"""
+
+    def test_renders_markdown(self):
+        html = render_markdown("# Title\n\n- one\n- two\n\n**bold**")
+        assert "<h1>Title</h1>" in html
+        assert "<li>one</li>" in html
+        assert "<strong>bold</strong>" in html
+
+    def test_strips_scripts_and_handlers(self):
+        html = render_markdown('hi <script>alert(1)</script><img src="/a.png" onerror="alert(1)">')
+        assert "script" not in html
+        assert "onerror" not in html
+        assert 'src="/a.png"' in html
+
+    def test_rejects_javascript_links(self):
+        html = render_markdown("[x](javascript:alert(1)) [y](https://avocado.ai)")
+        assert "javascript" not in html
+        assert 'href="https://avocado.ai"' in html
+        assert 'rel="noopener noreferrer nofollow"' in html
+
+
+class TestDerivedColumns:
+    """測試摘要與閱讀時間"""
+
+    def test_excerpt_is_plain_text(self):
+        rendered = render_news("# Launch\n\nWe **ship** today &amp; tomorrow.")
+        assert rendered["excerpt"] == "Launch We ship today & tomorrow."
+
+    def test_long_content_excerpt_is_cut(self):
+        rendered = render_news("word " * 500)
+        assert rendered["excerpt"].endswith("…")
+        assert len(rendered["excerpt"]) <= EXCERPT_LENGTH + 1
+
+    def test_reading_time(self):
+        assert reading_minutes("") == 1
+        assert reading_minutes("word " * 450) == 3
+        assert reading_minutes("酪" * 800) == 2
+
+    def test_values_without_content_untouched(self):
+        assert render_news_values({"title": "t"}) == {"title": "t"}
+        assert set(RENDERED_COLUMNS) <= render_news_values({"content": "c"}).keys()
+
+
+def test_news_import_writes_rendered_columns():
+    spec = IMPORT_SPECS["news"]
+    assert import_columns(spec)[-len(RENDERED_COLUMNS):] == list(RENDERED_COLUMNS)
+    assert spec.derive({"title": "t", "content": "*c*"})["content_html"] == "<p><em>c</em></p>"
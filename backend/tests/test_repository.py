@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.repository import parse_if_match, patch_values
+from app.schemas import JobUpdate
+
+
+def make_request(if_match: str = None) -> Request:
+    headers = [(b"if-match", if_match.encode())] if if_match is not None else []
+    return Request({"type": "http", "method": "PATCH", "path": "/", "headers": headers, "query_string": b""})
+
+
+class TestPatchValues:
+    """測試 PATCH 只更新有送出的欄位"""
+
+    def test_only_sent_fields(self):
+        assert patch_values(JobUpdate(salary="100k", tags=["ai"])) == {"salary": "100k", "tags": ["ai"]}
+
+    def test_null_is_ignored(self):
+        assert patch_values(JobUpdate(title=None, is_active=False)) == {"is_active": False}
+
+
+class TestIfMatch:
+    """測試以 updated_at 做樂觀並行控制"""
+
+    def test_quoted_and_bare_values(self):
+        expected = datetime(2024, 5, 1, 12, 0, 0, 500)
+        assert parse_if_match(make_request('"2024-05-01T12:00:00.000500"')) == expected
+        assert parse_if_match(make_request("2024-05-01T12:00:00.000500")) == expected
+
+    def test_timezone_converted_to_utc(self):
+        assert parse_if_match(make_request("2024-05-01T20:00:00+08:00")) == datetime(2024, 5, 1, 12, 0, 0)
+
+    def test_absent_or_wildcard_skips_check(self):
+        assert parse_if_match(make_request()) is None
+        assert parse_if_match(make_request("*")) is None
+
+    def test_invalid_value_rejected(self):
+        with pytest.raises(HTTPException) as exc_info:
+            parse_if_match(make_request('"abc123"'))
+        assert exc_info.value.status_code == 400
@@ -0,0 +1,75 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app.cache import ResponseCache
+from app.singleflight import SingleFlight
+
+
+def run_concurrently(call, count: int = 8):
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        futures = [pool.submit(call) for _ in range(count)]
+        return [future.exception() or future.result() for future in futures]
+
+
+class TestSingleFlight:
+    """測試相同請求的合併"""
+
+    def test_concurrent_calls_share_one_computation(self):
+        flights = SingleFlight()
+        calls = []
+
+        def producer():
+            calls.append(1)
+            time.sleep(0.1)
+            return b"[]"
+
+        assert run_concurrently(lambda: flights.do("/api/news/?", producer)) == [b"[]"] * 8
+        assert len(calls) == 1
+        assert flights.stats() == {"in_flight": 0, "coalesced": 7, "timeouts": 0}
+
+    def test_error_propagates_to_followers(self):
+        """領頭請求失敗時，等待中的請求收到同一個錯誤"""
+        flights = SingleFlight()
+
+        def producer():
+            time.sleep(0.1)
+            raise HTTPException(status_code=404, detail="News item not found")
+
+        results = run_concurrently(lambda: flights.do("/api/news/1?", producer), count=4)
+        assert all(isinstance(result, HTTPException) and result.status_code == 404 for result in results)
+        # 失敗不會被記住，下一次重新計算
+        assert flights.do("/api/news/1?", lambda: b"{}") == b"{}"
+
+    def test_follower_times_out(self):
+        flights = SingleFlight()
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.3)
+            return b"slow"
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            leader = pool.submit(flights.do, "key", slow)
+            started.wait()
+            with pytest.raises(HTTPException) as exc_info:
+                flights.do("key", lambda: b"other", timeout=0.05)
+            assert exc_info.value.status_code == 504
+            assert leader.result() == b"slow"
+
+    def test_coalesces_without_response_cache(self):
+        """快取停用時也會合併"""
+        cache = ResponseCache(ttl=0, redis_url="")
+        calls = []
+
+        def producer():
+            calls.append(1)
+            time.sleep(0.1)
+            return b"[]"
+
+        run_concurrently(lambda: cache.get_or_set("/api/jobs/?", ["jobs"], producer))
+        assert len(calls) == 1
@@ -0,0 +1,74 @@
+import os
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, select
+
+from app import snapshot
+from app.filters import ArrayOverlap
+from app.models import Base, Job
+from app.snapshot import SnapshotSource, snapshot_mode_middleware
+from app.snapshot_export import tombstone
+
+JOB = {
+    "title": "Engineer", "department": "R&D", "location": "Taipei", "type": "Full-time", "salary": "n/a",
+    "description": "Secret draft", "requirements": ["python"], "benefits": [], "tags": ["ai", "edge"],
+    "posted_date": datetime(2024, 1, 1), "is_active": True,
+    "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1),
+}
+
+
+def write_snapshot(path: str, title: str):
+    partial = path + ".partial"
+    engine = create_engine(f"sqlite:///{partial}")
+    Base.metadata.create_all(engine, tables=[Job.__table__])
+    with engine.begin() as conn:
+        conn.execute(insert(Job.__table__), [{**JOB, "title": title}])
+        conn.exec_driver_sql("CREATE TABLE snapshot_meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.exec_driver_sql("INSERT INTO snapshot_meta VALUES ('exported_at', ?)", (title,))
+    engine.dispose()
+    os.replace(partial, path)
+
+
+class TestSnapshotSource:
+    """測試唯讀快照的讀取與切換"""
+
+    def test_reads_arrays_and_filters_tags(self, tmp_path):
+        path = str(tmp_path / "snapshot.db")
+        write_snapshot(path, "v1")
+        db = SnapshotSource(path).session()
+        try:
+            assert db.query(Job).one().tags == ["ai", "edge"]
+            assert db.query(Job).filter(ArrayOverlap(Job.tags, ["edge", "x"])).count() == 1
+            assert db.query(Job).filter(ArrayOverlap(Job.tags, ["x"])).count() == 0
+        finally:
+            db.close()
+
+    def test_new_file_is_picked_up(self, tmp_path):
+        path = str(tmp_path / "snapshot.db")
+        write_snapshot(path, "v1")
+        source = SnapshotSource(path, check_interval=0)
+        source.refresh()
+        write_snapshot(path, "v2")
+        with source.session() as db:
+            assert db.execute(select(Job.title)).scalar() == "v2"
+        assert source.exported_at == "v2"
+
+
+def test_tombstones_keep_no_content():
+    stub = tombstone(Job.__table__, {**JOB, "id": 7, "is_active": False}, "is_active")
+    assert (stub["id"], stub["is_active"], stub["updated_at"]) == (7, False, JOB["updated_at"])
+    assert stub["description"] == "" and stub["tags"] == []
+
+
+def test_snapshot_nodes_reject_writes(monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshot, "snapshot_source", SnapshotSource(str(tmp_path / "unused.db")))
+    app = FastAPI()
+    app.middleware("http")(snapshot_mode_middleware)
+    app.get("/api/jobs/")(lambda: [])
+    client = TestClient(app)
+    assert client.get("/api/jobs/").status_code == 200
+    response = client.post("/api/jobs/", json={})
+    assert response.status_code == 405 and response.headers["allow"] == "GET, HEAD, OPTIONS"
+    assert client.get("/api/contact/").status_code == 404
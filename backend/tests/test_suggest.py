@@ -0,0 +1,133 @@
+import threading
+
+from app.events import Change
+from app.suggest import PrefixIndex, Suggester, normalize, suffix_keys
+
+
+def build_index() -> PrefixIndex:
+    index = PrefixIndex()
+    index.put("jobs", 1, {"title": "Senior AI Security Engineer", "tags": ["Python", "AI"]})
+    index.put("jobs", 2, {"title": "資安分析師", "tags": ["python"]})
+    index.put("news", 3, {"title": "酪梨智慧發表邊緣運算平台", "category": "Product Launch"})
+    return index
+
+
+class TestKeys:
+    """測試索引鍵"""
+
+    def test_english_word_starts(self):
+        assert suffix_keys("AI-Enhanced BAS") == ["ai-enhanced bas", "enhanced bas", "bas"]
+
+    def test_every_cjk_character_starts_a_key(self):
+        assert suffix_keys("資安AI") == ["資安ai", "安ai"]
+
+    def test_full_width_and_case_folded(self):
+        assert normalize("ＡＩ  Security") == "ai security"
+
+
+class TestPrefixIndex:
+    """測試前綴查詢與增量更新"""
+
+    def test_english_prefix_inside_title(self):
+        texts = [item["text"] for item in build_index().search("secu")]
+        assert texts == ["Senior AI Security Engineer"]
+
+    def test_chinese_prefix_inside_title(self):
+        results = build_index().search("邊緣")
+        assert results == [{"text": "酪梨智慧發表邊緣運算平台", "kind": "news", "count": 1, "table": "news", "id": 3}]
+
+    def test_shared_tags_are_counted_once(self):
+        results = build_index().search("py", kinds=["tag"])
+        assert results == [{"text": "Python", "kind": "tag", "count": 2}]
+
+    def test_start_matches_rank_first(self):
+        index = build_index()
+        index.put("products", 4, {"name": "AI Firewall", "category": "Security"})
+        assert [item["text"] for item in index.search("ai")][:2] == ["AI", "AI Firewall"]
+
+    def test_put_replaces_and_remove_drops(self):
+        index = build_index()
+        index.put("jobs", 1, {"title": "Edge Engineer", "tags": ["python"]})
+        assert index.search("senior") == []
+        assert index.search("python")[0]["count"] == 2
+        index.remove("jobs", 2)
+        index.remove("jobs", 1)
+        assert index.search("py") == [] and index.search("資安") == []
+
+
+class GatedSuggester(Suggester):
+    """build() 等待測試放行，模擬耗時的重建"""
+
+    def __init__(self):
+        super().__init__(refresh_seconds=60)
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.builds = 0
+
+    def build(self) -> PrefixIndex:
+        self.builds += 1
+        if self.builds > 1:
+            self.started.set()
+            self.release.wait(5)
+        index = PrefixIndex()
+        index.put("news", self.builds, {"title": f"Build {self.builds}"})
+        index.sort()
+        return index
+
+    def _patch(self, index, change):
+        index.remove(change.table, change.id)
+
+
+class TestSuggester:
+    """測試索引在背景重建與修補"""
+
+    def test_writes_are_patched_off_the_request_thread(self):
+        """寫入只排入佇列，修補在背景執行緒完成"""
+        suggester = GatedSuggester()
+        suggester.current()
+        patched = threading.Event()
+        threads = []
+
+        def patch(index, change):
+            patched.wait(5)
+            threads.append(threading.current_thread())
+            index.remove(change.table, change.id)
+
+        suggester._patch = patch
+        suggester.apply(Change("news", 1, "update"))
+        assert [item["text"] for item in suggester.search("build")] == ["Build 1"]
+        patched.set()
+        suggester.pending.join()
+        assert threads and threads[0] is not threading.current_thread()
+        assert suggester.search("build") == []
+
+    def test_stale_index_is_served_while_rebuilding(self):
+        """過期時請求立即取得舊索引，重建完成後才換新"""
+        suggester = GatedSuggester()
+        first = suggester.current()
+        suggester.built_at = 0.0
+        assert suggester.current() is first
+        assert suggester.started.wait(5)
+        assert suggester.current() is first
+        suggester.release.set()
+        for _ in range(100):
+            if suggester.index is not first:
+                break
+            threading.Event().wait(0.02)
+        assert [item["text"] for item in suggester.search("build")] == ["Build 2"]
+
+    def test_writes_during_rebuild_are_replayed(self):
+        """重建期間的寫入也套用到新索引"""
+        suggester = GatedSuggester()
+        suggester.current()
+        suggester.built_at = 0.0
+        suggester.current()
+        assert suggester.started.wait(5)
+        suggester.apply(Change("news", 2, "delete"))
+        suggester.pending.join()
+        suggester.release.set()
+        for _ in range(100):
+            if suggester.replay is None and suggester.builds == 2 and suggester.built_at:
+                break
+            threading.Event().wait(0.02)
+        assert suggester.search("build") == []
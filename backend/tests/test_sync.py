@@ -0,0 +1,26 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.sync import cursor_from_json, cursor_to_json, decode_token, encode_token
+
+
+class TestChangeTokens:
+    """測試增量同步的 token"""
+
+    def test_round_trip(self):
+        cursor = (datetime(2024, 5, 1, 12, 30, 0, 123456), 42)
+        assert cursor_from_json(decode_token(encode_token(cursor_to_json(cursor)))) == cursor
+
+    def test_combined_token_holds_cursor_per_resource(self):
+        token = encode_token({"jobs": ["2024-05-01T00:00:00", 1], "news": ["2024-05-02T00:00:00", 7]})
+        assert decode_token(token)["news"] == ["2024-05-02T00:00:00", 7]
+
+    def test_invalid_token_rejected(self):
+        """無法解析的 token 回傳 400 而不是 500"""
+        with pytest.raises(HTTPException) as exc_info:
+            decode_token("not a token")
+        assert exc_info.value.status_code == 400
+        with pytest.raises(HTTPException):
+            cursor_from_json(decode_token(encode_token(["yesterday", 1])))
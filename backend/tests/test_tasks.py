@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+import time
+import pytest
+
+from app import maintenance
+from app.tasks import (
+    TASKS, TASK_POLL_SECONDS, TASK_RETRY_BASE_SECONDS, TASK_RETRY_MAX_SECONDS,
+    current_period, enqueue, next_wait, queue_limit, retry_delay, task,
+)
+
+
+class TestRegistry:
+    """測試任務註冊"""
+
+    def test_decorator_registers_spec(self):
+        @task(queue="images", priority=5, max_attempts=2)
+        def resize_image(path: str):
+            return path
+
+        spec = TASKS.pop("resize_image")
+        assert (spec.queue, spec.priority, spec.max_attempts, spec.every) == ("images", 5, 2, None)
+        assert spec.handler(path="a.png") == "a.png"
+
+    def test_maintenance_tasks_are_periodic(self):
+        for name in ("compact_content", "manage_partitions", "build_related", "purge_finished_tasks"):
+            assert TASKS[name].queue == "maintenance"
+            assert TASKS[name].every == maintenance.DAY
+        assert queue_limit("maintenance") == 1
+
+    def test_unknown_task_rejected(self):
+        with pytest.raises(ValueError):
+            enqueue("no_such_task")
+
+
+class TestRetries:
+    """測試重試退避"""
+
+    def test_backoff_doubles_with_jitter(self):
+        for attempts in (1, 2, 3):
+            base = TASK_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+            assert base / 2 <= retry_delay(attempts) <= base
+
+    def test_backoff_is_capped(self):
+        assert retry_delay(30) <= TASK_RETRY_MAX_SECONDS
+
+
+class TestScheduling:
+    """測試閒置等待與定期任務時段"""
+
+    def test_wakes_for_next_scheduled_task(self):
+        now = datetime(2026, 1, 1)
+        assert next_wait({"default": now + timedelta(seconds=1)}, now) == 1
+
+    def test_due_tasks_of_full_queues_wait_for_poll(self):
+        """到期但名額已滿的佇列不造成忙碌迴圈"""
+        now = datetime(2026, 1, 1)
+        assert next_wait({"maintenance": now - timedelta(minutes=5)}, now) == TASK_POLL_SECONDS
+        assert next_wait({}, now) == TASK_POLL_SECONDS
+
+    def test_period_uses_utc(self, monkeypatch):
+        """不受主機時區影響"""
+        monkeypatch.setenv("TZ", "Asia/Taipei")
+        time.tzset()
+        try:
+            assert current_period(datetime(1970, 1, 2, 0, 0, 1), 86400) == 1
+        finally:
+            monkeypatch.delenv("TZ")
+            time.tzset()
+
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Background task worker: runs queued tasks from the tasks table until stopped
+
+    python worker.py                          # every queue, 4 threads
+    python worker.py --queues maintenance --concurrency 1
+
+Run one or more per deployment next to the API. Periodic maintenance
+(compaction, contact partitions, related items, snapshot export when
+SNAPSHOT_EXPORT_PATH is set) is scheduled here; queue depth and latency
+are at GET /api/admin/tasks/stats. SIGTERM lets running tasks finish.
+"""
+import argparse
+import logging
+import signal
+
+from app import maintenance  # noqa: F401  註冊維護任務
+from app.tasks import TASKS, Worker, queue_limit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background tasks")
+    parser.add_argument("--queues", help="comma separated queues to serve; defaults to all")
+    parser.add_argument("--concurrency", type=int, default=4, help="tasks run at once by this worker")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    queues = [name.strip() for name in args.queues.split(",")] if args.queues else None
+    worker = Worker(queues, args.concurrency)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    served = sorted(queues or {spec.queue for spec in TASKS.values()})
+    print(f"🔄 Worker {worker.name} serving {', '.join(f'{queue} (limit {queue_limit(queue)})' for queue in served)}")
+    worker.run()
+    print("✅ Worker stopped")
+
+
+if __name__ == "__main__":
+    main()
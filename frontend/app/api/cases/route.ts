@@ -1,13 +1,20 @@
 import { NextRequest, NextResponse } from 'next/server'
 
+// Set by the backend after a write; while present the backend reads from the primary, not a replica
+const LAST_WRITE_COOKIE = 'avocado_last_write'
+
 export async function GET(request: NextRequest) {
   try {
     console.log('API route called: /api/cases/')
     
+    const lastWrite = request.cookies.get(LAST_WRITE_COOKIE)
     const response = await fetch('http://backend:8000/api/cases/', {
       headers: {
         'Content-Type': 'application/json',
+        ...(lastWrite ? { Cookie: `${LAST_WRITE_COOKIE}=${lastWrite.value}` } : {}),
       },
+      // 剛寫入的使用者不能拿到 Next 快取中的舊資料
+      ...(lastWrite ? { cache: 'no-store' as const } : {}),
     })
     
     console.log('Backend response status:', response.status)